@@ -0,0 +1,70 @@
+"""
+The OpenAPI schema of the API, generated ahead of time.
+
+Generating the schema introspects every router, serializer and filterset,
+which takes hundreds of milliseconds, so it is not done per request. The
+`generate_openapi_schema` management command writes the schema to
+`OPENAPI_SCHEMA_PATH` on deploy, and `openapi_schema_view` serves that file
+with an `ETag` and a `Cache-Control` max-age. The swagger and redoc pages only
+render their HTML shell and load the schema from that view (`SPEC_URL`).
+
+Without the artifact, e.g. in development, the schema is generated on the
+first request and kept for the lifetime of the process.
+"""
+import functools
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+from drf_yasg import openapi
+from drf_yasg.app_settings import swagger_settings
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+API_INFO = openapi.Info(
+    title="Victor's Bookspace API",
+    default_version='v1',
+    description="Development version",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="victortonui40@gmail.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=[permissions.AllowAny],
+)
+
+
+def generate_schema():
+    """Returns the public schema of the whole API as JSON bytes."""
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(API_INFO)
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True))
+
+
+@functools.lru_cache(maxsize=None)
+def get_schema_document():
+    """Returns the schema and its ETag, read from the artifact or generated once per process."""
+    try:
+        content = Path(settings.OPENAPI_SCHEMA_PATH).read_bytes()
+    except FileNotFoundError:
+        content = generate_schema()
+    return content, hashlib.sha256(content).hexdigest()[:32]
+
+
+@require_safe
+@cache_control(public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+@condition(etag_func=lambda request: get_schema_document()[1])
+def openapi_schema_view(request):
+    return HttpResponse(get_schema_document()[0], content_type='application/json')
+
+
+# Only the HTML renderers: the schema itself comes from `openapi_schema_view`.
+swagger_ui_view = schema_view.as_cached_view(renderer_classes=[SwaggerUIRenderer])
+redoc_view = schema_view.as_cached_view(renderer_classes=[ReDocRenderer])
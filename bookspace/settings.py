@@ -14,6 +14,8 @@ from pathlib import Path
 
 from django.conf.urls.static import static
 
+from bookspace.db import parse_database_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -54,6 +56,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.CustomUser'
 
 MIDDLEWARE = [
+    'main.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -74,7 +77,7 @@ AUTHENTICATION_BACKENDS = [
 # REST FRAMEWORK
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES':
-        ['rest_framework.authentication.TokenAuthentication'],
+        ['users.authentication.CachedTokenAuthentication'],
 
     'DEFAULT_FILTER_BACKENDS':
         ['django_filters.rest_framework.DjangoFilterBackend']
@@ -237,7 +240,7 @@ UNFOLD = {
     },
     # "TABS": True,  # Enable tabs in change forms
     "ENVIRONMENT": "production",  # or "development"
-    "DASHBOARD_CALLBACK": None,  # Custom dashboard callback
+    "DASHBOARD_CALLBACK": "main.dashboard.dashboard_callback",  # Sales and stock figures, see main/dashboard.py
 }
 
 DJOSER = {
@@ -267,14 +270,90 @@ WSGI_APPLICATION = 'bookspace.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# DATABASE_URL selects PostgreSQL, MySQL or SQLite (see bookspace/db.py). Connections
+# are kept open for CONN_MAX_AGE seconds and checked before being reused.
 
 DATABASES = {
+    'default': parse_database_url(
+        os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+        conn_max_age=int(os.environ.get('CONN_MAX_AGE', 60)),
+        conn_health_checks=True,
+    )
+}
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The storefront page cache and its catalog generation counter (see main/cache.py)
+# must be shared by every worker process, so production deployments should point
+# this at Redis or Memcached.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    # Authenticated API tokens (see users/authentication.py), least recently used evicted first.
+    # Must be shared by all processes in production (TOKEN_CACHE_BACKEND=Redis or Memcached), or
+    # revoked tokens keep working elsewhere until they time out; check users.W001 warns otherwise.
+    'tokens': {
+        'BACKEND': os.environ.get('TOKEN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('TOKEN_CACHE_LOCATION', 'tokens'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10000))},
+    },
 }
 
+CATALOG_PAGE_CACHE_TIMEOUT = 60 * 15
+
+# Background jobs (see main/tasks.py)
+# Jobs such as thumbnail generation run in a thread pool of this many workers.
+# BACKGROUND_TASKS_EAGER=1 runs them inline once the transaction commits.
+
+BACKGROUND_TASK_WORKERS = int(os.environ.get('BACKGROUND_TASK_WORKERS', 2))
+BACKGROUND_TASKS_EAGER = os.environ.get('BACKGROUND_TASKS_EAGER') == '1'
+
+THUMBNAIL_SIZE = (100, 100)
+
+# Book cover renditions (see main/renditions.py)
+# Formats are listed most efficient first; the last one is the fallback used in
+# <img src> and must be understood by every browser. "avif" is skipped unless
+# the installed Pillow can encode it.
+
+BOOK_IMAGE_RENDITION_WIDTHS = (160, 320, 640, 960)
+BOOK_IMAGE_RENDITION_FORMATS = ('avif', 'webp', 'jpeg')
+BOOK_IMAGE_RENDITION_QUALITY = 80
+BOOK_IMAGE_DEFAULT_WIDTH = 640
+
+# Books with at most this many copies left are listed on the admin dashboard.
+LOW_STOCK_THRESHOLD = 5
+
+# Request metrics (see main/metrics.py)
+# METRICS_SAMPLE_RATE is the share of requests measured, e.g. 0.05 on busy deployments.
+# The /metrics/ endpoint is open to staff users and to requests carrying
+# "Authorization: Bearer <METRICS_TOKEN>".
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '1') == '1'
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Authenticated tokens are cached for this many seconds, see users/authentication.py.
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 5
+
+# API tokens expire this many seconds after they were issued; AUTH_TOKEN_TTL=0 disables expiry.
+AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 60 * 60 * 24 * 30)) or None
+
+# Usernames handed out by CustomUser.generate_username stay reserved for this many seconds.
+USERNAME_RESERVATION_TIMEOUT = 60 * 10
+
+# The OpenAPI schema is written by `manage.py generate_openapi_schema` on deploy and served
+# from this file at /openapi.json, see bookspace/schema.py.
+OPENAPI_SCHEMA_PATH = os.environ.get('OPENAPI_SCHEMA_PATH', os.path.join(BASE_DIR, 'openapi.json'))
+OPENAPI_SCHEMA_MAX_AGE = 60 * 60
+
+SWAGGER_SETTINGS = {'SPEC_URL': 'openapi-schema'}
+REDOC_SETTINGS = {'SPEC_URL': 'openapi-schema'}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
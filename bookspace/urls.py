@@ -19,29 +19,16 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Victor's Bookspace API",
-      default_version='v1',
-      description="Development version",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="victortonui40@gmail.com"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=[permissions.AllowAny],
-)
+from bookspace.schema import openapi_schema_view, redoc_view, swagger_ui_view
 
 urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('openapi.json', openapi_schema_view, name='openapi-schema'),
+    path('swagger/', swagger_ui_view, name='schema-swagger-ui'),
+    path('redoc/', redoc_view, name='schema-redoc'),
     path('', include('main.urls')),
     path('auth/', include('users.urls', namespace='users')),
     ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
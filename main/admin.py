@@ -1,8 +1,10 @@
 from django.contrib import admin
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
 from unfold.admin import ModelAdmin, TabularInline
 
 from .models import *
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(Author)
@@ -79,6 +81,12 @@ class BookAdmin(ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # get_authors reads the prefetched authors instead of querying them per row.
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('authors', queryset=Author.objects.only('id', 'first_name', 'last_name'))
+        )
+
     def get_authors(self, obj):
         """Returns a comma-separated list of authors"""
         return ", ".join(str(author) for author in obj.authors.all())
@@ -92,6 +100,7 @@ class BookImageAdmin(ModelAdmin):
     Admin class for managing `BookImage` instances in the Django admin panel.
     """
     list_display = ('book', 'cover_image', 'thumbnail')
+    list_select_related = ('book',)
     search_fields = ('book__title',)
     ordering = ('book',)
 
@@ -105,6 +114,8 @@ class OrderItemInline(TabularInline):
     extra = 1
     fields = ('book', 'quantity', 'price_at_time')
     readonly_fields = ('price_at_time',)
+    # A search box instead of a <select> listing the whole catalog on every line.
+    autocomplete_fields = ('book',)
 
 
 @admin.register(Order)
@@ -127,6 +138,10 @@ class OrderAdmin(ModelAdmin):
     list_filter = ('status', 'order_date')
     ordering = ('-order_date',)
 
+    # No exact COUNT(*) over every order on each page load.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     inlines = [OrderItemInline]
 
     fieldsets = (
@@ -163,10 +178,14 @@ class OrderItemAdmin(ModelAdmin):
     Admin class for managing `OrderItem` instances in the Django admin panel.
     """
     list_display = ('order', 'book', 'quantity', 'price_at_time')
+    list_select_related = ('order', 'book')
     search_fields = ('order__customer_name', 'book__title')
     list_filter = ('order__status',)
     ordering = ('-order__order_date',)
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     fieldsets = (
         (_("Order Information"), {
             "fields": (
@@ -185,6 +204,7 @@ class BookInventoryAdmin(ModelAdmin):
     Admin class for managing `BookInventory` instances in the Django admin panel.
     """
     list_display = ('name', 'stock_quantity')
+    list_select_related = ('name',)
     search_fields = ('name__title',)
     ordering = ('name',)
 
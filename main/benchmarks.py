@@ -0,0 +1,196 @@
+"""
+Latency and query-count benchmarks of the storefront and API endpoints.
+
+Each `Scenario` performs one request (or one background job) per iteration
+through the full Django stack. `run_benchmarks` times every iteration after
+a few warm-up runs and reports the p50/p95 latency and the number of SQL
+queries. The `benchmark` management command seeds a throwaway database with
+`main.seeding` and writes the report as JSON, so that reports taken on
+different commits can be compared with `compare_reports`.
+
+Timings include the overhead of recording the queries, which is the same on
+every commit.
+"""
+import datetime
+import io
+import itertools
+import math
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from main import tasks
+from main.models import *
+from main.seeding import TITLE_WORDS
+from users.choices import SexChoices
+from users.models import CustomUser
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable
+    # Runs before every iteration, outside the timing.
+    setup: Optional[Callable] = None
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of `values`, e.g. `fraction=0.95` for p95."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(scenario, repeat=50, warmup=5):
+    """Runs `scenario` `warmup + repeat` times and returns the statistics of the last `repeat` runs."""
+    durations, query_counts = [], []
+    for iteration in range(warmup + repeat):
+        if scenario.setup is not None:
+            scenario.setup()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            result = scenario.run()
+            elapsed = time.perf_counter() - start
+
+        status_code = getattr(result, 'status_code', 200)
+        if status_code >= 400:
+            raise BenchmarkError(f"Scenario '{scenario.name}' failed with status {status_code}.")
+        if iteration >= warmup:
+            durations.append(elapsed * 1000)
+            query_counts.append(len(context.captured_queries))
+
+    return {
+        'p50_ms': round(percentile(durations, 0.5), 3),
+        'p95_ms': round(percentile(durations, 0.95), 3),
+        'mean_ms': round(statistics.fmean(durations), 3),
+        'min_ms': round(min(durations), 3),
+        'max_ms': round(max(durations), 3),
+        'queries': statistics.median_low(query_counts),
+        'max_queries': max(query_counts),
+        'iterations': repeat,
+    }
+
+
+def create_benchmark_owner():
+    """Returns the token of a bookspace owner to make the authenticated requests with."""
+    owner, _ = CustomUser.objects.get_or_create(
+        username='benchmark-owner',
+        defaults={
+            'first_name': 'Benchmark',
+            'last_name': 'Owner',
+            'phone_number': '+254799999999',
+            'sex': SexChoices.FEMALE,
+            'is_bookspace_owner': True,
+        },
+    )
+    return Token.objects.get_or_create(user=owner)[0].key
+
+
+def create_benchmark_image(book_id, size=(1200, 1800)):
+    """Stores a cover of `size` for `book_id` without queueing its thumbnail and renditions."""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'darkgreen').save(buffer, 'JPEG', quality=90)
+    image = BookImage(book_id=book_id)
+    image.cover_image.save('benchmark-cover.jpg', ContentFile(buffer.getvalue()), save=False)
+    return BookImage.objects.bulk_create([image])[0]
+
+
+def build_scenarios(book_ids, user_ids, role_batch_size=50):
+    """Returns the benchmark scenarios over a seeded catalog."""
+    client = APIClient()
+    token = create_benchmark_owner()
+    authenticated = APIClient()
+    authenticated.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    words = itertools.cycle(word.lower() for word in TITLE_WORDS)
+    tags = itertools.cycle(BookTag.objects.order_by('id').values_list('name', flat=True))
+    last_names = itertools.cycle(Author.objects.order_by().values_list('last_name', flat=True).distinct()[:50])
+    detail_ids = itertools.cycle(book_ids[::max(1, len(book_ids) // 100)])
+    role_user_ids = user_ids[:role_batch_size]
+
+    home = reverse('main:home')
+    image = create_benchmark_image(book_ids[0])
+
+    def reset_thumbnail():
+        image.refresh_from_db()
+        if image.thumbnail:
+            image.thumbnail.delete(save=False)
+        BookImage.objects.filter(pk=image.pk).update(thumbnail='')
+
+    return [
+        # Storefront pages are rendered from scratch, as for the first visitor after a catalog change.
+        Scenario('home', lambda: client.get(home), setup=cache.clear),
+        Scenario('home_search', lambda: client.get(home, {'search': next(words)}), setup=cache.clear),
+        Scenario('home_tag', lambda: client.get(home, {'tag': next(tags)}), setup=cache.clear),
+        Scenario('home_cached', lambda: client.get(home)),
+        Scenario('book_list', lambda: client.get(reverse('main:books-list'))),
+        Scenario('book_detail', lambda: client.get(reverse('main:books-detail', args=[next(detail_ids)]))),
+        Scenario('author_filter', lambda: authenticated.get(
+            reverse('main:authors-list'), {'last_name': next(last_names)}
+        )),
+        Scenario('thumbnail', lambda: tasks.generate_thumbnail(image.pk), setup=reset_thumbnail),
+        Scenario('role_assignment', lambda: authenticated.post(
+            reverse('users:assign-bookspace-worker'), {'user_ids': role_user_ids}
+        )),
+    ]
+
+
+def run_benchmarks(scenarios, repeat=50, warmup=5, only=None):
+    """Measures every scenario, or those named in `only`, and returns the results by name."""
+    return {
+        scenario.name: measure(scenario, repeat, warmup)
+        for scenario in scenarios
+        if not only or scenario.name in only
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(results, volumes, seed, repeat, warmup):
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': get_commit(),
+        'database': connection.vendor,
+        'seed': seed,
+        'volumes': volumes,
+        'repeat': repeat,
+        'warmup': warmup,
+        'scenarios': results,
+    }
+
+
+def compare_reports(baseline, report):
+    """Yields one line per scenario comparing the p50, p95 and query count of `report` to `baseline`."""
+    for name, result in report['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            yield f"{name}: new scenario"
+            continue
+        changes = [
+            f"{key} {before[key]} -> {result[key]} ({(result[key] - before[key]) / before[key]:+.0%})"
+            if before[key] else f"{key} {before[key]} -> {result[key]}"
+            for key in ('p50_ms', 'p95_ms', 'queries')
+        ]
+        yield f"{name}: {', '.join(changes)}"
@@ -0,0 +1,75 @@
+"""
+Catalog generation counter and rendered page cache for the storefront.
+
+Every change to a book, image, tag or author bumps the catalog generation (see
+`main.signals`). Cache keys embed the current generation, so a bump makes every
+previously cached page unreachable instead of having to find and delete them.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_GENERATION_KEY = 'catalog:generation'
+CATALOG_MODIFIED_KEY = 'catalog:modified'
+
+
+def get_catalog_generation():
+    """Returns the current catalog generation."""
+    generation = cache.get(CATALOG_GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so that an evicted counter never goes back to a
+        # generation whose pages may still be cached.
+        cache.add(CATALOG_GENERATION_KEY, time.time_ns() // 1000, timeout=None)
+        generation = cache.get(CATALOG_GENERATION_KEY)
+    return generation
+
+
+def get_catalog_modified():
+    """Returns the time of the last catalog generation bump, as a Unix timestamp."""
+    modified = cache.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        # Unknown after an eviction: assume the catalog just changed.
+        cache.add(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+        modified = cache.get(CATALOG_MODIFIED_KEY)
+    return modified
+
+
+def bump_catalog_generation():
+    """Invalidates every cached catalog page and returns the new generation."""
+    try:
+        generation = cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        get_catalog_generation()
+        generation = cache.incr(CATALOG_GENERATION_KEY)
+    # Recorded after the bump, so that no response pairs the old catalog with the new time.
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+    return generation
+
+
+def bump_catalog_generation_on_commit():
+    """
+    Bumps the catalog generation once the current transaction commits.
+
+    Bumping earlier would let a concurrent request render the catalog as it was
+    before the commit and cache it under the new generation.
+    """
+    transaction.on_commit(bump_catalog_generation)
+
+
+def catalog_page_cache_key(path, search, selections, cursor):
+    """
+    Returns the cache key of a storefront page. It is built from the parsed
+    search, facet selections and cursor, not the query string, so that unknown
+    or invalid parameters share the entry of the page they render.
+    """
+    params = (path, search, sorted(selections.items()), cursor)
+    digest = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+    return f"catalog:page:{get_catalog_generation()}:{digest}"
+
+
+def catalog_facets_cache_key(search, selections):
+    """Returns the cache key of the facet counts of a storefront search and facet selection."""
+    digest = hashlib.md5(repr((search, sorted(selections.items()))).encode(), usedforsecurity=False).hexdigest()
+    return f"catalog:facets:{get_catalog_generation()}:{digest}"
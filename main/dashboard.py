@@ -0,0 +1,258 @@
+"""
+Sales aggregates and the admin dashboard built from them.
+
+`DailySales` and `BookSales` hold pre-computed totals so the dashboard reads a
+few dozen indexed rows no matter how many orders exist. They are maintained
+incrementally: `place_order` and the `Order`/`OrderItem` signals apply the
+difference a change makes as `F()` increments, in the transaction making the
+change, so the cost of a write does not depend on the sales history and
+concurrent writers cannot overwrite each other's totals.
+``python manage.py rollup_sales`` recomputes everything from the orders, e.g.
+after migrating, after bulk changes that bypass the signals, or as a periodic
+safety net.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from main.models import BookInventory, BookSales, DailySales, Order, OrderItem
+
+DASHBOARD_DAYS = 30
+BEST_SELLER_COUNT = 10
+LOW_STOCK_COUNT = 10
+ROLLUP_BATCH_SIZE = 1000
+
+
+def order_day(order_date):
+    """The `DailySales.date` an order placed at `order_date` counts towards."""
+    return timezone.localdate(order_date)
+
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def add_daily_sales(date, status, order_count=0, revenue=0):
+    """Adds orders and revenue to the `DailySales` row of a day and status, creating it if needed."""
+    if not order_count and not revenue:
+        return
+    DailySales.objects.bulk_create([DailySales(date=date, status=status)], ignore_conflicts=True)
+    DailySales.objects.filter(date=date, status=status).update(
+        order_count=F('order_count') + order_count, revenue=F('revenue') + revenue
+    )
+
+
+def add_book_sales(deltas):
+    """
+    Adds `{book_id: (units, revenue)}` to the `BookSales` rows of the books,
+    creating missing rows. Two queries, however many books.
+    """
+    deltas = {book_id: delta for book_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    BookSales.objects.bulk_create([BookSales(book_id=book_id) for book_id in deltas], ignore_conflicts=True)
+    BookSales.objects.filter(book_id__in=deltas).update(
+        units_sold=F('units_sold') + Case(
+            *[When(book_id=book_id, then=Value(units)) for book_id, (units, revenue) in deltas.items()],
+        ),
+        revenue=F('revenue') + Case(
+            *[When(book_id=book_id, then=Value(revenue)) for book_id, (units, revenue) in deltas.items()],
+            output_field=MONEY,
+        ),
+    )
+
+
+def get_order_book_sales(order_id, sign=1):
+    """Returns what the lines of an order add to `BookSales`, as `add_book_sales` deltas."""
+    return {
+        row['book_id']: (sign * row['units'], sign * row['revenue'])
+        for row in OrderItem.objects.filter(order_id=order_id).values('book_id').annotate(
+            units=Sum('quantity'), revenue=Sum(F('quantity') * F('price_at_time'), output_field=MONEY),
+        ).order_by()
+    }
+
+
+def counts_towards_book_sales(status):
+    return status != 'CANCELLED'
+
+
+def record_order_change(before, order):
+    """
+    Applies a saved order to the aggregates. `before` holds the `order_date`,
+    `status` and `total_amount` the order had before, or is None for a new order.
+    """
+    day = order_day(order.order_date)
+    if before is None:
+        add_daily_sales(day, order.status, 1, order.total_amount)
+        return
+
+    before_day = order_day(before['order_date'])
+    if (before_day, before['status']) == (day, order.status):
+        add_daily_sales(day, order.status, revenue=order.total_amount - before['total_amount'])
+    else:
+        add_daily_sales(before_day, before['status'], -1, -before['total_amount'])
+        add_daily_sales(day, order.status, 1, order.total_amount)
+
+    counted, was_counted = counts_towards_book_sales(order.status), counts_towards_book_sales(before['status'])
+    if counted != was_counted:
+        add_book_sales(get_order_book_sales(order.pk, sign=1 if counted else -1))
+
+
+def record_order_deletion(order):
+    """Removes a deleted order from the daily sales. Its lines are removed by their own deletion."""
+    add_daily_sales(order_day(order.order_date), order.status, -1, -order.total_amount)
+
+
+def record_order_item_change(before, item):
+    """
+    Applies a saved or deleted order line to the book sales. `before` and `item`
+    hold the `order_id`, `book_id`, `quantity` and `price_at_time` of the line
+    before and after the change, None when it did not exist.
+    """
+    lines = [(line, sign) for line, sign in ((before, -1), (item, 1)) if line is not None]
+    statuses = dict(Order.objects.filter(pk__in={line['order_id'] for line, sign in lines}).values_list('pk', 'status'))
+    deltas = {}
+    for line, sign in lines:
+        if not counts_towards_book_sales(statuses.get(line['order_id'], 'CANCELLED')):
+            continue
+        units, revenue = deltas.get(line['book_id'], (0, 0))
+        deltas[line['book_id']] = (
+            units + sign * line['quantity'], revenue + sign * line['quantity'] * line['price_at_time']
+        )
+    add_book_sales(deltas)
+
+
+def refresh_daily_sales(dates):
+    """Recomputes the `DailySales` rows of the given days from their orders."""
+    dates = set(dates)
+    if not dates:
+        return
+
+    # Range conditions on order_date, rather than on its truncated date, so the index is used.
+    in_days = Q()
+    for date in dates:
+        start = timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+        in_days |= Q(order_date__gte=start, order_date__lt=start + datetime.timedelta(days=1))
+    rows = {
+        (row['day'], row['status']): row
+        for row in Order.objects.filter(in_days).annotate(day=TruncDate('order_date'))
+        .values('day', 'status').annotate(order_count=Count('id'), revenue=Sum('total_amount')).order_by()
+    }
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+    with transaction.atomic():
+        DailySales.objects.bulk_create(
+            [
+                DailySales(
+                    date=date, status=status,
+                    order_count=rows.get((date, status), {}).get('order_count', 0),
+                    revenue=rows.get((date, status), {}).get('revenue') or 0,
+                )
+                for date in dates for status in statuses
+            ],
+            update_conflicts=True, unique_fields=['date', 'status'], update_fields=['order_count', 'revenue'],
+        )
+
+
+def refresh_book_sales(book_ids):
+    """Recomputes the `BookSales` rows of the given books from the lines of orders that were not cancelled."""
+    book_ids = set(book_ids)
+    if not book_ids:
+        return
+
+    totals = {
+        row['book_id']: row
+        for row in OrderItem.objects.filter(book_id__in=book_ids).exclude(order__status='CANCELLED')
+        .values('book_id').annotate(
+            units_sold=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('price_at_time'), output_field=MONEY),
+        ).order_by()
+    }
+    BookSales.objects.bulk_create(
+        [
+            BookSales(
+                book_id=book_id,
+                units_sold=totals.get(book_id, {}).get('units_sold', 0),
+                revenue=totals.get(book_id, {}).get('revenue') or 0,
+            )
+            for book_id in book_ids
+        ],
+        update_conflicts=True, unique_fields=['book'], update_fields=['units_sold', 'revenue'],
+    )
+
+
+def rollup_sales(since=None):
+    """
+    Recomputes every aggregate, or only those of the days from `since` on and
+    the books ordered in that time. Returns the number of days and books.
+    """
+    orders = Order.objects.all()
+    if since is not None:
+        orders = orders.filter(order_date__date__gte=since)
+
+    dates = sorted(orders.annotate(day=TruncDate('order_date')).values_list('day', flat=True).distinct().order_by())
+    for start in range(0, len(dates), ROLLUP_BATCH_SIZE):
+        refresh_daily_sales(dates[start:start + ROLLUP_BATCH_SIZE])
+
+    book_ids = OrderItem.objects.filter(order__in=orders).values_list('book_id', flat=True).distinct().order_by()
+    if since is None:
+        # Books whose last order was deleted must drop back to zero too.
+        book_ids = book_ids.union(BookSales.objects.values_list('book_id', flat=True))
+    book_ids = sorted(book_ids)
+    for start in range(0, len(book_ids), ROLLUP_BATCH_SIZE):
+        refresh_book_sales(book_ids[start:start + ROLLUP_BATCH_SIZE])
+    return len(dates), len(book_ids)
+
+
+def get_dashboard(today=None):
+    """Returns the figures shown on the admin dashboard, read from the aggregate tables only."""
+    today = today or timezone.localdate()
+    start = today - datetime.timedelta(days=DASHBOARD_DAYS - 1)
+
+    days = {start + datetime.timedelta(days=offset): {} for offset in range(DASHBOARD_DAYS)}
+    for row in DailySales.objects.filter(date__gte=start, date__lte=today):
+        days[row.date][row.status] = row
+
+    revenue_by_day = []
+    for date, statuses in days.items():
+        revenue = sum(row.revenue for status, row in statuses.items() if status != 'CANCELLED')
+        orders = sum(row.order_count for status, row in statuses.items() if status != 'CANCELLED')
+        revenue_by_day.append({'date': date, 'revenue': revenue, 'orders': orders})
+
+    status_totals = []
+    for status, label in Order.STATUS_CHOICES:
+        rows = [statuses[status] for statuses in days.values() if status in statuses]
+        status_totals.append({
+            'status': label,
+            'orders': sum(row.order_count for row in rows),
+            'revenue': sum(row.revenue for row in rows),
+        })
+
+    threshold = settings.LOW_STOCK_THRESHOLD
+    low_stock = list(
+        BookInventory.objects.filter(stock_quantity__lte=threshold).select_related('name')
+        .order_by('stock_quantity', 'name_id')[:LOW_STOCK_COUNT + 1]
+    )
+    return {
+        'days': DASHBOARD_DAYS,
+        'revenue_today': revenue_by_day[-1]['revenue'],
+        'orders_today': revenue_by_day[-1]['orders'],
+        'revenue_period': sum(day['revenue'] for day in revenue_by_day),
+        'revenue_by_day': revenue_by_day,
+        'max_daily_revenue': max(day['revenue'] for day in revenue_by_day) or 1,
+        'status_totals': status_totals,
+        'best_sellers': list(
+            BookSales.objects.filter(units_sold__gt=0).select_related('book').order_by('-units_sold')[:BEST_SELLER_COUNT]
+        ),
+        'low_stock_threshold': threshold,
+        'low_stock': low_stock[:LOW_STOCK_COUNT],
+        'more_low_stock': len(low_stock) > LOW_STOCK_COUNT,
+    }
+
+
+def dashboard_callback(request, context):
+    """`UNFOLD["DASHBOARD_CALLBACK"]`: adds the dashboard figures to the admin index."""
+    context['dashboard'] = get_dashboard()
+    return context
@@ -0,0 +1,82 @@
+"""
+Streaming export of the book catalog as JSON Lines or CSV.
+
+Books are read with `.iterator(chunk_size=...)`, which uses a server-side
+cursor where the database supports it and prefetches authors and tags one
+chunk at a time, and every record is encoded and sent as soon as it is read.
+Memory use therefore stays flat whatever the size of the catalog. Records
+carry the same columns that `main.importers` reads, so an export can be
+imported again.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from main.models import Author, Book
+
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+FIELDS = (
+    'id', 'title', 'isbn', 'description', 'price', 'publication_date',
+    'authors', 'tags', 'stock_quantity', 'date_updated',
+)
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def get_export_queryset():
+    return Book.objects.order_by('pk').select_related('bookinventory').prefetch_related(
+        Prefetch('authors', queryset=Author.objects.only('id', 'first_name', 'last_name')),
+        'tags',
+    )
+
+
+def export_records(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields one dict per book of `queryset`, reading `chunk_size` books at a time."""
+    for book in queryset.iterator(chunk_size=chunk_size):
+        try:
+            stock_quantity = book.bookinventory.stock_quantity
+        except Book.bookinventory.RelatedObjectDoesNotExist:
+            stock_quantity = None
+        yield {
+            'id': book.id,
+            'title': book.title,
+            'isbn': book.isbn,
+            'description': book.description,
+            'price': book.price,
+            'publication_date': book.publication_date,
+            'authors': [str(author) for author in book.authors.all()],
+            'tags': [tag.name for tag in book.tags.all()],
+            'stock_quantity': stock_quantity,
+            'date_updated': book.date_updated,
+        }
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def encode_jsonl(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def encode_csv(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for record in records:
+        record['authors'] = '; '.join(record['authors'])
+        record['tags'] = '; '.join(record['tags'])
+        yield writer.writerow(['' if record[name] is None else record[name] for name in FIELDS])
+
+
+def export_books(queryset, file_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Returns an iterator over the encoded lines of the export of `queryset`."""
+    encode = encode_csv if file_format == 'csv' else encode_jsonl
+    return encode(export_records(queryset, chunk_size))
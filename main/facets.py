@@ -0,0 +1,175 @@
+"""
+Faceted navigation of the storefront catalog.
+
+Visitors narrow the catalog down by tags, authors, price bands and
+publication decades, several values at a time: values of one facet are
+combined with OR, different facets with AND (`?tag=History&tag=Fiction&price=10-20`).
+
+`count_facets` returns, for every facet value, the number of matching books
+if that value were toggled on: each facet is counted over the books matching
+the search and every *other* facet's selection, so that selecting a tag still
+shows the counts of the other tags. All four facets are counted in one query,
+a `UNION ALL` of grouped aggregations over the book table and the tag and
+author link tables; only the names of the listed authors are looked up
+separately.
+"""
+import datetime
+
+from django.db.models import Case, CharField, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, ExtractYear
+
+from main.models import Author, Book, BookTag
+
+FACETS = ('tag', 'author', 'price', 'year')
+
+# (value, label, lower bound, upper bound), bounds in the catalog currency.
+PRICE_BANDS = (
+    ('0-10', "Under $10", None, 10),
+    ('10-20', "$10 – $20", 10, 20),
+    ('20-50', "$20 – $50", 20, 50),
+    ('50-', "$50 and over", 50, None),
+)
+
+# Only the authors with the most matching books are offered, along with the selected ones.
+AUTHOR_FACET_LIMIT = 10
+
+YEAR_BUCKET_SIZE = 10
+
+
+def parse_ids(values):
+    """Returns the set of non-negative integers among text values, dropping anything else."""
+    return {int(value) for value in values if value.isascii() and value.isdigit()}
+
+
+def get_facet_selections(params):
+    """Returns the valid facet values selected in the query parameters, by facet."""
+    price_bands = {band[0] for band in PRICE_BANDS}
+    return {
+        'tag': sorted(set(params.getlist('tag'))),
+        'author': sorted(parse_ids(params.getlist('author'))),
+        'price': sorted(set(params.getlist('price')) & price_bands),
+        'year': sorted({
+            year // YEAR_BUCKET_SIZE * YEAR_BUCKET_SIZE for year in parse_ids(params.getlist('year')) if year < 9990
+        }),
+    }
+
+
+def filter_by_facets(queryset, selections, exclude=None):
+    """Narrows a `Book` queryset down to the selected facet values, ignoring the `exclude` facet."""
+    selected = {facet: values for facet, values in selections.items() if values and facet != exclude}
+
+    # Subqueries on the link tables instead of joins, so that books are never duplicated.
+    if 'tag' in selected:
+        queryset = queryset.filter(pk__in=Book.tags.through.objects.filter(
+            booktag__name__in=selected['tag']
+        ).values('book_id'))
+    if 'author' in selected:
+        queryset = queryset.filter(pk__in=Book.authors.through.objects.filter(
+            author_id__in=selected['author']
+        ).values('book_id'))
+    if 'price' in selected:
+        condition = Q()
+        for value, label, low, high in PRICE_BANDS:
+            if value in selected['price']:
+                band = Q()
+                if low is not None:
+                    band &= Q(price__gte=low)
+                if high is not None:
+                    band &= Q(price__lt=high)
+                condition |= band
+        queryset = queryset.filter(condition)
+    if 'year' in selected:
+        condition = Q()
+        for year in selected['year']:
+            condition |= Q(
+                publication_date__gte=datetime.date(max(year, 1), 1, 1),
+                publication_date__lt=datetime.date(min(year + YEAR_BUCKET_SIZE, 9999), 1, 1),
+            )
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def get_facet_base(queryset):
+    # Searches may join authors, use DISTINCT or add a rank, none of which mix with grouped counts.
+    if queryset.query.distinct or queryset.query.annotations:
+        return Book.objects.filter(pk__in=queryset.values('pk'))
+    return queryset
+
+
+def count_facets(queryset, selections):
+    """
+    Counts the books of `queryset` (the search results) by facet value, see the
+    module docstring. Returns `{facet: [(value, label, count), ...]}` ordered
+    for display.
+    """
+    base = get_facet_base(queryset.order_by())
+
+    def books(facet):
+        return filter_by_facets(base, selections, exclude=facet).values('pk')
+
+    # Unfiltered branches skip the `IN (SELECT id FROM main_book)` that would match every book.
+    tag_books, author_books = books('tag'), books('author')
+    author_links = Book.authors.through.objects.all()
+    if author_books.query.where:
+        author_links = author_links.filter(book__in=author_books)
+
+    price_band = Case(
+        *[When(price__lt=high, then=Value(value)) for value, label, low, high in PRICE_BANDS if high is not None],
+        default=Value(PRICE_BANDS[-1][0]),
+        output_field=CharField(),
+    )
+    # The publication year as text, like the other branches' values, bucketed into decades below.
+    # EXTRACT returns a numeric on PostgreSQL, hence the cast to an integer first.
+    year = Cast(Cast(ExtractYear('publication_date'), IntegerField()), CharField())
+
+    branches = [
+        # Every tag is listed, with a zero count when no book matches.
+        BookTag.objects.values(facet=Value('tag'), value=F('name')).annotate(
+            count=Count('book', filter=Q(book__in=tag_books) if tag_books.query.where else None)
+        ),
+        author_links.values(facet=Value('author'), value=Cast('author_id', CharField())).annotate(
+            count=Count('book_id')
+        ),
+        filter_by_facets(base, selections, exclude='price').values(
+            facet=Value('price'), value=price_band,
+        ).annotate(count=Count('pk')),
+        filter_by_facets(base, selections, exclude='year').filter(publication_date__isnull=False).values(
+            facet=Value('year'), value=year,
+        ).annotate(count=Count('pk')),
+    ]
+    rows = branches[0].order_by().union(*(branch.order_by() for branch in branches[1:]), all=True)
+
+    counts = {facet: {} for facet in FACETS}
+    for row in rows:
+        counts[row['facet']][row['value']] = row['count']
+    decades = {}
+    for value, count in counts['year'].items():
+        decade = int(value) // YEAR_BUCKET_SIZE * YEAR_BUCKET_SIZE
+        decades[decade] = decades.get(decade, 0) + count
+    return {
+        'tag': sorted((name, name, count) for name, count in counts['tag'].items()),
+        'author': get_author_options(counts['author'], selections['author']),
+        'price': [
+            (value, label, counts['price'][value]) for value, label, low, high in PRICE_BANDS
+            if value in counts['price']
+        ],
+        'year': [
+            (str(decade), f"{decade}s", count) for decade, count in sorted(decades.items(), reverse=True)
+        ],
+    }
+
+
+def get_author_options(counts, selected):
+    """
+    Returns the options of the authors with the most books, followed by the
+    selected ones, which stay visible even when they fall out of the top.
+    """
+    top = sorted(counts, key=lambda value: (-counts[value], int(value)))[:AUTHOR_FACET_LIMIT]
+    shown = top + [str(author_id) for author_id in selected if str(author_id) not in top]
+    if not shown:
+        return []
+    authors = Author.objects.only('first_name', 'last_name').in_bulk([int(value) for value in shown])
+    return [
+        (value, f"{authors[int(value)].first_name} {authors[int(value)].last_name}", counts.get(value, 0))
+        for value in shown if int(value) in authors
+    ]
@@ -0,0 +1,237 @@
+"""
+Bulk import of books from CSV or JSON Lines files.
+
+Records are streamed from the file and written in batches: authors and tags
+are matched by name and created with `bulk_create`, books are upserted on their
+ISBN with a single `bulk_create(update_conflicts=True)`, and their author/tag
+links and `BookInventory` rows are written in bulk as well.
+Bulk writes do not send model signals, so the search index is refreshed per
+batch and the catalog generation is bumped once at the end.
+
+Records carry the fields of `BookImportSerializer`. In CSV files, `authors`
+and `tags` hold several names separated by semicolons; in JSON Lines they may
+also be lists. Invalid records are skipped and reported with their row number.
+"""
+import codecs
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from rest_framework.exceptions import ValidationError
+
+from main.cache import bump_catalog_generation
+from main.models import Author, Book, BookInventory, BookTag
+from main.search import index_books
+from main.serializers import BookImportSerializer
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+BOOK_FIELDS = ('title', 'description', 'price', 'publication_date')
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row, errors):
+        self.errors.append({'row': row, 'errors': errors})
+
+
+def guess_format(filename):
+    """Returns the import format matching the extension of `filename`, or None."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension)
+
+
+def read_records(stream, file_format):
+    """
+    Yields `(row number, record)` pairs from a binary stream. A record that
+    cannot be parsed is yielded as an error message string.
+    """
+    if file_format not in FORMATS:
+        raise ImportFormatError(f"Unsupported format {file_format!r}, expected one of: {', '.join(FORMATS)}.")
+
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if file_format == 'csv':
+        # Row 1 is the header.
+        for row, record in enumerate(csv.DictReader(lines), start=2):
+            yield row, record
+        return
+
+    for row, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield row, f"Invalid JSON: {error}."
+            continue
+        yield row, record if isinstance(record, dict) else "Expected a JSON object."
+
+
+def normalize_name(name):
+    return ' '.join(name.split())
+
+
+def split_name(full_name):
+    """Splits an author name into first and last names; the last word is the last name."""
+    first_name, _, last_name = full_name.strip().rpartition(' ')
+    return first_name.strip(), last_name
+
+
+class BookImporter:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.result = ImportResult()
+        self.author_ids = {}
+        self.tag_ids = {}
+        for tag_id, name in BookTag.objects.order_by('-id').values_list('id', 'name'):
+            # Tag names are not unique; like the storefront filter, use the oldest tag.
+            self.tag_ids[name] = tag_id
+
+    def run(self, records):
+        """Imports `(row number, record)` pairs and returns an `ImportResult`."""
+        # One serializer validates every record; building its fields for each row costs more than validating.
+        serializer = BookImportSerializer()
+        batch = []
+        for row, record in records:
+            if isinstance(record, str):
+                self.result.add_error(row, {'non_field_errors': [record]})
+                continue
+
+            try:
+                batch.append(serializer.run_validation(record))
+            except ValidationError as error:
+                self.result.add_error(row, error.detail)
+                continue
+
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+        if self.result.created or self.result.updated:
+            bump_catalog_generation()
+        return self.result
+
+    @transaction.atomic
+    def import_batch(self, records):
+        # Later records with the same ISBN win, as if the rows were imported one by one.
+        by_isbn = {}
+        without_isbn = []
+        for record in records:
+            if record.get('isbn'):
+                by_isbn[record['isbn']] = record
+            else:
+                without_isbn.append(record)
+
+        self.load_authors({name for record in records for name in record.get('authors', ())})
+        self.load_tags({name for record in records for name in record.get('tags', ())})
+
+        existing = {book.isbn: book for book in Book.objects.filter(isbn__in=by_isbn).only('isbn', *BOOK_FIELDS)}
+        now = timezone.now()
+        upserted, created, rows = [], [], []
+        for isbn, record in by_isbn.items():
+            current = existing.get(isbn)
+            # Fields missing from the record keep their current value.
+            book = Book(isbn=isbn, date_updated=now, **{
+                name: record[name] if name in record else getattr(current, name, None) for name in BOOK_FIELDS
+            })
+            upserted.append(book)
+            rows.append((book, record))
+        for record in without_isbn:
+            book = Book(date_updated=now, **{name: record.get(name) for name in BOOK_FIELDS})
+            created.append(book)
+            rows.append((book, record))
+
+        # A single INSERT ... ON CONFLICT (isbn) DO UPDATE instead of a CASE per column and row.
+        Book.objects.bulk_create(
+            upserted, update_conflicts=True, unique_fields=['isbn'],
+            update_fields=[*BOOK_FIELDS, 'date_updated'], batch_size=self.batch_size,
+        )
+        book_ids = dict(Book.objects.filter(isbn__in=by_isbn).values_list('isbn', 'id'))
+        for book in upserted:
+            book.pk = book_ids[book.isbn]
+        Book.objects.bulk_create(created, batch_size=self.batch_size)
+
+        created_ids = {book.pk for book in created} | {book.pk for book in upserted if book.isbn not in existing}
+        self.save_inventory(rows, created_ids)
+        self.save_relations(rows, 'authors', Book.authors.through, 'author_id', self.author_ids)
+        self.save_relations(rows, 'tags', Book.tags.through, 'booktag_id', self.tag_ids)
+        index_books([book.pk for book, _ in rows])
+
+        self.result.created += len(created_ids)
+        self.result.updated += len(existing)
+
+    def load_authors(self, names):
+        """Maps author names to ids, matching existing authors on their full name and creating the others."""
+        missing = {normalize_name(name) for name in names} - set(self.author_ids)
+        if not missing:
+            return
+
+        # Any word may start a multi-word last name, so look up every possible last name.
+        last_names = set()
+        for name in missing:
+            words = name.split(' ')
+            last_names.update(' '.join(words[start:]) for start in range(len(words)))
+        for author_id, first_name, last_name in Author.objects.filter(
+            last_name__in=last_names
+        ).order_by('-id').values_list('id', 'first_name', 'last_name'):
+            full_name = normalize_name(f"{first_name} {last_name}")
+            if full_name in missing:
+                self.author_ids[full_name] = author_id
+
+        new_authors = [Author(first_name=first_name, last_name=last_name) for first_name, last_name in (
+            split_name(name) for name in missing if name not in self.author_ids
+        )]
+        for author in Author.objects.bulk_create(new_authors, batch_size=self.batch_size):
+            self.author_ids[normalize_name(f"{author.first_name} {author.last_name}")] = author.pk
+
+    def load_tags(self, names):
+        new_tags = [BookTag(name=name) for name in names if name not in self.tag_ids]
+        for tag in BookTag.objects.bulk_create(new_tags):
+            self.tag_ids[tag.name] = tag.pk
+
+    def save_inventory(self, rows, created_ids):
+        """Creates the inventory of new books and sets the stock of books whose records give it."""
+        inventories = [
+            BookInventory(name_id=book.pk, stock_quantity=record.get('stock_quantity') or 0)
+            for book, record in rows
+            if book.pk in created_ids or record.get('stock_quantity') is not None
+        ]
+        BookInventory.objects.bulk_create(
+            inventories, update_conflicts=True, unique_fields=['name'], update_fields=['stock_quantity'],
+            batch_size=self.batch_size,
+        )
+
+    def save_relations(self, rows, name, through, column, ids):
+        """Replaces the `name` links of the books whose records list them."""
+        rows = [(book, record[name]) for book, record in rows if name in record]
+        if not rows:
+            return
+
+        key = normalize_name if name == 'authors' else str
+        through.objects.filter(book_id__in=[book.pk for book, _ in rows]).delete()
+        through.objects.bulk_create(
+            [
+                through(book_id=book.pk, **{column: related_id})
+                for book, values in rows
+                for related_id in {ids[key(value)] for value in values}
+            ],
+            batch_size=self.batch_size,
+        )
+
+
+def import_books(stream, file_format, batch_size=DEFAULT_BATCH_SIZE):
+    """Imports the books of a CSV or JSON Lines binary stream and returns an `ImportResult`."""
+    return BookImporter(batch_size=batch_size).run(read_records(stream, file_format))
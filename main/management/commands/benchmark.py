@@ -0,0 +1,82 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from main.benchmarks import build_report, build_scenarios, compare_reports, run_benchmarks
+from main.models import Book
+from main.seeding import DEFAULT_BATCH_SIZE, seed_catalog
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway test database with a synthetic catalog and reports the p50/p95 latency "
+        "and query count of the storefront and API endpoints as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--authors', type=int, default=2000)
+        parser.add_argument('--order-items', type=int, default=50000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--repeat', type=int, default=50, help="Measured iterations per scenario.")
+        parser.add_argument('--warmup', type=int, default=5, help="Unmeasured iterations per scenario.")
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios', help="Only run this scenario. May be repeated."
+        )
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument('--compare', help="A previous JSON report to compare the results with.")
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Keep the seeded test database and reuse it on the next run, ignoring the volume options.",
+        )
+
+    def handle(self, *args, **options):
+        volumes = {key: options[key] for key in ('books', 'authors', 'order_items', 'users')}
+
+        test_settings = connection.settings_dict['TEST']
+        if options['keepdb'] and connection.vendor == 'sqlite' and not test_settings['NAME']:
+            # The default SQLite test database lives in memory and cannot be kept.
+            test_settings['NAME'] = 'benchmark.sqlite3'
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                report = self.benchmark(volumes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            for line in compare_reports(baseline, report):
+                self.stderr.write(line, style_func=None)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote the benchmark report to {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    def benchmark(self, volumes, options):
+        if Book.objects.exists():
+            self.stderr.write("Reusing the seeded test database.", style_func=None)
+        else:
+            seed_catalog(seed=options['seed'], batch_size=options['batch_size'], stdout=self.stderr, **volumes)
+
+        book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+        user_ids = list(CustomUser.objects.filter(username__startswith='seed-user-').order_by('id')
+                        .values_list('id', flat=True))
+        results = run_benchmarks(
+            build_scenarios(book_ids, user_ids), options['repeat'], options['warmup'], options['scenarios']
+        )
+        return build_report(results, volumes, options['seed'], options['repeat'], options['warmup'])
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.seeding import DEFAULT_BATCH_SIZE, seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds a deterministic synthetic catalog to the database for load testing: authors, books with "
+        "their authors, tags and inventory, cover images, orders and users. See main/seeding.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--authors', type=int, default=20000)
+        parser.add_argument('--order-items', type=int, default=1000000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.5, help="The share of books that get a cover image."
+        )
+        parser.add_argument(
+            '--cover-variants', type=int, default=20, help="How many distinct cover files the images share."
+        )
+        parser.add_argument('--days', type=int, default=365, help="Spread the orders over this many days.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['image_ratio'] <= 1:
+            raise CommandError("--image-ratio must be between 0 and 1.")
+        if options['authors'] < 1 and options['books']:
+            raise CommandError("Books need at least one author.")
+
+        start = time.monotonic()
+        created = seed_catalog(
+            books=options['books'],
+            authors=options['authors'],
+            order_items=options['order_items'],
+            users=options['users'],
+            image_ratio=options['image_ratio'],
+            cover_variants=options['cover_variants'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(created['books'])} books and {len(created['orders'])} orders "
+            f"in {time.monotonic() - start:.1f}s."
+        ))
@@ -0,0 +1,37 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bookspace.schema import generate_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the OpenAPI schema served at /openapi.json to OPENAPI_SCHEMA_PATH. Run it on every deploy, "
+        "see bookspace/schema.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Write the schema to this path instead of OPENAPI_SCHEMA_PATH.")
+        parser.add_argument(
+            '--check', action='store_true', help="Fail if the schema on disk is missing or out of date."
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['output'] or settings.OPENAPI_SCHEMA_PATH)
+        content = generate_schema()
+
+        if options['check']:
+            if not path.exists() or path.read_bytes() != content:
+                raise CommandError(f"{path} is out of date; run generate_openapi_schema.")
+            self.stdout.write(self.style.SUCCESS(f"{path} is up to date."))
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Replaced atomically so that workers never read a partly written schema.
+        temporary = path.with_name(f'.{path.name}.tmp')
+        temporary.write_bytes(content)
+        os.replace(temporary, path)
+        self.stdout.write(self.style.SUCCESS(f"Wrote the OpenAPI schema to {path} ({len(content)} bytes)."))
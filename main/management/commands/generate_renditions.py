@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from main.models import BookImage
+from main.renditions import delete_renditions
+from main.tasks import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Renders the responsive renditions of book images that have none yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true', help="Re-render the renditions of every image."
+        )
+
+    def handle(self, *args, **options):
+        images = BookImage.objects.exclude(cover_image='')
+        if options['force']:
+            for image in images.exclude(renditions={}).only('cover_image', 'renditions').iterator():
+                delete_renditions(image.renditions, image.cover_image.storage)
+            images.update(renditions={})
+        else:
+            images = images.filter(renditions={})
+
+        count = 0
+        for image_id in images.values_list('pk', flat=True).iterator():
+            generate_renditions(image_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rendered {count} book images."))
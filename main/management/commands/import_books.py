@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importers import DEFAULT_BATCH_SIZE, FORMATS, ImportFormatError, guess_format, import_books
+
+
+class Command(BaseCommand):
+    help = "Creates or updates (by ISBN) books from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The file to import, or - to read standard input.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        if file_format is None:
+            raise CommandError("Cannot tell the file format from its name, pass --format.")
+
+        try:
+            if path == '-':
+                result = import_books(sys.stdin.buffer, file_format, options['batch_size'])
+            else:
+                with open(path, 'rb') as stream:
+                    result = import_books(stream, file_format, options['batch_size'])
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(error)
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result.created} and updated {result.updated} books, skipped {len(result.errors)} rows."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main.search import rebuild_index, search_vendor
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of the book catalog."
+
+    def handle(self, *args, **options):
+        if search_vendor() is None:
+            self.stdout.write(self.style.WARNING(
+                "The configured database has no full-text index; searches use icontains lookups."
+            ))
+            return
+
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} books."))
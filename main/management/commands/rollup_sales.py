@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.dashboard import rollup_sales
+
+
+class Command(BaseCommand):
+    help = "Recomputes the sales aggregates shown on the admin dashboard."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, help="Only recompute the last DAYS days and the books ordered in them."
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.localdate() - datetime.timedelta(days=options['days'] - 1)
+
+        days, books = rollup_sales(since)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed the sales of {days} days and {books} books."))
@@ -0,0 +1,211 @@
+"""
+Lightweight per-request instrumentation, cheap enough to run in production.
+
+`RequestMetricsMiddleware` records, for a sampled share of the requests
+(`METRICS_SAMPLE_RATE`):
+
+- the number of SQL queries and the time spent in the database, through a
+  `connection.execute_wrapper` (no debug cursor, no SQL kept in memory),
+- the time spent rendering the response (templates of `TemplateResponse`s,
+  DRF renderers),
+- the time spent in `to_representation` of serializers using
+  `TimedSerializerMixin`,
+- the total time.
+
+The numbers are sent back in a `Server-Timing` header, readable in the
+browser's network panel, and aggregated per view and action (for example
+`BookViewSet.list` or `MainView.get`) into latency histograms. `metrics_view`
+exposes the aggregates in the Prometheus text format. Each worker process keeps
+its own aggregates, so scrape every worker or sum the series per instance.
+"""
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """The measurements of one request. Also used as the execute wrapper of the database connections."""
+
+    def __init__(self):
+        self.view_name = None
+        self.queries = 0
+        self.timings = {'db': 0.0, 'render': 0.0, 'serializer': 0.0, 'total': 0.0}
+        self._serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings['db'] += time.perf_counter() - start
+            self.queries += 1
+
+    @contextlib.contextmanager
+    def timing(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def server_timing(self):
+        """Returns the `Server-Timing` header value, durations in milliseconds."""
+        descriptions = {'db': f"{self.queries} queries"}
+        return ', '.join(
+            f'{name};dur={duration * 1000:.2f}' + (f';desc="{descriptions[name]}"' if name in descriptions else '')
+            for name, duration in self.timings.items()
+        )
+
+
+def get_current_metrics():
+    """Returns the `RequestMetrics` of the request being handled, or None if it is not sampled."""
+    return _current_metrics.get()
+
+
+class MetricsRegistry:
+    """Per-view latency histograms and totals, shared by the threads of a worker process."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view_name, metrics):
+        with self.lock:
+            view = self.views.get(view_name)
+            if view is None:
+                view = self.views[view_name] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'queries': 0,
+                    'seconds': dict.fromkeys(metrics.timings, 0.0),
+                }
+            total = metrics.timings['total']
+            for index, bound in enumerate(self.buckets):
+                if total <= bound:
+                    view['buckets'][index] += 1
+            view['count'] += 1
+            view['queries'] += metrics.queries
+            for name, duration in metrics.timings.items():
+                view['seconds'][name] += duration
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        """Returns the aggregates in the Prometheus text exposition format."""
+        with self.lock:
+            views = {name: {**view, 'buckets': list(view['buckets']), 'seconds': dict(view['seconds'])}
+                     for name, view in self.views.items()}
+
+        lines = [
+            '# HELP bookspace_request_duration_seconds Latency of the sampled requests by view.',
+            '# TYPE bookspace_request_duration_seconds histogram',
+        ]
+        for name, view in sorted(views.items()):
+            for bound, count in zip(self.buckets, view['buckets']):
+                lines.append(f'bookspace_request_duration_seconds_bucket{{view="{name}",le="{bound}"}} {count}')
+            lines.append(f'bookspace_request_duration_seconds_bucket{{view="{name}",le="+Inf"}} {view["count"]}')
+            lines.append(f'bookspace_request_duration_seconds_sum{{view="{name}"}} {view["seconds"]["total"]}')
+            lines.append(f'bookspace_request_duration_seconds_count{{view="{name}"}} {view["count"]}')
+
+        lines += [
+            '# HELP bookspace_request_queries_total SQL queries run by the sampled requests by view.',
+            '# TYPE bookspace_request_queries_total counter',
+        ]
+        lines += [f'bookspace_request_queries_total{{view="{name}"}} {view["queries"]}'
+                  for name, view in sorted(views.items())]
+
+        for timing in ('db', 'render', 'serializer'):
+            metric = f'bookspace_request_{timing}_seconds_total'
+            lines += [
+                f'# HELP {metric} Time the sampled requests spent in {timing} by view.',
+                f'# TYPE {metric} counter',
+            ]
+            lines += [f'{metric}{{view="{name}"}} {view["seconds"][timing]}' for name, view in sorted(views.items())]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(settings.METRICS_BUCKETS)
+
+
+def get_view_name(request, view_func):
+    """Returns the view and action handling `request`, e.g. `BookViewSet.list`."""
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return view_func.__qualname__
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f"{view_class.__name__}.{actions.get(method, method)}"
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures a `METRICS_SAMPLE_RATE` share of the requests, see the module docstring.
+
+    Should come first in `MIDDLEWARE` so that the total covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED or random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        metrics.timings['total'] = time.perf_counter() - start
+
+        registry.observe(metrics.view_name or '<unresolved>', metrics)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = get_current_metrics()
+        if metrics is not None:
+            metrics.view_name = get_view_name(request, view_func)
+
+    def process_template_response(self, request, response):
+        metrics = get_current_metrics()
+        if metrics is not None:
+            render = response.render
+
+            def timed_render():
+                with metrics.timing('render'):
+                    return render()
+
+            response.render = timed_render
+        return response
+
+
+class TimedSerializerMixin:
+    """Serializer mixin adding the time spent in `to_representation` to the request metrics."""
+
+    def to_representation(self, instance):
+        metrics = get_current_metrics()
+        # Nested serializers are part of the outermost one's time.
+        if metrics is None or metrics._serializer_depth:
+            return super().to_representation(instance)
+
+        metrics._serializer_depth += 1
+        try:
+            with metrics.timing('serializer'):
+                return super().to_representation(instance)
+        finally:
+            metrics._serializer_depth -= 1
@@ -0,0 +1,73 @@
+from django.db import migrations
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS main_book_fts USING fts5(
+    title, authors, isbn,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+SQLITE_POPULATE = """
+INSERT INTO main_book_fts (rowid, title, authors, isbn)
+SELECT
+    b.id,
+    b.title,
+    COALESCE((
+        SELECT group_concat(a.first_name || ' ' || a.last_name, ' ')
+        FROM main_book_authors ba
+        JOIN main_author a ON a.id = ba.author_id
+        WHERE ba.book_id = b.id
+    ), ''),
+    COALESCE(b.isbn, '')
+FROM main_book b
+"""
+
+POSTGRES_CREATE = """
+CREATE TABLE IF NOT EXISTS main_book_fts (
+    book_id bigint PRIMARY KEY REFERENCES main_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    document tsvector NOT NULL
+);
+CREATE INDEX IF NOT EXISTS main_book_fts_document_idx ON main_book_fts USING GIN (document)
+"""
+
+POSTGRES_POPULATE = """
+INSERT INTO main_book_fts (book_id, document)
+SELECT
+    b.id,
+    setweight(to_tsvector('simple', b.title), 'A')
+    || setweight(to_tsvector('simple', COALESCE((
+        SELECT string_agg(a.first_name || ' ' || a.last_name, ' ')
+        FROM main_book_authors ba
+        JOIN main_author a ON a.id = ba.author_id
+        WHERE ba.book_id = b.id
+    ), '')), 'B')
+    || setweight(to_tsvector('simple', COALESCE(b.isbn, '')), 'A')
+FROM main_book b
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_POPULATE)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_CREATE)
+        schema_editor.execute(POSTGRES_POPULATE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS main_book_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,160 @@
+import calendar
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from main.cache import get_catalog_generation, get_catalog_modified
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin adding the `?fields=` and `?expand=` query parameters.
+
+    - `?fields=id,title` trims the serialized objects down to the listed fields
+      and restricts the SQL to the columns those fields read with `.only()`.
+    - `?expand=images` adds the optional relations declared in the serializer's
+      `Meta.expandable_fields` and prefetches them.
+
+    Both parameters take comma-separated names and only apply to reads. The
+    serializer must accept `fields` and `expand` keyword arguments, see
+    `main.serializers.DynamicFieldsMixin`.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def _get_query_list(self, param):
+        if self.request is None or self.request.method != 'GET':
+            return None
+        value = self.request.query_params.get(param)
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def get_requested_fields(self):
+        return self._get_query_list(self.fields_query_param)
+
+    def get_requested_expansions(self):
+        return self._get_query_list(self.expand_query_param) or set()
+
+    def is_field_requested(self, name):
+        fields = self.get_requested_fields()
+        return fields is None or name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and self.request.method == 'GET':
+            kwargs.setdefault('fields', self.get_requested_fields())
+            kwargs.setdefault('expand', self.get_requested_expansions())
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        # Applied after get_queryset() so the view's own prefetches take precedence.
+        queryset = super().filter_queryset(queryset)
+        if self.request is None or self.request.method != 'GET':
+            return queryset
+
+        serializer = self.get_serializer_class()(
+            fields=self.get_requested_fields(), expand=self.get_requested_expansions()
+        )
+        expanded = [serializer.fields[name].source for name in self.get_requested_expansions()]
+        if expanded:
+            queryset = queryset.prefetch_related(*expanded)
+
+        if self.get_requested_fields() is not None:
+            columns = self.get_required_columns(queryset.model, serializer)
+            if columns is not None:
+                queryset = queryset.only(*columns)
+        return queryset
+
+    @staticmethod
+    def get_required_columns(model, serializer):
+        """
+        Returns the model columns read by the serializer's fields, or None when
+        a field reads the whole object and nothing can be deferred.
+        """
+        opts = model._meta
+        columns = {opts.pk.name}
+        for field in serializer.fields.values():
+            if field.source == '*':
+                return None
+            name, *path = field.source_attrs
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                # Model methods and properties; any relation they use must be prefetched by the view.
+                continue
+            if model_field.many_to_many or model_field.one_to_many:
+                continue
+            if model_field.is_relation and path:
+                columns.add(f"{name}__{path[0]}")
+            elif model_field.concrete:
+                columns.add(name)
+        return columns
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin adding strong `ETag` and `Last-Modified` headers to list and
+    retrieve responses, and answering `304 Not Modified` when the client's copy
+    is current.
+
+    The validators come from one aggregate query, `MAX(last_modified_field)`
+    plus the row count of the filtered queryset, combined with the catalog
+    generation (which covers related authors, tags, images and stock) and the
+    full request URL (which covers pagination and sparse fieldsets).
+    `Last-Modified` is the later of `MAX(last_modified_field)` and the time of
+    the last catalog generation bump, so that clients revalidating with
+    `If-Modified-Since` alone also see changes that leave the rows untouched.
+    """
+    last_modified_field = 'date_updated'
+
+    def get_validators(self, queryset):
+        state = queryset.order_by().aggregate(last_modified=Max(self.last_modified_field), count=Count('pk'))
+        if not state['count']:
+            return None, None
+
+        fingerprint = repr((
+            state['last_modified'].isoformat(),
+            state['count'],
+            get_catalog_generation(),
+            self.request.get_full_path(),
+            self.request.accepted_media_type,
+        ))
+        etag = quote_etag(hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+        last_modified = max(calendar.timegm(state['last_modified'].utctimetuple()), int(get_catalog_modified()))
+        return etag, last_modified
+
+    def conditional_response(self, request, queryset, render):
+        etag, last_modified = self.get_validators(queryset)
+        if etag is None:
+            return render()
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = render()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(request, queryset, lambda: super(ConditionalGetMixin, self).list(
+            request, *args, **kwargs
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        # Malformed lookups, e.g. a non-numeric pk, are not found, as in DRF's `get_object`.
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return self.conditional_response(request, queryset, lambda: super(ConditionalGetMixin, self).retrieve(
+            request, *args, **kwargs
+        ))
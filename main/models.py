@@ -1,6 +1,11 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
 from phonenumber_field.modelfields import PhoneNumberField
 
+from main.cache import bump_catalog_generation_on_commit
 from main.choices import *
+from main.renditions import FORMATS
 
 
 class Author(models.Model):
@@ -36,23 +41,68 @@ class Book(models.Model):
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            # Keyset pagination ordering, see `main.pagination`.
+            models.Index(fields=['date_updated', 'id'], name='main_book_updated_id_idx'),
+        ]
+
     def get_display_image(self):
         """Returns the best available image for display."""
-        book_image = self.bookimages.first()
-        if book_image:
+        # Iterating over .all() instead of calling .first() reuses prefetched images.
+        for book_image in self.bookimages.all():
             return book_image.thumbnail or book_image.cover_image
         return None
 
     def get_image_url(self):
-        """Returns the URL of the best available image."""
-        image = self.get_display_image()
-        return image.url if image else None
+        """Returns the URL of the best available image, preferring a rendition over the original."""
+        for book_image in self.bookimages.all():
+            return book_image.default_url
+        return None
 
 
 class BookImage(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='bookimages')
     cover_image = models.ImageField(upload_to='book-covers')
     thumbnail = models.ImageField(upload_to='book-thumbnails', null=True, editable=False)
+    # {format: {width: file name}}, filled in by `main.tasks.generate_renditions`.
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+
+    def get_rendition_formats(self):
+        """Returns the formats this image has renditions in, the fallback format last."""
+        return [name for name in settings.BOOK_IMAGE_RENDITION_FORMATS if self.renditions.get(name)]
+
+    def get_srcset(self, image_format):
+        """Returns the `srcset` attribute listing every width rendered in `image_format`."""
+        storage = self.cover_image.storage
+        widths = sorted(self.renditions.get(image_format, {}).items(), key=lambda item: int(item[0]))
+        return ', '.join(f"{storage.url(name)} {width}w" for width, name in widths)
+
+    @property
+    def sources(self):
+        """The `<source>` elements of a `<picture>`: every format but the fallback."""
+        return [
+            {'type': FORMATS[name][1], 'srcset': self.get_srcset(name)}
+            for name in self.get_rendition_formats()[:-1]
+        ]
+
+    @property
+    def fallback_srcset(self):
+        formats = self.get_rendition_formats()
+        return self.get_srcset(formats[-1]) if formats else ''
+
+    @property
+    def default_url(self):
+        """
+        The URL of the fallback rendition closest to `BOOK_IMAGE_DEFAULT_WIDTH`,
+        or of the original cover while no renditions exist.
+        """
+        formats = self.get_rendition_formats()
+        if not formats:
+            return self.cover_image.url if self.cover_image else None
+        widths = self.renditions[formats[-1]]
+        width = min(widths, key=lambda width: abs(int(width) - settings.BOOK_IMAGE_DEFAULT_WIDTH))
+        return self.cover_image.storage.url(widths[width])
 
 
 class Order(models.Model):
@@ -75,6 +125,12 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
 
+    class Meta:
+        indexes = [
+            # Daily sales rollups and the order listings.
+            models.Index(fields=['order_date'], name='main_order_date_idx'),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
@@ -91,16 +147,147 @@ class OrderItem(models.Model):
         return f"{self.quantity}x {self.book.title}"
 
 
+class InsufficientStock(Exception):
+    """Raised when a reservation asks for more copies of a book than are in stock."""
+
+    def __init__(self, book_ids):
+        self.book_ids = sorted(book_ids)
+        super().__init__(f"Insufficient stock for book(s): {', '.join(map(str, self.book_ids))}.")
+
+
+class BookInventoryQuerySet(models.QuerySet):
+    """
+    Race-free stock mutations. Every change is a single conditional UPDATE on
+    `stock_quantity` computed by the database with F() expressions, so
+    concurrent workers can neither lose updates nor oversell. The new
+    quantities are read back inside the same transaction, while the UPDATE
+    still holds the row locks. Cached catalog pages are invalidated when the
+    surrounding transaction commits.
+    """
+
+    def add_stock(self, book_id, quantity=1):
+        """Adds `quantity` copies of a book and returns its new stock quantity."""
+        return self.add_stock_many({book_id: quantity})[book_id]
+
+    def add_stock_many(self, quantities):
+        """Adds copies of several books, given as `{book_id: quantity}`, and returns their new quantities."""
+        if not self._check_quantities(quantities):
+            return {}
+
+        with transaction.atomic():
+            updated = self.filter(name_id__in=quantities).update(
+                stock_quantity=F('stock_quantity') + self._quantity_case(quantities)
+            )
+            if updated != len(quantities):
+                raise self.model.DoesNotExist("Some of the books have no inventory.")
+            stock = self._stock_of(quantities)
+        bump_catalog_generation_on_commit()
+        return stock
+
+    def reserve(self, book_id, quantity=1):
+        """
+        Takes `quantity` copies of a book out of stock and returns the remaining
+        quantity, or raises `InsufficientStock` without changing anything.
+        """
+        return self.reserve_many({book_id: quantity})[book_id]
+
+    def reserve_many(self, quantities):
+        """
+        Takes copies of several books, given as `{book_id: quantity}`, out of
+        stock in one UPDATE and returns the remaining quantities. Either every
+        book is reserved or, raising `InsufficientStock`, none is.
+        """
+        if not self._check_quantities(quantities):
+            return {}
+
+        available = Q()
+        for book_id, quantity in quantities.items():
+            available |= Q(name_id=book_id, stock_quantity__gte=quantity)
+
+        try:
+            with transaction.atomic():
+                updated = self.filter(available).update(
+                    stock_quantity=F('stock_quantity') - self._quantity_case(quantities)
+                )
+                if updated != len(quantities):
+                    # Undo the books that could be reserved.
+                    raise InsufficientStock(())
+                stock = self._stock_of(quantities)
+        except InsufficientStock:
+            stock = self._stock_of(quantities)
+            raise InsufficientStock(
+                book_id for book_id, quantity in quantities.items() if stock.get(book_id, 0) < quantity
+            ) from None
+
+        bump_catalog_generation_on_commit()
+        return stock
+
+    def _check_quantities(self, quantities):
+        for quantity in quantities.values():
+            if not isinstance(quantity, int) or quantity < 1:
+                raise ValueError(f"Stock quantities must be positive integers, got {quantity!r}.")
+        return bool(quantities)
+
+    def _quantity_case(self, quantities):
+        return Case(
+            *(When(name_id=book_id, then=Value(quantity)) for book_id, quantity in quantities.items()),
+            output_field=models.PositiveIntegerField(),
+        )
+
+    def _stock_of(self, book_ids):
+        return dict(self.filter(name_id__in=book_ids).values_list('name_id', 'stock_quantity'))
+
+
 class BookInventory(models.Model):
     name = models.OneToOneField(Book, on_delete=models.CASCADE)
-    stock_quantity = models.PositiveIntegerField()
+    # Indexed for the dashboard's low-stock list.
+    stock_quantity = models.PositiveIntegerField(db_index=True)
+
+    objects = BookInventoryQuerySet.as_manager()
+
+    def add_to_stock_quantity(self, quantity=1):
+        self.stock_quantity = BookInventory.objects.add_stock(self.name_id, quantity)
+        return self.stock_quantity
+
+    def deduct_stock_quantity(self, quantity=1):
+        # Out of stock books are left at zero.
+        try:
+            self.stock_quantity = BookInventory.objects.reserve(self.name_id, quantity)
+        except InsufficientStock:
+            self.refresh_from_db(fields=['stock_quantity'])
+        return self.stock_quantity
 
-    def add_to_stock_quantity(self):
-        self.stock_quantity + 1
-        self.save()
 
-    def deduct_stock_quantity(self):
-        if self.stock_quantity > 0:
-            self.stock_quantity - 1
-            self.save()
+class DailySales(models.Model):
+    """Orders and revenue per day and order status, maintained by `main.dashboard`."""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
+    class Meta:
+        ordering = ['-date', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='main_dailysales_date_status_uniq'),
+        ]
+        verbose_name_plural = 'daily sales'
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.revenue}"
+
+
+class BookSales(models.Model):
+    """Copies sold and revenue per book over orders that were not cancelled, maintained by `main.dashboard`."""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # The dashboard's best sellers.
+            models.Index(fields=['-units_sold'], name='main_booksales_units_idx'),
+        ]
+        verbose_name_plural = 'book sales'
+
+    def __str__(self):
+        return f"{self.book_id}: {self.units_sold} sold"
@@ -0,0 +1,73 @@
+"""
+Order placement.
+
+`place_order` checks and prices a whole cart with one query, reserves the stock
+of every line with a single conditional UPDATE (see
+`BookInventoryQuerySet.reserve_many`), inserts the items with one
+`bulk_create` and computes the order total in SQL. As the items bypass the
+`OrderItem` signals, it adds the order's revenue and book sales to the sales
+aggregates itself (see `main.dashboard`). The query count does not depend on
+the number of lines, and either the whole order is placed or nothing is.
+"""
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from main.dashboard import add_book_sales, add_daily_sales, counts_towards_book_sales, order_day
+from main.models import Book, BookInventory, Order, OrderItem
+
+
+class UnknownBooks(Exception):
+    """Raised when a cart refers to books that do not exist."""
+
+    def __init__(self, book_ids):
+        self.book_ids = sorted(book_ids)
+        super().__init__(f"Unknown book(s): {', '.join(map(str, self.book_ids))}.")
+
+
+def merge_lines(lines):
+    """Returns `{book_id: quantity}` for `(book_id, quantity)` lines, adding up repeated books."""
+    quantities = {}
+    for book_id, quantity in lines:
+        quantities[book_id] = quantities.get(book_id, 0) + quantity
+    return quantities
+
+
+def order_total():
+    """The SQL expression summing the lines of an order."""
+    line_totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Sum(F('quantity') * F('price_at_time'))
+    ).values('total')
+    output_field = DecimalField(max_digits=10, decimal_places=2)
+    return Coalesce(Subquery(line_totals, output_field=output_field), Value(0), output_field=output_field)
+
+
+@transaction.atomic
+def place_order(lines, **order_fields):
+    """
+    Creates an order for `(book_id, quantity)` lines with the given `Order`
+    fields, taking the books out of stock. Raises `UnknownBooks` or
+    `InsufficientStock` without changing anything.
+    """
+    quantities = merge_lines(lines)
+    prices = dict(Book.objects.filter(pk__in=quantities).values_list('id', 'price'))
+    if len(prices) != len(quantities):
+        raise UnknownBooks(set(quantities) - set(prices))
+
+    BookInventory.objects.reserve_many(quantities)
+
+    order = Order.objects.create(total_amount=0, **order_fields)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, book_id=book_id, quantity=quantity, price_at_time=prices[book_id])
+        for book_id, quantity in quantities.items()
+    ])
+    Order.objects.filter(pk=order.pk).update(total_amount=order_total())
+    order.refresh_from_db(fields=['total_amount'])
+
+    # The order itself was counted by its post_save signal, with a zero total.
+    add_daily_sales(order_day(order.order_date), order.status, revenue=order.total_amount)
+    if counts_towards_book_sales(order.status):
+        add_book_sales({
+            book_id: (quantity, quantity * prices[book_id]) for book_id, quantity in quantities.items()
+        })
+    return order
@@ -0,0 +1,282 @@
+"""
+Keyset (cursor) pagination for the catalog.
+
+Instead of ``OFFSET n`` every page is fetched with a ``WHERE`` clause that
+continues after the last row of the previous page on a stable, unique
+ordering such as (`date_updated`, `id`). Page N therefore costs the same as
+page 1, and no ``COUNT(*)`` is needed to paginate. A cheap, optionally capped
+row estimate is available for clients that want to display a total.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+DEFAULT_COUNT_CAP = 1000
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def estimate_count(queryset, cap=DEFAULT_COUNT_CAP):
+    """
+    Returns a `(count, exact)` tuple for `queryset` without an unbounded COUNT(*).
+
+    Unfiltered querysets on PostgreSQL are estimated from the planner statistics
+    in `pg_class`. Otherwise rows are counted up to `cap`; when the cap is hit the
+    count is reported as inexact.
+    """
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0], False
+
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of large tables, counting rows with
+    `estimate_count` instead of an exact COUNT(*) over the whole table.
+
+    Pages past `count_cap` rows of a filtered changelist are not reachable;
+    narrow the list down with filters or search instead.
+    """
+    count_cap = 10000
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list, self.count_cap)[0]
+
+
+class KeysetPage:
+    """A single page returned by `KeysetPaginator.page`."""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self)} objects>"
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset on `ordering`, a sequence of field or annotation names
+    optionally prefixed with "-" for descending order.
+
+    The ordering must end with a unique, non-null column (usually "id") so that
+    every row has a distinct position.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count_cap=DEFAULT_COUNT_CAP):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.count_cap = count_cap
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def estimated_count(self):
+        return estimate_count(self.queryset, self.count_cap)
+
+    def page(self, cursor=None):
+        """Returns the page following (or, for a "previous" cursor, preceding) `cursor`."""
+        position, backwards = self.decode_cursor(cursor) if cursor else (None, False)
+
+        queryset = self.queryset
+        immediate_fields, defer = queryset.query.deferred_loading
+        if immediate_fields and not defer:
+            # The cursor is built from the ordering fields, so they must not be deferred by .only().
+            queryset = queryset.only(*immediate_fields, *(name for name, _ in self.keys if self._field(name)))
+        if position is not None:
+            queryset = queryset.filter(self._position_filter(position, backwards))
+
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+        objects = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+
+        if backwards:
+            objects.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        return KeysetPage(
+            objects,
+            self,
+            next_cursor=self.encode_cursor(objects[-1], backwards=False) if has_next and objects else None,
+            previous_cursor=self.encode_cursor(objects[0], backwards=True) if has_previous and objects else None,
+        )
+
+    def _position_filter(self, position, backwards):
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.keys, position):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _field(self, name):
+        opts = self.queryset.model._meta
+        if name == 'pk':
+            return opts.pk
+        try:
+            return opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def encode_cursor(self, obj, backwards):
+        values = []
+        for name, _ in self.keys:
+            value = getattr(obj, name)
+            if isinstance(value, (datetime.date, datetime.time)):
+                value = value.isoformat()
+            elif isinstance(value, decimal.Decimal):
+                value = str(value)
+            values.append(value)
+
+        payload = json.dumps({'p': values, 'b': int(backwards)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            values, backwards = payload['p'], bool(payload['b'])
+            if len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+
+            position = []
+            for (name, _), value in zip(self.keys, values):
+                field = self._field(name)
+                position.append(field.to_python(value) if field is not None else value)
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError) as error:
+            raise InvalidCursor(cursor) from error
+
+        return position, backwards
+
+
+class KeysetPagination(BasePagination):
+    """
+    Django REST framework pagination backed by `KeysetPaginator`.
+
+    Views may set `keyset_ordering` to override the default ordering. Passing
+    `?count=estimate` adds a (possibly capped) `count` and `count_is_exact` to
+    the response.
+    """
+    page_size = 12
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('-date_updated', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.paginator = KeysetPaginator(
+            queryset, getattr(view, 'keyset_ordering', self.ordering), self.get_page_size(request)
+        )
+        try:
+            self.page = self.paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound("Invalid cursor.")
+        return self.page.object_list
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.request.query_params.get(self.count_query_param) == 'estimate':
+            payload['count'], payload['count_is_exact'] = self.paginator.estimated_count()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Cursor', description='The pagination cursor value.'),
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(title='Page size', description='Number of results to return per page.'),
+            ),
+            coreapi.Field(
+                name=self.count_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    title='Count', description='Set to "estimate" to include an estimated result count.'
+                ),
+            ),
+        ]
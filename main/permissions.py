@@ -1,15 +1,15 @@
 from rest_framework.exceptions import PermissionDenied, AuthenticationFailed
 from rest_framework.permissions import BasePermission
 
+from users.choices import ASSISTANT_MANAGER_ROLES, MANAGER_ROLES, STAFF_ROLES
+
 
 class CanActOnAuthor(BasePermission):
     message = {"message": "Only bookspace owners, managers, and assistants have permission to perform this action."}
 
     def has_permission(self, request, view):
         # Check if the current user is an assistant bookspace manager
-        if request.user.is_authenticated and (
-                request.user.is_assistant_bookspace_manager or request.user.is_bookspace_manager
-                or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(ASSISTANT_MANAGER_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
@@ -23,9 +23,7 @@ class CanActOnBookTag(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is an assistant bookspace manager
-        if request.user.is_authenticated and (
-                request.user.is_assistant_bookspace_manager or request.user.is_bookspace_manager
-                or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(ASSISTANT_MANAGER_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
@@ -39,8 +37,7 @@ class CanAddBook(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is a bookspace worker
-        if request.user.is_authenticated and (request.user.is_bookspace_owner or request.user.is_bookspace_worker or
-                                              request.user.is_bookspace_manager or request.user.is_assistant_bookspace_manager):
+        if request.user.is_authenticated and request.user.has_role(STAFF_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
@@ -54,7 +51,7 @@ class CanDeleteBook(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is an assistant bookspace manager as well as others
-        if request.user.is_authenticated and (request.user.is_bookspace_manager or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(MANAGER_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
@@ -68,9 +65,7 @@ class CanUpdateBook(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is an assistant bookspace manager as well as others
-        if request.user.is_authenticated and (
-                request.user.is_assistant_bookspace_manager or request.user.is_bookspace_manager
-                or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(ASSISTANT_MANAGER_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
@@ -84,8 +79,7 @@ class CanAddBookImage(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is a bookspace worker
-        if request.user.is_authenticated and (request.user.is_bookspace_owner or request.user.is_bookspace_worker or
-                                              request.user.is_bookspace_manager or request.user.is_assistant_bookspace_manager):
+        if request.user.is_authenticated and request.user.has_role(STAFF_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
@@ -99,7 +93,7 @@ class CanDeleteBookImage(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is an assistant bookspace manager as well as others
-        if request.user.is_authenticated and (request.user.is_bookspace_manager or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(MANAGER_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
@@ -113,9 +107,21 @@ class CanUpdateBookImage(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is an assistant bookspace manager as well as others
-        if request.user.is_authenticated and (
-                request.user.is_assistant_bookspace_manager or request.user.is_bookspace_manager
-                or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(ASSISTANT_MANAGER_ROLES):
+            return True
+        if not request.user.is_authenticated:
+            raise AuthenticationFailed(
+                {"message": "Authentication credentials were not provided."}
+            )
+        raise PermissionDenied(self.message)
+
+
+class CanViewOrder(BasePermission):
+    message = {"message": "Only bookspace staff and workers have permission to view orders."}
+
+    def has_permission(self, request, view):
+        # Check if the current user is a bookspace worker
+        if request.user.is_authenticated and request.user.has_role(STAFF_ROLES):
             return True
         if not request.user.is_authenticated:
             raise AuthenticationFailed(
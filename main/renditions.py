@@ -0,0 +1,79 @@
+"""
+Responsive renditions of book cover images.
+
+Every cover is re-encoded at the widths in `BOOK_IMAGE_RENDITION_WIDTHS` and in
+each format of `BOOK_IMAGE_RENDITION_FORMATS`, most efficient format first and
+the universally supported fallback (JPEG) last. The stored file names end up in
+`BookImage.renditions` as ``{format: {width: name}}``, from which templates
+build ``<picture>`` sources and ``srcset`` attributes.
+"""
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+UPLOAD_TO = 'book-renditions'
+
+
+def get_formats():
+    """Returns the configured rendition formats that this Pillow build can encode."""
+    Image.init()
+    return [name for name in settings.BOOK_IMAGE_RENDITION_FORMATS if FORMATS[name][0] in Image.SAVE]
+
+
+def get_widths(source_width):
+    """Returns the configured widths not wider than the source, which is never upscaled."""
+    configured = sorted(settings.BOOK_IMAGE_RENDITION_WIDTHS)
+    widths = [width for width in configured if width < source_width]
+    if configured[-1] >= source_width:
+        # Narrow covers get one rendition at their own width instead.
+        widths.append(source_width)
+    return widths
+
+
+def encode(img, name):
+    pil_format = FORMATS[name][0]
+    if pil_format == 'JPEG' and img.mode != 'RGB':
+        # JPEG has no alpha channel; flatten transparent covers onto white.
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A') if 'A' in img.getbands() else None)
+        img = background
+    buffer = io.BytesIO()
+    img.save(buffer, pil_format, quality=settings.BOOK_IMAGE_RENDITION_QUALITY, optimize=pil_format == 'JPEG')
+    return buffer.getvalue()
+
+
+def render_renditions(book_image):
+    """
+    Encodes and stores every rendition of `book_image.cover_image` and returns
+    the mapping to save in `BookImage.renditions`.
+    """
+    storage = book_image.cover_image.storage
+    renditions = {}
+    with book_image.cover_image.open('rb') as cover:
+        source = Image.open(cover)
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'transparency' in source.info or 'A' in source.getbands() else 'RGB')
+
+    for width in get_widths(source.width):
+        height = max(1, round(source.height * width / source.width))
+        resized = source.resize((width, height), Image.Resampling.LANCZOS) if width != source.width else source
+        for name in get_formats():
+            path = f"{UPLOAD_TO}/{book_image.pk}/{width}.{name}"
+            stored = storage.save(path, ContentFile(encode(resized, name)))
+            renditions.setdefault(name, {})[str(width)] = stored
+    return renditions
+
+
+def delete_renditions(renditions, storage):
+    for names in renditions.values():
+        for name in names.values():
+            storage.delete(name)
@@ -0,0 +1,168 @@
+"""
+Full-text search index for the book catalog.
+
+The index lives in a side table named `main_book_fts` which is created by the
+`0002_book_search_index` migration:
+
+- SQLite: an FTS5 virtual table keyed on the book id (``rowid``) with one column
+  per searchable field, ranked with ``bm25``.
+- PostgreSQL: a regular table holding a weighted ``tsvector`` per book with a
+  GIN index, ranked with ``ts_rank``.
+
+Any other backend falls back to the original ``icontains`` lookups.
+
+The index is kept in sync by the receivers in `main.signals`, and can be rebuilt
+from scratch with ``python manage.py rebuild_search_index``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from main.models import Book
+
+SEARCH_TABLE = 'main_book_fts'
+SEARCH_TERM_RE = re.compile(r'\w+')
+INDEX_BATCH_SIZE = 500
+
+# Relative weight of the title, authors and isbn columns when ranking matches.
+SQLITE_COLUMN_WEIGHTS = (10.0, 5.0, 10.0)
+
+
+def search_vendor():
+    """Returns the database vendor if it has a full-text index, otherwise None."""
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return connection.vendor
+    return None
+
+
+def _chunks(values, size=INDEX_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _build_documents(book_ids):
+    """Returns a mapping of book id to its (title, authors, isbn) search document."""
+    documents = {
+        book_id: [title, [], isbn or '']
+        for book_id, title, isbn in Book.objects.filter(pk__in=book_ids).values_list('id', 'title', 'isbn')
+    }
+    authors = Book.authors.through.objects.filter(book_id__in=documents).values_list(
+        'book_id', 'author__first_name', 'author__last_name'
+    )
+    for book_id, first_name, last_name in authors:
+        documents[book_id][1].append(f"{first_name} {last_name}")
+
+    return {
+        book_id: (title, ' '.join(author_names), isbn)
+        for book_id, (title, author_names, isbn) in documents.items()
+    }
+
+
+def index_books(book_ids):
+    """Adds or refreshes the index entries of the given books."""
+    vendor = search_vendor()
+    if vendor is None:
+        return
+
+    for chunk in _chunks(set(book_ids)):
+        documents = _build_documents(chunk)
+        with connection.cursor() as cursor:
+            if vendor == 'sqlite':
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", chunk)
+                cursor.executemany(
+                    f"INSERT INTO {SEARCH_TABLE} (rowid, title, authors, isbn) VALUES (%s, %s, %s, %s)",
+                    [(book_id, *document) for book_id, document in documents.items()],
+                )
+            else:
+                missing = [book_id for book_id in chunk if book_id not in documents]
+                if missing:
+                    cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE book_id = ANY(%s)", [missing])
+                cursor.executemany(
+                    f"""
+                    INSERT INTO {SEARCH_TABLE} (book_id, document)
+                    VALUES (
+                        %s,
+                        setweight(to_tsvector('simple', %s), 'A')
+                        || setweight(to_tsvector('simple', %s), 'B')
+                        || setweight(to_tsvector('simple', %s), 'A')
+                    )
+                    ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document
+                    """,
+                    [(book_id, *document) for book_id, document in documents.items()],
+                )
+
+
+def unindex_books(book_ids):
+    """Removes the index entries of the given books."""
+    vendor = search_vendor()
+    if vendor is None:
+        return
+
+    key = 'rowid' if vendor == 'sqlite' else 'book_id'
+    for chunk in _chunks(set(book_ids)):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({placeholders})", chunk)
+
+
+def rebuild_index():
+    """Drops every index entry and re-indexes the whole catalog. Returns the number of books indexed."""
+    vendor = search_vendor()
+    if vendor is None:
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    book_ids = list(Book.objects.values_list('pk', flat=True))
+    index_books(book_ids)
+    return len(book_ids)
+
+
+def search_books(queryset, query):
+    """
+    Filters a `Book` queryset down to the books matching `query`.
+
+    Every search term is matched as a prefix so partially typed words still
+    match. On indexed backends the queryset is annotated with `search_rank`
+    (higher is more relevant) and ordered by it.
+    """
+    vendor = search_vendor()
+    terms = SEARCH_TERM_RE.findall(query)
+
+    if vendor is None or not terms:
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(authors__first_name__icontains=query) |
+            Q(authors__last_name__icontains=query) |
+            Q(isbn__icontains=query)
+        ).distinct()
+
+    book_id = f"{connection.ops.quote_name(Book._meta.db_table)}.{connection.ops.quote_name('id')}"
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in SQLITE_COLUMN_WEIGHTS)
+        matching_ids = RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", (match,))
+        rank = RawSQL(
+            f"SELECT -bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid = {book_id}",
+            (match,),
+            output_field=FloatField(),
+        )
+    else:
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        matching_ids = RawSQL(
+            f"SELECT book_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('simple', %s)", (tsquery,)
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {SEARCH_TABLE} WHERE book_id = {book_id}",
+            (tsquery,),
+            output_field=FloatField(),
+        )
+
+    return queryset.filter(pk__in=matching_ids).annotate(search_rank=rank).order_by('-search_rank', '-pk')
@@ -0,0 +1,286 @@
+"""
+Deterministic synthetic catalog data for benchmarks and load tests.
+
+`CatalogSeeder` fills the database with authors, books (with their authors,
+tags and inventory), cover images, orders and users. The same seed always produces the same
+rows, so runs on different commits can be compared. Rows are written in
+batches with `bulk_create`, many-to-many relations straight into their through
+tables; no `save()` is called and no `post_save` signal fires, so the derived
+data that the signals would maintain (the search index, the sales aggregates
+and the catalog generation) is rebuilt once at the end by `seed_catalog`.
+Primary keys are read back from the bulk inserts, which needs PostgreSQL or
+SQLite 3.35+.
+
+Book popularity is skewed: the books ordered follow a Zipf distribution over
+the catalog, so a few books sell a lot and most sell little. Orders are
+placed by a pool of returning customers.
+
+Cover images are JPEGs of common cover sizes with photo-like grain, so they
+weigh about what real covers do. A small pool of distinct files is rendered
+and shared by all the seeded `BookImage` rows; thumbnails and renditions are
+left to the `generate_renditions` command and the background jobs.
+"""
+import datetime
+import io
+import itertools
+import random
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+from phonenumber_field.phonenumber import to_python as to_phone_number
+
+from main.cache import bump_catalog_generation
+from main.dashboard import rollup_sales
+from main.models import *
+from main.search import rebuild_index
+from users.choices import SexChoices
+from users.models import CustomUser
+
+FIRST_NAMES = (
+    'Amina', 'Brian', 'Chloe', 'Daniel', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'James', 'Kamau',
+    'Lucy', 'Mercy', 'Njeri', 'Otieno', 'Peter', 'Quincy', 'Rose', 'Samuel', 'Tabitha', 'Umar', 'Victor',
+    'Wanjiru', 'Xavier', 'Yusuf', 'Zawadi',
+)
+LAST_NAMES = (
+    'Achieng', 'Baraka', 'Chege', 'Davies', 'Evance', 'Fernandes', 'Gitau', 'Hughes', 'Ibrahim', 'Jensen',
+    'Kariuki', 'Langat', 'Mwangi', 'Nyambura', 'Odhiambo', 'Patel', 'Quaye', 'Ruto', 'Smith', 'Tanaka',
+    'Usman', 'Van der Berg', 'Wafula', 'Xu', 'Yamamoto', 'Zulu',
+)
+TITLE_WORDS = (
+    'Shadow', 'River', 'Empire', 'Garden', 'Silence', 'Fire', 'Journey', 'Secret', 'Kingdom', 'Storm',
+    'Memory', 'Ocean', 'Winter', 'Promise', 'Machine', 'Forest', 'Crown', 'Letters', 'Island', 'Light',
+    'Laws', 'Power', 'Nature', 'War', 'Peace', 'Stars', 'Dream', 'House', 'City', 'Road',
+)
+COVER_SIZES = ((1200, 1800), (1000, 1500), (800, 1200), (1400, 2100))
+ORDER_STATUSES = ('PAID', 'DELIVERED', 'PENDING', 'CANCELLED')
+ORDER_STATUS_WEIGHTS = (50, 30, 15, 5)
+
+DEFAULT_BATCH_SIZE = 2000
+
+
+def zipf_cum_weights(count, exponent=1.1):
+    """Returns cumulative Zipf weights for `count` items ranked by popularity, for `random.choices`."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class CatalogSeeder:
+    """
+    Writes synthetic catalog rows in batches of `batch_size`, drawing every
+    value from a `random.Random(seed)`.
+
+    Every `seed_*` method returns the primary keys of the rows it created.
+    """
+
+    def __init__(self, seed=0, batch_size=DEFAULT_BATCH_SIZE, stdout=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def batches(self, count):
+        """Yields `range`s of at most `batch_size` indexes covering `range(count)`."""
+        for start in range(0, count, self.batch_size):
+            yield range(start, min(start + self.batch_size, count))
+
+    def seed_tags(self):
+        existing = set(BookTag.objects.values_list('name', flat=True))
+        BookTag.objects.bulk_create([BookTag(name=name) for name in BookTagChoices.values if name not in existing])
+        return list(BookTag.objects.order_by('id').values_list('id', flat=True))
+
+    def seed_authors(self, count):
+        author_ids = []
+        for batch in self.batches(count):
+            authors = [
+                Author(
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    bio=f"Author of {self.rng.randint(1, 40)} books.",
+                )
+                for _ in batch
+            ]
+            author_ids.extend(author.pk for author in Author.objects.bulk_create(authors))
+        self.log(f"Created {len(author_ids)} authors.")
+        return author_ids
+
+    def make_cover(self, size):
+        """Returns the bytes of a JPEG cover of `size`: a two-colour gradient with grain."""
+        top, bottom = (tuple(self.rng.randrange(256) for _ in range(3)) for _ in range(2))
+        cover = Image.composite(
+            Image.new('RGB', size, bottom), Image.new('RGB', size, top), Image.linear_gradient('L').resize(size)
+        )
+        grain = Image.frombytes('L', size, self.rng.randbytes(size[0] * size[1])).convert('RGB')
+        buffer = io.BytesIO()
+        Image.blend(cover, grain, 0.12).save(buffer, 'JPEG', quality=85)
+        return buffer.getvalue()
+
+    def make_book(self, index):
+        title = ' '.join(self.rng.sample(TITLE_WORDS, self.rng.randint(1, 4)))
+        return Book(
+            title=f"The {title} {index}",
+            description=f"A story about {' and '.join(self.rng.sample(TITLE_WORDS, 2)).lower()}.",
+            publication_date=datetime.date(self.rng.randint(1900, 2024), self.rng.randint(1, 12), 1),
+            isbn=f"979{index:010d}",
+            price=Decimal(self.rng.randint(499, 9999)) / 100,
+        )
+
+    def seed_books(self, count, author_ids, tag_ids, max_authors=3, max_tags=3):
+        """Creates `count` books with 1 to `max_authors` authors, 1 to `max_tags` tags and an inventory each."""
+        BookAuthors = Book.authors.through
+        BookTags = Book.tags.through
+        # Keeps the generated ISBNs unique when seeding on top of an existing catalog.
+        offset = Book.objects.count()
+        book_ids = []
+        for batch in self.batches(count):
+            with transaction.atomic():
+                books = Book.objects.bulk_create([self.make_book(offset + index) for index in batch])
+                ids = [book.pk for book in books]
+                BookAuthors.objects.bulk_create([
+                    BookAuthors(book_id=book_id, author_id=author_id)
+                    for book_id in ids
+                    for author_id in self.rng.sample(author_ids, self.rng.randint(1, min(max_authors, len(author_ids))))
+                ])
+                BookTags.objects.bulk_create([
+                    BookTags(book_id=book_id, booktag_id=tag_id)
+                    for book_id in ids
+                    for tag_id in self.rng.sample(tag_ids, self.rng.randint(1, min(max_tags, len(tag_ids))))
+                ])
+                BookInventory.objects.bulk_create([
+                    BookInventory(name_id=book_id, stock_quantity=self.rng.randint(0, 200)) for book_id in ids
+                ])
+            book_ids.extend(ids)
+        self.log(f"Created {len(book_ids)} books.")
+        return book_ids
+
+    def seed_images(self, book_ids, ratio=0.5, variants=20):
+        """
+        Gives about `ratio` of the books a cover image, shared from a pool of
+        `variants` rendered files.
+        """
+        storage = BookImage._meta.get_field('cover_image').storage
+        covers = [
+            storage.save(
+                f'book-covers/seed-cover-{number}.jpg', ContentFile(self.make_cover(self.rng.choice(COVER_SIZES)))
+            )
+            for number in range(variants)
+        ]
+
+        image_ids = []
+        for batch in self.batches(len(book_ids)):
+            images = [
+                BookImage(book_id=book_ids[index], cover_image=self.rng.choice(covers))
+                for index in batch
+                if self.rng.random() < ratio
+            ]
+            image_ids.extend(image.pk for image in BookImage.objects.bulk_create(images))
+        self.log(f"Created {len(image_ids)} book images from {len(covers)} cover files.")
+        return image_ids
+
+    def make_customers(self, count):
+        customers = []
+        for number in range(count):
+            first_name, last_name = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            customers.append({
+                'customer_name': f"{first_name} {last_name}",
+                # Parsed once here rather than for every order.
+                'phone_number': to_phone_number(f"+2547{number % 10 ** 8:08d}"),
+                'email': f"{first_name}.{last_name.replace(' ', '')}{number}@example.com".lower(),
+            })
+        return customers
+
+    def seed_orders(self, item_count, book_ids, days=365, max_items=5, customers=None):
+        """
+        Creates orders totalling `item_count` order items over the last `days`
+        days, the books drawn by Zipf popularity. The orders are placed by
+        `customers` customers, by default one for every ten order items.
+        """
+        customers = self.make_customers(customers or item_count // 10 + 1)
+        prices = dict(Book.objects.filter(pk__in=book_ids).values_list('pk', 'price'))
+        ranked = list(book_ids)
+        self.rng.shuffle(ranked)
+        cum_weights = zipf_cum_weights(len(ranked))
+        now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+        order_ids = []
+        created_items = 0
+        while created_items < item_count:
+            orders, order_items, order_days = [], [], []
+            while len(orders) < self.batch_size and created_items < item_count:
+                lines = {}
+                for book_id in self.rng.choices(ranked, cum_weights=cum_weights, k=self.rng.randint(1, max_items)):
+                    lines[book_id] = lines.get(book_id, 0) + 1
+                lines = dict(itertools.islice(lines.items(), item_count - created_items))
+                created_items += len(lines)
+
+                orders.append(Order(
+                    **self.rng.choice(customers),
+                    status=self.rng.choices(ORDER_STATUSES, weights=ORDER_STATUS_WEIGHTS)[0],
+                    total_amount=sum(prices[book_id] * quantity for book_id, quantity in lines.items()),
+                ))
+                order_items.append(lines)
+                # Orders are generated oldest first, spread evenly over the period.
+                order_days.append(days - 1 - (created_items - 1) * days // item_count)
+
+            with transaction.atomic():
+                ids = [order.pk for order in Order.objects.bulk_create(orders)]
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order_id, book_id=book_id, quantity=quantity, price_at_time=prices[book_id])
+                    for order_id, lines in zip(ids, order_items)
+                    for book_id, quantity in lines.items()
+                ])
+                # order_date is auto_now_add, so it is backdated afterwards, one UPDATE per day.
+                for day, group in itertools.groupby(zip(ids, order_days), key=lambda pair: pair[1]):
+                    group = [order_id for order_id, _ in group]
+                    Order.objects.filter(pk__range=(group[0], group[-1])).update(
+                        order_date=now - datetime.timedelta(days=day)
+                    )
+            order_ids.extend(ids)
+        self.log(f"Created {len(order_ids)} orders with {created_items} items.")
+        return order_ids
+
+    def seed_users(self, count):
+        user_ids = []
+        offset = CustomUser.objects.count()
+        for batch in self.batches(count):
+            users = [
+                CustomUser(
+                    username=f"seed-user-{offset + index}",
+                    password='!',
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES)[:20],
+                    phone_number=f"+2541{offset + index:08d}",
+                    sex=self.rng.choice(SexChoices.values),
+                )
+                for index in batch
+            ]
+            user_ids.extend(user.pk for user in CustomUser.objects.bulk_create(users))
+        self.log(f"Created {len(user_ids)} users.")
+        return user_ids
+
+
+def seed_catalog(books=1000, authors=200, order_items=5000, users=100, image_ratio=0, cover_variants=20, days=365,
+                 seed=0, batch_size=DEFAULT_BATCH_SIZE, stdout=None):
+    """
+    Seeds a catalog of the given volumes and rebuilds the data the signals
+    would have maintained. Returns a dict of the created primary keys by kind.
+    """
+    seeder = CatalogSeeder(seed=seed, batch_size=batch_size, stdout=stdout)
+    tag_ids = seeder.seed_tags()
+    author_ids = seeder.seed_authors(authors)
+    book_ids = seeder.seed_books(books, author_ids, tag_ids)
+    image_ids = seeder.seed_images(book_ids, image_ratio, cover_variants) if image_ratio and book_ids else []
+    order_ids = seeder.seed_orders(order_items, book_ids, days) if order_items and book_ids else []
+    user_ids = seeder.seed_users(users)
+
+    rebuild_index()
+    rollup_sales()
+    bump_catalog_generation()
+    return {
+        'tags': tag_ids, 'authors': author_ids, 'books': book_ids, 'images': image_ids, 'orders': order_ids,
+        'users': user_ids,
+    }
@@ -1,26 +1,176 @@
 from rest_framework import serializers
+from main.metrics import TimedSerializerMixin
 from main.models import *
+from main.orders import UnknownBooks, place_order
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Serializer mixin accepting `fields` and `expand` keyword arguments.
+
+    `fields` limits the output to the given field names and `expand` adds the
+    optional relations declared in `Meta.expandable_fields`, a mapping of name
+    to a `(serializer class, keyword arguments)` tuple. Unknown names raise a
+    `ValidationError`.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable_fields = getattr(self.Meta, 'expandable_fields', {})
+        expand = set(expand or ())
+        errors = {}
+
+        unknown = expand - set(expandable_fields)
+        if unknown:
+            errors['expand'] = f"Unknown expansion(s): {', '.join(sorted(unknown))}."
+        unknown = set(fields or ()) - set(self.fields) - expand
+        if unknown:
+            errors['fields'] = f"Unknown field(s): {', '.join(sorted(unknown))}."
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        for name in expand:
+            serializer_class, options = expandable_fields[name]
+            self.fields[name] = serializer_class(**options)
+
+        if fields:
+            for name in set(self.fields) - set(fields) - expand:
+                self.fields.pop(name)
+
+
+class AuthorBookSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = ('id', 'title')
+
+
+class AuthorSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Author
+        fields = '__all__'
+        expandable_fields = {
+            'books': (AuthorBookSerializer, {'many': True, 'read_only': True}),
+        }
+
+
+class AbsoluteURLField(serializers.ReadOnlyField):
+    """Read-only field rendering a site-relative URL as an absolute one when a request is available."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        if value and request is not None:
+            return request.build_absolute_uri(value)
+        return value
+
+
+class BookAuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
+        fields = ('id', 'first_name', 'last_name')
+
+
+class BookImageSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = BookImage
         fields = '__all__'
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Read-optimized book representation with embedded authors, tag names,
+    inventory stock and display image URL.
+
+    `BookViewSet.get_queryset` fetches everything this serializer reads, so a
+    page of books is serialized in a fixed number of queries.
+    """
+    authors = BookAuthorSerializer(many=True, read_only=True)
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+    stock_quantity = serializers.IntegerField(source='bookinventory.stock_quantity', read_only=True)
+    image_url = AbsoluteURLField(source='get_image_url')
+
+    class Meta:
+        model = Book
+        fields = ('id', 'title', 'authors', 'description', 'tags', 'publication_date', 'isbn', 'price',
+                  'date_updated', 'stock_quantity', 'image_url')
+        expandable_fields = {
+            'images': (BookImageSerializer, {'many': True, 'read_only': True, 'source': 'bookimages'}),
+        }
+
+
+class BookWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = '__all__'
 
 
-class BookTagSerializer(serializers.ModelSerializer):
+class BookTagSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BookTag
         fields = '__all__'
+        expandable_fields = {
+            'books': (AuthorBookSerializer, {'many': True, 'read_only': True, 'source': 'book_set'}),
+        }
+
 
+class NameListField(serializers.ListField):
+    """List field that also accepts a single string of names separated by semicolons, as found in CSV files."""
 
-class BookImageSerializer(serializers.ModelSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [name for name in (part.strip() for part in data.split(';')) if name]
+        return super().to_internal_value(data)
+
+
+class BookImportSerializer(serializers.Serializer):
+    """Validates one record of a bulk book import, see `main.importers`."""
+    title = serializers.CharField(max_length=200)
+    isbn = serializers.CharField(max_length=13, required=False, allow_blank=True, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    price = serializers.DecimalField(max_digits=5, decimal_places=2)
+    publication_date = serializers.DateField(required=False, allow_null=True)
+    authors = NameListField(child=serializers.CharField(max_length=201), required=False)
+    tags = NameListField(child=serializers.ChoiceField(choices=BookTagChoices.choices), required=False)
+    stock_quantity = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+
+    def to_internal_value(self, data):
+        # Empty CSV cells mean "not provided".
+        data = {key: value for key, value in data.items() if value not in ('', None) or key == 'title'}
+        return super().to_internal_value(data)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
-        model = BookImage
+        model = OrderItem
+        fields = ('book', 'quantity', 'price_at_time')
+
+
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
         fields = '__all__'
+
+
+class OrderLineSerializer(serializers.Serializer):
+    # A plain integer: the books of the whole cart are looked up together by `main.orders.place_order`.
+    book = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=1000, default=1)
+
+
+class OrderCreateSerializer(serializers.ModelSerializer):
+    items = OrderLineSerializer(many=True, allow_empty=False, max_length=200)
+
+    class Meta:
+        model = Order
+        fields = ('customer_name', 'phone_number', 'email', 'notes', 'items')
+
+    def create(self, validated_data):
+        lines = [(line['book'], line['quantity']) for line in validated_data.pop('items')]
+        try:
+            return place_order(lines, **validated_data)
+        except (UnknownBooks, InsufficientStock) as error:
+            raise serializers.ValidationError({'items': [str(error)]})
+
+    def to_representation(self, instance):
+        return OrderSerializer(instance, context=self.context).data
@@ -1,33 +1,70 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
 from django.dispatch import receiver
+from main.cache import bump_catalog_generation_on_commit
+from main.dashboard import record_order_change, record_order_deletion, record_order_item_change
 from main.models import *
-from PIL import Image
-import os
-from django.conf import settings
+from main.renditions import delete_renditions
+from main.search import index_books, unindex_books
+from main import tasks
 
 
-@receiver(post_save, sender=BookImage)
-def generate_thumbnail(sender, instance, **kwargs):
-    if instance.cover_image and not instance.thumbnail:
-        try:
-            img = Image.open(instance.cover_image.path)
+def delete_derived_images(thumbnail, renditions, storage):
+    """Deletes a cover's thumbnail and rendition files once the current transaction commits."""
+    def delete():
+        if thumbnail:
+            storage.delete(thumbnail)
+        delete_renditions(renditions, storage)
 
-            thumbnail_size = (100, 100)
-            img.thumbnail(thumbnail_size)
+    transaction.on_commit(delete)
 
-            book_name = instance.book.name.replace(" ", "-")
 
-            thumbnail_filename = f"{book_name}-thumbnail.png"
+@receiver(pre_save, sender=BookImage)
+def reset_replaced_cover(sender, instance, update_fields=None, **kwargs):
+    """
+    Signal to drop the thumbnail and renditions of a cover image that is being
+    replaced, so that they are generated again for the new cover. The old files
+    are deleted when the change commits.
+    """
+    if instance._state.adding or instance.pk is None:
+        return
+    old = BookImage.objects.filter(pk=instance.pk).values('cover_image', 'thumbnail', 'renditions').first()
+    if old is None or old['cover_image'] == instance.cover_image.name:
+        return
+
+    instance.thumbnail = None
+    instance.renditions = {}
+    if update_fields is not None:
+        BookImage.objects.filter(pk=instance.pk).update(thumbnail=None, renditions={})
+    delete_derived_images(old['thumbnail'], old['renditions'], instance.cover_image.storage)
+
+
+@receiver(post_delete, sender=BookImage)
+def delete_image_renditions(sender, instance, **kwargs):
+    """
+    Signal to delete the thumbnail and rendition files of a deleted image.
+    """
+    delete_derived_images(instance.thumbnail.name, instance.renditions, instance.cover_image.storage)
 
-            thumbnail_path = os.path.join(settings.MEDIA_ROOT, "book-thumbnails", thumbnail_filename)
-            img.save(thumbnail_path, "PNG")
 
-            # Update the thumbnail field in the model with the relative path inside the MEDIA_URL
-            instance.thumbnail.name = os.path.join("book-thumbnails", thumbnail_filename)
-            instance.save()
-        except Exception as error:
+@receiver(post_save, sender=BookImage)
+def generate_thumbnail(sender, instance, **kwargs):
+    """
+    Signal to queue thumbnail generation for a cover image that has none yet.
+    The thumbnail is rendered in the background (see main.tasks) so uploads
+    return immediately.
+    """
+    if instance.cover_image and not instance.thumbnail:
+        tasks.enqueue(tasks.generate_thumbnail, instance.pk)
 
-            print(f"Thumbnail generation failed: {error}")
+
+@receiver(post_save, sender=BookImage)
+def generate_renditions(sender, instance, **kwargs):
+    """
+    Signal to queue the responsive renditions of a cover image in the background.
+    """
+    if instance.cover_image and not instance.renditions:
+        tasks.enqueue(tasks.generate_renditions, instance.pk)
 
 
 @receiver(post_save, sender=Book)
@@ -41,3 +78,131 @@ def create_book_inventory(sender, instance, created, **kwargs):
             name=instance,
             stock_quantity=0  # Starting with 0 stock
         )
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    """
+    Signal to refresh the search index entry of a Book whenever it is saved.
+    """
+    index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    """
+    Signal to drop the search index entry of a deleted Book.
+    """
+    unindex_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def reindex_author_books(sender, instance, created, **kwargs):
+    """
+    Signal to refresh the search index entries of every Book written by an Author
+    whose name has changed.
+    """
+    if not created:
+        index_books(instance.books.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+def remember_author_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def reindex_deleted_author_books(sender, instance, **kwargs):
+    """
+    Signal to drop a deleted Author from the search index entries of their books.
+    """
+    index_books(getattr(instance, '_search_book_ids', []))
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def reindex_book_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal to keep the authors column of the search index in sync when authors
+    are added to or removed from a Book (from either side of the relation).
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            index_books([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        index_books(getattr(instance, '_search_book_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        index_books(pk_set)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=BookImage)
+@receiver(post_delete, sender=BookImage)
+@receiver(post_save, sender=BookTag)
+@receiver(post_delete, sender=BookTag)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=BookInventory)
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.tags.through)
+def invalidate_catalog_pages(sender, **kwargs):
+    """
+    Signal to bump the catalog generation whenever anything shown on the
+    storefront or in the book API changes, so that no stale cached page is
+    ever served and book ETags change. The bump waits for the change to commit.
+    """
+    action = kwargs.get('action')
+    if action is None or action.startswith('post_'):
+        bump_catalog_generation_on_commit()
+
+
+ORDER_SALES_FIELDS = ('order_date', 'status', 'total_amount')
+ORDER_ITEM_SALES_FIELDS = ('order_id', 'book_id', 'quantity', 'price_at_time')
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=OrderItem)
+def remember_sales_before(sender, instance, **kwargs):
+    """
+    Signal to remember what a saved order or order line counted towards the
+    sales aggregates before the change, to apply only the difference.
+    """
+    fields = ORDER_SALES_FIELDS if sender is Order else ORDER_ITEM_SALES_FIELDS
+    instance._sales_before = sender.objects.filter(pk=instance.pk).values(*fields).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Order)
+def record_order_sales(sender, instance, **kwargs):
+    """
+    Signal to apply a saved order to the daily sales, and to the book sales
+    when it is cancelled or un-cancelled, in the saving transaction.
+    """
+    record_order_change(instance._sales_before, instance)
+
+
+@receiver(post_delete, sender=Order)
+def record_deleted_order_sales(sender, instance, **kwargs):
+    """
+    Signal to remove a deleted order from the daily sales. Its books are
+    updated by the post_delete signals of its cascaded items.
+    """
+    record_order_deletion(instance)
+
+
+@receiver(post_save, sender=OrderItem)
+def record_order_item_sales(sender, instance, **kwargs):
+    """
+    Signal to apply a saved order line to the sales of its book.
+    """
+    after = {field: getattr(instance, field) for field in ORDER_ITEM_SALES_FIELDS}
+    record_order_item_change(instance._sales_before, after)
+
+
+@receiver(post_delete, sender=OrderItem)
+def record_deleted_order_item_sales(sender, instance, **kwargs):
+    """
+    Signal to remove a deleted order line from the sales of its book.
+    """
+    record_order_item_change({field: getattr(instance, field) for field in ORDER_ITEM_SALES_FIELDS}, None)
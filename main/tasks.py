@@ -0,0 +1,114 @@
+"""
+Background jobs that are kept off the request path.
+
+`enqueue` waits for the surrounding transaction to commit, so a job never
+reads rows that are not visible yet or that were rolled back, then hands the
+job to a small in-process thread pool. Setting `BACKGROUND_TASKS_EAGER` runs
+jobs inline on commit instead, which is handy for tests and debugging.
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+from PIL import Image
+
+from main.cache import bump_catalog_generation
+from main.models import BookImage
+from main.renditions import delete_renditions, render_renditions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process-wide worker pool, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASK_WORKERS, thread_name_prefix='bookspace-tasks'
+            )
+        return _executor
+
+
+def run_task(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background task %s%r failed", func.__name__, args)
+
+
+def _run_in_worker(func, *args):
+    try:
+        run_task(func, *args)
+    finally:
+        # Worker threads get their own database connections; don't leak them.
+        connections.close_all()
+
+
+def enqueue(func, *args):
+    """Runs `func(*args)` in the background once the current transaction commits."""
+    def submit():
+        if settings.BACKGROUND_TASKS_EAGER:
+            run_task(func, *args)
+        else:
+            get_executor().submit(_run_in_worker, func, *args)
+
+    transaction.on_commit(submit)
+
+
+def generate_thumbnail(image_id):
+    """
+    Renders the thumbnail of a BookImage and stores it without re-saving the
+    instance, so no post_save signal fires again.
+    """
+    image = BookImage.objects.select_related('book').filter(pk=image_id).first()
+    if image is None or not image.cover_image or image.thumbnail:
+        return
+
+    with image.cover_image.open('rb') as cover:
+        img = Image.open(cover)
+        img.thumbnail(settings.THUMBNAIL_SIZE)
+        if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, 'PNG')
+
+    image.thumbnail.save(
+        f"{slugify(image.book.title) or 'book'}-{image.pk}-thumbnail.png", ContentFile(buffer.getvalue()), save=False
+    )
+    # Not stored if the cover was replaced while this job was rendering the old one.
+    updated = BookImage.objects.filter(
+        Q(thumbnail__isnull=True) | Q(thumbnail=''), pk=image_id, cover_image=image.cover_image.name
+    ).update(thumbnail=image.thumbnail.name)
+    if updated:
+        bump_catalog_generation()
+    else:
+        # The image was deleted, replaced or thumbnailed by another job in the meantime.
+        image.thumbnail.delete(save=False)
+
+
+def generate_renditions(image_id):
+    """
+    Renders the responsive renditions of a BookImage (see main.renditions) and
+    stores them without re-saving the instance.
+    """
+    image = BookImage.objects.filter(pk=image_id).first()
+    if image is None or not image.cover_image or image.renditions:
+        return
+
+    renditions = render_renditions(image)
+    if BookImage.objects.filter(pk=image_id, renditions={}, cover_image=image.cover_image.name).update(
+        renditions=renditions
+    ):
+        bump_catalog_generation()
+    else:
+        delete_renditions(renditions, image.cover_image.storage)
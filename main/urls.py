@@ -10,10 +10,12 @@ router.register(r'authors', AuthorViewSet, basename='authors')
 router.register(r'books', BookViewSet, basename='books')
 router.register(r'books-tags', BookTagViewSet, basename='book-tags')
 router.register(r'books-images', BookImageViewSet, basename='book-images')
+router.register(r'orders', OrderViewSet, basename='orders')
 
 
 urlpatterns = [
     path('', MainView.as_view(), name='home'),
     path('contact/', contact_view, name='contact_us'),
+    path('metrics/', metrics_view, name='metrics'),
     path('api/', include(router.urls)),
 ]
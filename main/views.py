@@ -1,14 +1,31 @@
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.http import Http404, HttpResponse, QueryDict, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.generic import ListView
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from main.cache import catalog_facets_cache_key, catalog_page_cache_key
+from main import exporters
+from main.facets import FACETS, count_facets, filter_by_facets, get_facet_selections
 from main.filters import *
+from main.importers import ImportFormatError, guess_format, import_books
+from main.metrics import registry
+from main.mixins import ConditionalGetMixin, SparseFieldsetMixin
+from main.pagination import InvalidCursor, KeysetPaginator, KeysetPagination
 from main.permissions import *
+from main.search import search_books
 from main.serializers import *
 
 
@@ -16,41 +33,158 @@ def contact_view(request):
     return render(request, 'main/contact_us.html')
 
 
+def metrics_view(request):
+    """
+    Serves the request metrics of this worker process in the Prometheus text
+    format (see main.metrics), to staff users and to scrapers sending the
+    `METRICS_TOKEN` as a bearer token.
+    """
+    authorization = request.headers.get('Authorization', '')
+    has_token = settings.METRICS_TOKEN and constant_time_compare(authorization, f"Bearer {settings.METRICS_TOKEN}")
+    if not (has_token or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class MainView(ListView):
     model = Book
     template_name = 'main/main.html'
     context_object_name = 'books'
     paginate_by = 12
+    keyset_ordering = ('-date_updated', '-id')
+
+    def is_page_cacheable(self, request):
+        # Only anonymous visitors without a session or flash messages get the shared page.
+        return not (request.COOKIES.get(settings.SESSION_COOKIE_NAME) or request.COOKIES.get('messages'))
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_page_cacheable(request):
+            return super().get(request, *args, **kwargs)
+
+        cache_key = catalog_page_cache_key(request.path, self.search_query, self.facet_selections, self.cursor)
+        content = cache.get(cache_key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda rendered: cache.set(cache_key, rendered.content, settings.CATALOG_PAGE_CACHE_TIMEOUT)
+            )
+        return response
 
     def get_queryset(self):
-        queryset = Book.objects.all().prefetch_related('authors', 'tags', 'bookimages')
+        # Everything the book cards and modals render is fetched here, once per page.
+        queryset = Book.objects.prefetch_related(
+            'authors',
+            'tags',
+            Prefetch('bookimages', queryset=BookImage.objects.order_by('id'), to_attr='image_list'),
+        )
 
         # Search functionality
-        query = self.request.GET.get('search')
-        if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(authors__first_name__icontains=query) |
-                Q(authors__last_name__icontains=query) |
-                Q(isbn__icontains=query)
-            ).distinct()
-
-        # Tag filtering
-        tag = self.request.GET.get('tag')
-        if tag:
-            queryset = queryset.filter(tags__name=tag)
+        if self.search_query:
+            queryset = search_books(queryset, self.search_query)
 
-        return queryset
+        # Tag, author, price and year facets
+        return filter_by_facets(queryset, self.facet_selections)
+
+    @cached_property
+    def search_query(self):
+        return self.request.GET.get('search', '')
+
+    @cached_property
+    def cursor(self):
+        return self.request.GET.get('cursor')
+
+    @cached_property
+    def facet_selections(self):
+        return get_facet_selections(self.request.GET)
+
+    def get_query_params(self):
+        """
+        Returns the query parameters of the current page rebuilt from the parsed
+        search and facet selections, without unknown or invalid values, which
+        the cached page must not carry into its links.
+        """
+        params = QueryDict(mutable=True)
+        if self.search_query:
+            params['search'] = self.search_query
+        for facet, value in self.selected_facets:
+            params.appendlist(facet, value)
+        return params
+
+    def get_facet_counts(self):
+        # Counts do not change between pages of the same search, so they are cached apart from the pages.
+        query = self.search_query
+        selections = self.facet_selections
+        cache_key = catalog_facets_cache_key(query, selections)
+        counts = cache.get(cache_key)
+        if counts is None:
+            queryset = search_books(Book.objects.all(), query) if query else Book.objects.all()
+            counts = count_facets(queryset, selections)
+            cache.set(cache_key, counts, settings.CATALOG_PAGE_CACHE_TIMEOUT)
+        return counts
+
+    @cached_property
+    def selected_facets(self):
+        """The selected `(facet, value)` pairs, normalised and as text like the facet options' values."""
+        return [(facet, str(value)) for facet in FACETS for value in self.facet_selections[facet]]
+
+    def get_facet_url(self, facet, value):
+        """Returns the URL of the current page with `value` of `facet` toggled, back on the first page."""
+        # Built from the normalised selections, e.g. `year=1995` becomes `year=1990`.
+        params = self.get_query_params()
+        values = params.getlist(facet)
+        params.setlist(facet, [other for other in values if other != value] if value in values else values + [value])
+        query_string = params.urlencode()
+        return f"?{query_string}" if query_string else self.request.path
+
+    def paginate_queryset(self, queryset, page_size):
+        # Search results are ordered by relevance, everything else by last update.
+        ordering = ('-search_rank', '-id') if 'search_rank' in queryset.query.annotations else self.keyset_ordering
+        paginator = KeysetPaginator(queryset, ordering, page_size)
+        try:
+            page = paginator.page(self.cursor)
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_page_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.get_query_params()
+        params['cursor'] = cursor
+        return f"?{params.urlencode()}"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['tags'] = BookTag.objects.all()
-        context['current_tag'] = self.request.GET.get('tag')
-        context['search_query'] = self.request.GET.get('search', '')
+        page = context['page_obj']
+        context['next_page_url'] = self.get_page_url(page.next_cursor)
+        context['previous_page_url'] = self.get_page_url(page.previous_cursor)
+        context['facets'] = {
+            facet: [
+                {
+                    'value': value,
+                    'label': label,
+                    'count': count,
+                    'selected': (facet, value) in self.selected_facets,
+                    'url': self.get_facet_url(facet, value),
+                }
+                for value, label, count in options
+            ]
+            for facet, options in self.get_facet_counts().items()
+        }
+        context['facet_groups'] = [
+            ("Authors", context['facets']['author']),
+            ("Price", context['facets']['price']),
+            ("Published", context['facets']['year']),
+        ]
+        context['selected_facets'] = self.selected_facets
+        context['search_query'] = self.search_query
         return context
 
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -80,7 +214,7 @@ class AuthorViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class BookTagViewSet(viewsets.ModelViewSet):
+class BookTagViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = BookTag.objects.all()
     serializer_class = BookTagSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -110,7 +244,7 @@ class BookTagViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class BookImageViewSet(viewsets.ModelViewSet):
+class BookImageViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = BookImage.objects.all()
     serializer_class = BookImageSerializer
 
@@ -126,12 +260,93 @@ class BookImageViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date_updated', '-id')
+    max_reported_import_errors = 1000
+
+    def get_serializer_class(self):
+        if self.action in ['create', 'update', 'partial_update']:
+            return BookWriteSerializer
+        return BookSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            # Everything BookSerializer renders, in a fixed number of queries.
+            if self.is_field_requested('stock_quantity'):
+                queryset = queryset.select_related('bookinventory')
+            if self.is_field_requested('authors'):
+                queryset = queryset.prefetch_related(
+                    Prefetch('authors', queryset=Author.objects.only('id', 'first_name', 'last_name'))
+                )
+            if self.is_field_requested('tags'):
+                queryset = queryset.prefetch_related('tags')
+            if self.is_field_requested('image_url'):
+                queryset = queryset.prefetch_related(
+                    Prefetch('bookimages', queryset=BookImage.objects.order_by('id'))
+                )
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        """
+        Creates or updates (by ISBN) the books of an uploaded CSV or JSON Lines `file`.
+        The format is taken from `file_format` or from the file extension.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"message": "No file was uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = import_books(upload, request.data.get('file_format') or guess_format(upload.name))
+        except ImportFormatError as error:
+            return Response({"message": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "created": result.created,
+            "updated": result.updated,
+            "error_count": len(result.errors),
+            "errors": result.errors[:self.max_reported_import_errors],
+        })
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Streams the whole catalog as JSON Lines (`?file_format=jsonl`, the default)
+        or CSV (`?file_format=csv`). `?updated_since=<ISO datetime>` limits the
+        export to books changed after that time, for incremental syncs.
+        """
+        file_format = request.query_params.get('file_format', 'jsonl')
+        if file_format not in exporters.FORMATS:
+            return Response(
+                {"message": f"Unsupported file_format, expected one of: {', '.join(exporters.FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = exporters.get_export_queryset()
+        updated_since = request.query_params.get('updated_since')
+        if updated_since:
+            try:
+                since = parse_datetime(updated_since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response({"message": "Invalid updated_since datetime."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(date_updated__gt=since)
+
+        response = StreamingHttpResponse(
+            exporters.export_books(queryset, file_format), content_type=exporters.FORMATS[file_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="books.{file_format}"'
+        return response
 
     def get_permissions(self):
-        if self.action == "create":
+        if self.action in ["create", "bulk_import"]:
             permission_classes = [CanAddBook]
         elif self.action == "destroy":
             permission_classes = [CanDeleteBook]
@@ -140,3 +355,26 @@ class BookViewSet(viewsets.ModelViewSet):
         else:
             permission_classes = [AllowAny]
         return [permission() for permission in permission_classes]
+
+
+class OrderViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                   viewsets.GenericViewSet):
+    """
+    Anyone can place an order; only bookspace staff can list and view them.
+    """
+    queryset = Order.objects.prefetch_related('items')
+    serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-order_date', '-id')
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return OrderCreateSerializer
+        return OrderSerializer
+
+    def get_permissions(self):
+        if self.action == "create":
+            permission_classes = [AllowAny]
+        else:
+            permission_classes = [CanViewOrder]
+        return [permission() for permission in permission_classes]
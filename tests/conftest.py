@@ -1,6 +1,8 @@
 import pytest
+from django.core.cache import caches
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from users.choices import *
@@ -9,6 +11,16 @@ from main.models import *
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Cached pages and counters must not leak between tests whose database is rolled back.
+    for cache in caches.all():
+        cache.clear()
+    yield
+    for cache in caches.all():
+        cache.clear()
+
+
 @pytest.fixture()
 @pytest.mark.django_db
 def setup_users():
@@ -161,3 +173,17 @@ def setup_book_data():
         "price": 99.99,
     }
     return {'book_data': book_data}
+
+
+@pytest.fixture()
+def bookspace_owner_token(db):
+    """Token of a bookspace owner created directly in the database, skipping the signup flow."""
+    owner = User.objects.create(
+        username='direct-owner',
+        first_name='Direct',
+        last_name='Owner',
+        phone_number='+254700000001',
+        sex=SexChoices.FEMALE,
+        is_bookspace_owner=True,
+    )
+    return Token.objects.create(user=owner).key
@@ -0,0 +1,70 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import *
+from main.orders import place_order
+from main.pagination import EstimatedCountPaginator
+from users.choices import SexChoices
+
+
+@pytest.mark.django_db
+class TestAdminChangelists:
+    @pytest.fixture(autouse=True)
+    def setup(self, client):
+        admin = get_user_model().objects.create_superuser(
+            username='admin', password='password', email='admin@example.com', phone_number='+254700000009',
+            sex=SexChoices.FEMALE,
+        )
+        client.force_login(admin)
+        self.client = client
+        self.author = Author.objects.create(first_name='Yaa', last_name='Gyasi')
+        self.tag = BookTag.objects.create(name=BookTagChoices.HISTORY)
+
+    def create_rows(self, count):
+        for number in range(count):
+            book = Book.objects.create(title=f'Homegoing {number}', price=20)
+            book.authors.add(self.author)
+            book.tags.add(self.tag)
+            BookImage.objects.create(book=book, cover_image=f'book-covers/{number}.jpg')
+            BookInventory.objects.filter(name=book).update(stock_quantity=3)
+            place_order([(book.id, 1)], customer_name='Effia', phone_number='+254712345678', email='e@example.com')
+
+    def changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(f'admin:main_{model_name}_changelist'))
+        assert response.status_code == 200
+        return len(context.captured_queries)
+
+    @pytest.mark.parametrize('model_name, queries', [
+        # Session and user, then the rows, the count and any related data or filter choices.
+        ('book', 7),
+        ('bookimage', 5),
+        ('bookinventory', 5),
+        ('order', 4),
+        ('orderitem', 4),
+    ])
+    def test_query_count_does_not_grow_with_rows(self, model_name, queries):
+        """
+        Test that every changelist takes a fixed number of queries, whatever the number of rows.
+        """
+        self.create_rows(2)
+        assert self.changelist_queries(model_name) == queries
+
+        self.create_rows(20)
+        assert self.changelist_queries(model_name) == queries
+
+    def test_estimated_count_paginator(self):
+        """
+        Test that the order changelists count rows without an unbounded COUNT(*).
+        """
+        self.create_rows(3)
+        paginator = EstimatedCountPaginator(Order.objects.order_by('id'), 2)
+        assert paginator.count == 3 and paginator.num_pages == 2
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('admin:main_order_changelist'))
+        counts = [query['sql'] for query in context.captured_queries if 'COUNT(' in query['sql']]
+        assert len(counts) == 1 and 'LIMIT' in counts[0]
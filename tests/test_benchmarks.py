@@ -0,0 +1,137 @@
+import io
+
+import pytest
+from django.core.management import call_command
+
+from main.benchmarks import build_scenarios, compare_reports, percentile, run_benchmarks
+from main.models import *
+from main.search import search_books
+from main.seeding import CatalogSeeder, seed_catalog
+
+
+def catalog_snapshot():
+    return (
+        list(Book.objects.order_by('id').values_list('title', 'isbn', 'price', 'publication_date')),
+        list(Book.authors.through.objects.order_by('id').values_list('book__isbn', 'author__last_name')),
+        list(OrderItem.objects.order_by('id').values_list('book__isbn', 'quantity')),
+    )
+
+
+@pytest.mark.django_db
+class TestSeeding:
+    def test_seed_catalog_volumes(self):
+        """
+        Test that seeding creates the requested volumes along with the data signals would maintain.
+        """
+        created = seed_catalog(books=50, authors=10, order_items=120, users=5, batch_size=16)
+
+        assert Book.objects.count() == 50 and Author.objects.count() == 10
+        assert BookInventory.objects.count() == 50
+        assert OrderItem.objects.count() == 120
+        assert len(created['users']) == 5
+        assert not Book.objects.filter(authors=None).exists()
+        assert not Book.objects.filter(tags=None).exists()
+        # The search index and sales aggregates are rebuilt once at the end.
+        assert search_books(Book.objects.all(), Book.objects.first().title).exists()
+        assert sum(BookSales.objects.values_list('units_sold', flat=True)) == sum(
+            OrderItem.objects.exclude(order__status='CANCELLED').values_list('quantity', flat=True)
+        )
+
+    def test_seed_catalog_is_deterministic(self):
+        """
+        Test that the same seed produces the same catalog.
+        """
+        seed_catalog(books=30, authors=8, order_items=60, users=0, seed=7)
+        first = catalog_snapshot()
+
+        Order.objects.all().delete()
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        seed_catalog(books=30, authors=8, order_items=60, users=0, seed=7)
+        assert catalog_snapshot() == first
+
+    def test_orders_favour_popular_books(self):
+        """
+        Test that ordered books follow a skewed popularity distribution.
+        """
+        seeder = CatalogSeeder(seed=1)
+        book_ids = seeder.seed_books(100, seeder.seed_authors(10), seeder.seed_tags())
+        seeder.seed_orders(2000, book_ids)
+
+        units = sorted(
+            (item['total'] for item in OrderItem.objects.values('book').annotate(total=models.Sum('quantity'))),
+            reverse=True,
+        )
+        assert sum(units[:10]) > sum(units) / 3
+
+
+    def test_seed_images(self, settings, tmp_path):
+        """
+        Test that book images share a pool of realistically sized cover files.
+        """
+        settings.MEDIA_ROOT = tmp_path
+        seeder = CatalogSeeder(seed=3)
+        book_ids = seeder.seed_books(40, seeder.seed_authors(5), seeder.seed_tags())
+        image_ids = seeder.seed_images(book_ids, ratio=0.5, variants=2)
+
+        assert 10 < len(image_ids) < 30
+        covers = set(BookImage.objects.values_list('cover_image', flat=True))
+        assert len(covers) == 2
+        for cover in covers:
+            assert (tmp_path / cover).stat().st_size > 100 * 1024
+
+    def test_generate_catalog_data_command(self, settings, tmp_path, django_capture_on_commit_callbacks):
+        """
+        Test that the command generates the requested volumes without queueing per-row jobs.
+        """
+        settings.MEDIA_ROOT = tmp_path
+        with django_capture_on_commit_callbacks() as callbacks:
+            call_command(
+                'generate_catalog_data', books=20, authors=5, order_items=40, users=3, image_ratio=1,
+                cover_variants=1, stdout=io.StringIO(),
+            )
+
+        assert Book.objects.count() == 20 and BookImage.objects.count() == 20
+        assert OrderItem.objects.count() == 40
+        assert not callbacks
+
+
+@pytest.mark.django_db
+class TestBenchmarks:
+    def test_run_benchmarks(self, settings, tmp_path):
+        """
+        Test that every scenario runs against a seeded catalog and reports latency and query counts.
+        """
+        settings.MEDIA_ROOT = tmp_path
+        created = seed_catalog(books=30, authors=10, order_items=50, users=10)
+
+        results = run_benchmarks(build_scenarios(created['books'], created['users']), repeat=3, warmup=1)
+
+        assert set(results) == {
+            'home', 'home_search', 'home_tag', 'home_cached', 'book_list', 'book_detail', 'author_filter',
+            'thumbnail', 'role_assignment',
+        }
+        for result in results.values():
+            assert result['iterations'] == 3
+            assert 0 <= result['p50_ms'] <= result['p95_ms'] <= result['max_ms']
+        assert results['home_cached']['queries'] == 0
+        assert BookImage.objects.get().thumbnail
+
+    def test_percentile_and_comparison(self):
+        """
+        Test the nearest-rank percentiles and the comparison of two reports.
+        """
+        values = list(range(1, 101))
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.95) == 95
+        assert percentile([3], 0.95) == 3
+
+        baseline = {'scenarios': {'home': {'p50_ms': 10, 'p95_ms': 20, 'queries': 5}}}
+        report = {'scenarios': {
+            'home': {'p50_ms': 12, 'p95_ms': 20, 'queries': 4},
+            'book_list': {'p50_ms': 1, 'p95_ms': 2, 'queries': 1},
+        }}
+        assert list(compare_reports(baseline, report)) == [
+            "home: p50_ms 10 -> 12 (+20%), p95_ms 20 -> 20 (+0%), queries 5 -> 4 (-20%)",
+            "book_list: new scenario",
+        ]
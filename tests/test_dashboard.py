@@ -0,0 +1,147 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from main.dashboard import get_dashboard
+from main.models import *
+from main.orders import place_order
+from users.choices import SexChoices
+
+
+@pytest.mark.django_db
+class TestSalesDashboard:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, django_capture_on_commit_callbacks):
+        settings.BACKGROUND_TASKS_EAGER = True
+        settings.LOW_STOCK_THRESHOLD = 2
+        self.capture = django_capture_on_commit_callbacks
+        self.books = [Book.objects.create(title=f'The Famished Road {number}', price=10) for number in range(3)]
+        BookInventory.objects.update(stock_quantity=10)
+        BookInventory.objects.filter(name=self.books[2]).update(stock_quantity=1)
+
+    def place(self, lines):
+        with self.capture(execute=True):
+            return place_order(
+                lines, customer_name='Ben Okri', phone_number='+254712345678', email='ben@example.com'
+            )
+
+    def test_aggregates_follow_orders(self):
+        """
+        Test that placing, paying, cancelling and deleting orders keeps the aggregates up to date.
+        """
+        first = self.place([(self.books[0].id, 2), (self.books[1].id, 1)])
+        self.place([(self.books[0].id, 1)])
+
+        today = timezone.localdate()
+        assert DailySales.objects.get(date=today, status='PENDING').revenue == Decimal('40.00')
+        assert BookSales.objects.get(book=self.books[0]).units_sold == 3
+
+        with self.capture(execute=True):
+            first.status = 'CANCELLED'
+            first.save()
+        assert DailySales.objects.get(date=today, status='PENDING').order_count == 1
+        assert DailySales.objects.get(date=today, status='CANCELLED').revenue == Decimal('30.00')
+        assert BookSales.objects.get(book=self.books[0]).units_sold == 1
+        assert BookSales.objects.get(book=self.books[1]).units_sold == 0
+
+        with self.capture(execute=True):
+            Order.objects.all().delete()
+        assert DailySales.objects.get(date=today, status='PENDING').order_count == 0
+        assert BookSales.objects.get(book=self.books[0]).units_sold == 0
+
+    def test_aggregates_follow_order_lines(self):
+        """
+        Test that editing, adding and deleting the lines of an order updates the book sales without a rollup.
+        """
+        order = self.place([(self.books[0].id, 2)])
+        item = order.items.get()
+
+        item.quantity = 5
+        item.save()
+        OrderItem.objects.create(order=order, book=self.books[1], quantity=1, price_at_time=Decimal('12.50'))
+        assert BookSales.objects.get(book=self.books[0]).units_sold == 5
+        assert BookSales.objects.get(book=self.books[1]).revenue == Decimal('12.50')
+
+        item.delete()
+        assert BookSales.objects.get(book=self.books[0]).units_sold == 0
+
+        order.status = 'CANCELLED'
+        order.save()
+        assert BookSales.objects.get(book=self.books[1]).units_sold == 0
+        OrderItem.objects.create(order=order, book=self.books[0], quantity=4, price_at_time=10)
+        assert BookSales.objects.get(book=self.books[0]).units_sold == 0
+
+    def test_order_writes_do_not_grow_with_history(self):
+        """
+        Test that updating an order takes as many queries with many past orders as with one.
+        """
+        order = self.place([(self.books[0].id, 1)])
+        with CaptureQueriesContext(connection) as first:
+            order.status = 'PAID'
+            order.save()
+
+        for _ in range(5):
+            self.place([(self.books[0].id, 1), (self.books[1].id, 1)])
+        with CaptureQueriesContext(connection) as later:
+            order.status = 'DELIVERED'
+            order.save()
+
+        assert len(later.captured_queries) == len(first.captured_queries)
+        today = timezone.localdate()
+        assert DailySales.objects.get(date=today, status='DELIVERED').revenue == Decimal('10.00')
+        assert DailySales.objects.get(date=today, status='PENDING').order_count == 5
+        assert not DailySales.objects.get(date=today, status='PAID').order_count
+
+    def test_dashboard_reads_the_aggregates_only(self, django_assert_num_queries):
+        """
+        Test that the dashboard figures take a fixed number of queries.
+        """
+        self.place([(self.books[0].id, 3), (self.books[1].id, 1)])
+
+        # Daily sales, best sellers and low stock.
+        with django_assert_num_queries(3):
+            dashboard = get_dashboard()
+
+        assert dashboard['revenue_today'] == Decimal('40.00') and dashboard['orders_today'] == 1
+        assert [sales.book for sales in dashboard['best_sellers']] == [self.books[0], self.books[1]]
+        assert [inventory.name for inventory in dashboard['low_stock']] == [self.books[2]]
+
+    def test_rollup_command(self):
+        """
+        Test that the rollup command rebuilds the aggregates from the orders.
+        """
+        self.place([(self.books[0].id, 2)])
+        old = self.place([(self.books[1].id, 1)])
+        Order.objects.filter(pk=old.pk).update(order_date=timezone.now() - datetime.timedelta(days=3))
+        DailySales.objects.all().delete()
+        BookSales.objects.all().delete()
+
+        call_command('rollup_sales')
+        assert DailySales.objects.get(date=timezone.localdate(), status='PENDING').order_count == 1
+        assert DailySales.objects.get(
+            date=timezone.localdate() - datetime.timedelta(days=3), status='PENDING'
+        ).revenue == Decimal('10.00')
+        assert BookSales.objects.get(book=self.books[0]).units_sold == 2
+
+    def test_admin_index_shows_the_dashboard(self, client):
+        """
+        Test that the admin index renders the dashboard.
+        """
+        self.place([(self.books[0].id, 1)])
+        admin = get_user_model().objects.create_superuser(
+            username='admin', password='password', email='admin@example.com', phone_number='+254700000009',
+            sex=SexChoices.MALE,
+        )
+        client.force_login(admin)
+
+        response = client.get(reverse('admin:index'))
+        assert response.status_code == 200
+        assert 'Best sellers' in response.content.decode()
+        assert response.context['dashboard']['revenue_today'] == Decimal('10.00')
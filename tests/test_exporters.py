@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from main.exporters import export_books, get_export_queryset
+from main.importers import import_books
+from main.models import *
+
+
+@pytest.mark.django_db
+class TestBookExport:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.author = Author.objects.create(first_name='Ngũgĩ', last_name='wa Thiong\'o')
+        self.tag = BookTag.objects.create(name=BookTagChoices.FICTION)
+        self.books = []
+        for number in range(5):
+            book = Book.objects.create(title=f'Petals of Blood {number}', price=11, isbn=f'978000000000{number}')
+            book.authors.add(self.author)
+            book.tags.add(self.tag)
+            self.books.append(book)
+
+    def read(self, response):
+        assert response.streaming
+        return b''.join(response.streaming_content).decode()
+
+    def test_jsonl_export(self):
+        """
+        Test that every book is streamed as one JSON object per line.
+        """
+        response = self.client.get(reverse('main:books-export'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+
+        records = [json.loads(line) for line in self.read(response).splitlines()]
+        assert [record['id'] for record in records] == [book.id for book in self.books]
+        assert records[0]['authors'] == ["Ngũgĩ wa Thiong'o"]
+        assert records[0]['tags'] == ['Fiction'] and records[0]['stock_quantity'] == 0
+
+    def test_csv_export_round_trips(self):
+        """
+        Test that a CSV export can be imported again without changes.
+        """
+        response = self.client.get(reverse('main:books-export'), {'file_format': 'csv'})
+        content = self.read(response)
+        rows = list(csv.DictReader(io.StringIO(content)))
+        assert len(rows) == 5 and rows[0]['price'] == '11.00'
+
+        result = import_books(io.BytesIO(content.encode()), 'csv')
+        assert (result.created, result.updated, result.errors) == (0, 5, [])
+        assert Author.objects.count() == 1
+
+    def test_export_reads_in_chunks(self):
+        """
+        Test that books are read in chunks with their relations prefetched per chunk.
+        """
+        with CaptureQueriesContext(connection) as context:
+            lines = list(export_books(get_export_queryset(), 'jsonl', chunk_size=2))
+        assert len(lines) == 5
+        # The books, then an authors and a tags query for each of the three chunks.
+        assert len(context.captured_queries) == 7
+
+    def test_updated_since(self):
+        """
+        Test that incremental exports only contain recently changed books.
+        """
+        since = timezone.now()
+        self.books[2].title = 'Weep Not, Child'
+        self.books[2].save()
+
+        response = self.client.get(reverse('main:books-export'), {'updated_since': since.isoformat()})
+        records = [json.loads(line) for line in self.read(response).splitlines()]
+        assert [record['title'] for record in records] == ['Weep Not, Child']
+
+        response = self.client.get(reverse('main:books-export'), {'updated_since': 'yesterday'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = self.client.get(reverse('main:books-export'), {'file_format': 'xml'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
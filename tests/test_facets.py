@@ -0,0 +1,137 @@
+import datetime
+
+import pytest
+from django.db import connection
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from main.choices import BookTagChoices
+from main.facets import count_facets, filter_by_facets, get_facet_selections
+from main.models import *
+
+
+@pytest.mark.django_db
+class TestCatalogFacets:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.history = BookTag.objects.create(name=BookTagChoices.HISTORY)
+        self.fiction = BookTag.objects.create(name=BookTagChoices.FICTION)
+        self.romance = BookTag.objects.create(name=BookTagChoices.ROMANCE)
+        self.tolstoy = Author.objects.create(first_name='Leo', last_name='Tolstoy')
+        self.mantel = Author.objects.create(first_name='Hilary', last_name='Mantel')
+
+        self.war_and_peace = self.create_book('War and Peace', 8, 1995, self.tolstoy, self.history, self.fiction)
+        self.wolf_hall = self.create_book('Wolf Hall', 18, 2009, self.mantel, self.history, self.fiction)
+        self.bring_up = self.create_book('Bring Up the Bodies', 25, 2012, self.mantel, self.history)
+        self.anna = self.create_book('Anna Karenina', 60, None, self.tolstoy, self.romance)
+
+    def create_book(self, title, price, year, author, *tags):
+        book = Book.objects.create(
+            title=title, price=price, publication_date=datetime.date(year, 6, 1) if year else None
+        )
+        book.authors.add(author)
+        book.tags.add(*tags)
+        return book
+
+    def select(self, query):
+        return get_facet_selections(QueryDict(query))
+
+    def test_filters_combine_values_with_or_and_facets_with_and(self):
+        """
+        Test that values of one facet widen the results and different facets narrow them.
+        """
+        def titles(query):
+            return set(filter_by_facets(Book.objects.all(), self.select(query)).values_list('title', flat=True))
+
+        assert titles('tag=Fiction&tag=Romance') == {'War and Peace', 'Wolf Hall', 'Anna Karenina'}
+        assert titles(f'tag=History&author={self.mantel.pk}') == {'Wolf Hall', 'Bring Up the Bodies'}
+        assert titles('price=0-10&price=50-') == {'War and Peace', 'Anna Karenina'}
+        assert titles('year=2000&year=2010&tag=History') == {'Wolf Hall', 'Bring Up the Bodies'}
+        assert titles('year=2009') == {'Wolf Hall'}
+        # Unknown values are ignored.
+        assert len(titles('price=cheap&author=tolstoy&year=later')) == 4
+        assert len(titles('author=%C2%B2&year=%C2%B2&year=%EF%BC%91%EF%BC%99%EF%BC%99%EF%BC%95')) == 4
+
+    def test_counts_exclude_the_facets_own_selection(self):
+        """
+        Test that every facet is counted against the search and the other facets' selections.
+        """
+        counts = count_facets(Book.objects.all(), self.select('tag=Fiction&price=10-20'))
+
+        # Tags are counted over the 10-20 band only, prices over the Fiction books only.
+        assert counts['tag'] == [('Fiction', 'Fiction', 1), ('History', 'History', 1), ('Romance', 'Romance', 0)]
+        assert counts['price'] == [('0-10', "Under $10", 1), ('10-20', "$10 – $20", 1)]
+        assert counts['author'] == [(str(self.mantel.pk), 'Hilary Mantel', 1)]
+        assert counts['year'] == [('2000', '2000s', 1)]
+
+    def test_counts_take_one_query(self):
+        """
+        Test that all facets of a search are counted in a single query, plus the lookup of the author names.
+        """
+        with CaptureQueriesContext(connection) as context:
+            counts = count_facets(Book.objects.filter(title__icontains='a'), self.select('tag=History&year=1990'))
+        assert len(context.captured_queries) == 2
+        assert 'UNION ALL' in context.captured_queries[0]['sql']
+        assert counts['author'] == [(str(self.tolstoy.pk), 'Leo Tolstoy', 1)]
+        assert counts['year'] == [('2000', '2000s', 1), ('1990', '1990s', 1)]
+
+    def test_years_before_1000(self):
+        """
+        Test that books published before the year 1000 are counted in and filtered by their own decade.
+        """
+        self.create_book('Beowulf', 12, 975, self.tolstoy, self.fiction)
+        self.create_book('Aesop', 5, 5, self.tolstoy, self.fiction)
+        self.create_book('The Battle of Maldon', 7, 991, self.tolstoy, self.history)
+        self.create_book('Judith', 9, 979, self.tolstoy, self.history)
+
+        # Years are counted one by one and added up by decade.
+        counts = count_facets(Book.objects.all(), self.select(''))
+        assert counts['year'][-3:] == [('990', '990s', 1), ('970', '970s', 2), ('0', '0s', 1)]
+        assert list(filter_by_facets(Book.objects.all(), self.select('year=970')).order_by('title').values_list('title', flat=True)) == [
+            'Beowulf', 'Judith'
+        ]
+        assert filter_by_facets(Book.objects.all(), self.select('year=0')).get().title == 'Aesop'
+
+    def test_home_page_facets(self, client):
+        """
+        Test that the storefront lists the facets with their counts and toggle links.
+        """
+        response = client.get(reverse('main:home'), {'tag': 'History', 'cursor': ''})
+        assert response.status_code == status.HTTP_200_OK
+        assert {book.title for book in response.context['books']} == {
+            'War and Peace', 'Wolf Hall', 'Bring Up the Bodies'
+        }
+
+        facets = response.context['facets']
+        history = next(option for option in facets['tag'] if option['value'] == 'History')
+        fiction = next(option for option in facets['tag'] if option['value'] == 'Fiction')
+        assert history['selected'] and history['count'] == 3 and history['url'] == reverse('main:home')
+        assert not fiction['selected'] and fiction['url'] == '?tag=History&tag=Fiction'
+        assert [option['label'] for option in facets['year']] == ['2010s', '2000s', '1990s']
+
+        content = response.content.decode()
+        assert 'Hilary Mantel' in content and 'Under $10' in content
+        assert '<input type="hidden" name="tag" value="History">' in content
+
+    def test_home_page_normalises_selections(self, client):
+        """
+        Test that toggle links and selected values follow the normalised selections, not the raw parameters.
+        """
+        response = client.get(reverse('main:home'), {'year': '1995', 'price': 'cheap'})
+        nineties = next(option for option in response.context['facets']['year'] if option['value'] == '1990')
+        assert nineties['selected'] and nineties['url'] == reverse('main:home')
+        assert response.context['selected_facets'] == [('year', '1990')]
+
+        response = client.get(reverse('main:home'), {'price': 'cheap'})
+        assert response.context['selected_facets'] == []
+        assert 'price=cheap' not in response.context['facets']['price'][0]['url']
+
+    def test_home_page_ignores_non_ascii_digits(self, client):
+        """
+        Test that digits outside ASCII in the author and year parameters are ignored rather than failing.
+        """
+        response = client.get(reverse('main:home'), {'year': '\u00b2', 'author': '\u00b2'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.context['selected_facets'] == []
@@ -0,0 +1,128 @@
+import io
+import json
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from main.importers import import_books
+from main.models import *
+from main.search import search_books
+
+CSV_CATALOG = b"""title,isbn,price,publication_date,authors,tags,stock_quantity
+Things Fall Apart,9780385474542,14.50,1958-06-17,Chinua Achebe,Fiction;History,12
+Anthills of the Savannah,9780385260459,13.00,,Chinua Achebe,Fiction,
+Death and the King's Horseman,,9.99,1975-01-01,Wole Soyinka,,3
+"""
+
+
+def jsonl(*records):
+    return io.BytesIO(b'\n'.join(json.dumps(record).encode() for record in records))
+
+
+@pytest.mark.django_db
+class TestBookImport:
+    def test_csv_import(self):
+        """
+        Test that books, authors, tags, links and inventory are created from a CSV file.
+        """
+        result = import_books(io.BytesIO(CSV_CATALOG), 'csv')
+        assert (result.created, result.updated, result.errors) == (3, 0, [])
+
+        book = Book.objects.get(isbn='9780385474542')
+        assert [str(author) for author in book.authors.all()] == ['Chinua Achebe']
+        assert sorted(tag.name for tag in book.tags.all()) == ['Fiction', 'History']
+        assert book.bookinventory.stock_quantity == 12
+        assert Book.objects.get(isbn='9780385260459').bookinventory.stock_quantity == 0
+        assert Author.objects.filter(last_name='Achebe').count() == 1
+        assert list(search_books(Book.objects.all(), 'soyinka')) == [
+            Book.objects.get(title="Death and the King's Horseman")
+        ]
+
+    def test_upsert_by_isbn(self):
+        """
+        Test that records with a known ISBN update the book instead of duplicating it.
+        """
+        author = Author.objects.create(first_name='Chinua', last_name='Achebe')
+        book = Book.objects.create(title='Things Fall Apart (draft)', price=10, isbn='9780385474542')
+
+        result = import_books(jsonl(
+            {'title': 'Things Fall Apart', 'isbn': '9780385474542', 'price': '14.50',
+             'authors': ['Chinua Achebe'], 'stock_quantity': 4},
+        ), 'jsonl')
+        assert (result.created, result.updated) == (0, 1)
+
+        book.refresh_from_db()
+        assert book.title == 'Things Fall Apart'
+        assert list(book.authors.all()) == [author]
+        assert book.bookinventory.stock_quantity == 4
+
+    def test_row_errors_are_reported(self):
+        """
+        Test that invalid rows are skipped and reported with their row number.
+        """
+        result = import_books(jsonl(
+            {'title': 'Valid', 'price': '5'},
+            {'title': 'Too expensive', 'price': '123456'},
+            {'title': 'Unknown tag', 'price': '5', 'tags': ['Poetry']},
+        ), 'jsonl')
+        assert result.created == 1
+        assert [error['row'] for error in result.errors] == [2, 3]
+        assert 'price' in result.errors[0]['errors'] and 'tags' in result.errors[1]['errors']
+
+        result = import_books(io.BytesIO(b'{"title": "Broken", \n[]\n'), 'jsonl')
+        assert [error['row'] for error in result.errors] == [1, 2]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """
+        Test that a batch costs a fixed number of queries, whatever its size.
+        """
+        BookTag.objects.create(name=BookTagChoices.FICTION)
+
+        def import_queries(count, offset):
+            records = [
+                {'title': f'Book {number}', 'isbn': str(9780000000000 + number), 'price': '5',
+                 'authors': [f'Author {number}'], 'tags': ['Fiction']}
+                for number in range(offset, offset + count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                import_books(jsonl(*records), 'jsonl')
+            return len(context.captured_queries)
+
+        assert import_queries(2, 0) == import_queries(50, 100)
+
+    def test_api_import(self, bookspace_owner_token):
+        """
+        Test that staff can upload a catalog file and that others cannot.
+        """
+        client = APIClient()
+        url = reverse('main:books-bulk-import')
+        upload = SimpleUploadedFile('catalog.csv', CSV_CATALOG, content_type='text/csv')
+
+        response = client.post(url, {'file': upload}, format='multipart')
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        client.credentials(HTTP_AUTHORIZATION=f'Token {bookspace_owner_token}')
+        upload.seek(0)
+        response = client.post(url, {'file': upload}, format='multipart')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'created': 3, 'updated': 0, 'error_count': 0, 'errors': []}
+
+        upload = SimpleUploadedFile('catalog.xml', b'<books/>')
+        response = client.post(url, {'file': upload}, format='multipart')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_import_command(self, tmp_path):
+        """
+        Test that the management command imports a file.
+        """
+        path = tmp_path / 'catalog.csv'
+        path.write_bytes(CSV_CATALOG)
+        call_command('import_books', str(path), '--batch-size', '2')
+        assert Book.objects.count() == 3
+        assert BookInventory.objects.count() == 3
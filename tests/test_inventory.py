@@ -0,0 +1,75 @@
+import pytest
+
+from main.cache import get_catalog_generation
+from main.models import *
+
+
+@pytest.mark.django_db
+class TestBookInventory:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.books = [Book.objects.create(title=f'Americanah {number}', price=15) for number in range(3)]
+        BookInventory.objects.filter(name__in=self.books).update(stock_quantity=5)
+
+    def stock(self):
+        return [BookInventory.objects.get(name=book).stock_quantity for book in self.books]
+
+    def test_instance_methods_change_the_stock(self):
+        """
+        Test that adding and deducting stock on an inventory instance is persisted.
+        """
+        inventory = self.books[0].bookinventory
+        assert inventory.add_to_stock_quantity() == 6
+        assert inventory.deduct_stock_quantity(2) == 4
+        assert self.stock()[0] == 4
+
+        assert inventory.deduct_stock_quantity(10) == 4
+
+    def test_add_stock_uses_the_database_value(self):
+        """
+        Test that updates made by other workers are not overwritten.
+        """
+        stale = BookInventory.objects.get(name=self.books[0])
+        BookInventory.objects.add_stock(self.books[0].id, 3)
+        assert stale.add_to_stock_quantity() == 9
+
+    def test_reserve(self, django_assert_num_queries):
+        """
+        Test that a reservation is one UPDATE plus reading back the new quantity, and never oversells.
+        """
+        # The update and the read back, plus savepoint handling.
+        with django_assert_num_queries(4):
+            assert BookInventory.objects.reserve(self.books[0].id, 5) == 0
+
+        with pytest.raises(InsufficientStock) as error:
+            BookInventory.objects.reserve(self.books[0].id)
+        assert error.value.book_ids == [self.books[0].id]
+        assert self.stock()[0] == 0
+
+    def test_reserve_many_is_all_or_nothing(self, django_capture_on_commit_callbacks):
+        """
+        Test that several books are reserved together, or not at all when one is short.
+        """
+        first, second, third = (book.id for book in self.books)
+        generation = get_catalog_generation()
+        with django_capture_on_commit_callbacks() as callbacks:
+            assert BookInventory.objects.reserve_many({first: 2, second: 5}) == {first: 3, second: 0}
+            # Cached pages are only invalidated once the reservation commits.
+            assert get_catalog_generation() == generation
+        for callback in callbacks:
+            callback()
+        assert get_catalog_generation() > generation
+
+        with pytest.raises(InsufficientStock) as error:
+            BookInventory.objects.reserve_many({first: 1, second: 1, third: 6})
+        assert error.value.book_ids == [second, third]
+        assert self.stock() == [3, 0, 5]
+
+    def test_invalid_quantities(self):
+        """
+        Test that zero or negative quantities are rejected instead of adding stock.
+        """
+        with pytest.raises(ValueError):
+            BookInventory.objects.reserve(self.books[0].id, -2)
+        assert BookInventory.objects.reserve_many({}) == {}
+        assert self.stock() == [5, 5, 5]
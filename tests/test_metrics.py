@@ -0,0 +1,78 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from main.metrics import registry
+from main.models import *
+from users.choices import SexChoices
+from users.models import CustomUser
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+
+@pytest.mark.django_db
+class TestRequestMetrics:
+    def test_server_timing_header(self):
+        """
+        Test that sampled responses report their query count and timings.
+        """
+        response = APIClient().get(reverse('main:books-list'))
+
+        assert response.status_code == status.HTTP_200_OK
+        timing = response['Server-Timing']
+        assert 'queries"' in timing
+        for name in ('db', 'render', 'serializer', 'total'):
+            assert f'{name};dur=' in timing
+
+    def test_aggregates_by_view_and_action(self):
+        """
+        Test that the requests are aggregated per view and action.
+        """
+        client = APIClient()
+        client.get(reverse('main:books-list'))
+        client.get(reverse('main:books-list'))
+        client.get(reverse('main:home'))
+
+        metrics = registry.render()
+        assert 'bookspace_request_duration_seconds_count{view="BookViewSet.list"} 2' in metrics
+        assert 'bookspace_request_duration_seconds_count{view="MainView.get"} 1' in metrics
+        assert 'bookspace_request_queries_total{view="BookViewSet.list"}' in metrics
+
+    def test_unsampled_requests(self, settings):
+        """
+        Test that requests left out of the sample are neither timed nor aggregated.
+        """
+        settings.METRICS_SAMPLE_RATE = 0
+        response = APIClient().get(reverse('main:books-list'))
+
+        assert 'Server-Timing' not in response
+        assert 'BookViewSet' not in registry.render()
+
+    def test_metrics_endpoint_access(self, settings):
+        """
+        Test that the metrics are only served to staff and to holders of the metrics token.
+        """
+        settings.METRICS_TOKEN = 'scrape-secret'
+        client = APIClient()
+        url = reverse('main:metrics')
+
+        assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+        assert client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code == status.HTTP_403_FORBIDDEN
+
+        response = client.get(url, HTTP_AUTHORIZATION='Bearer scrape-secret')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert b'# TYPE bookspace_request_duration_seconds histogram' in response.content
+
+        staff = CustomUser.objects.create_user(
+            username='staff@example.com', password='testpassword', first_name='Staff', last_name='User',
+            phone_number='+254700000001', sex=SexChoices.FEMALE, is_staff=True,
+        )
+        client.force_login(staff)
+        assert client.get(url).status_code == status.HTTP_200_OK
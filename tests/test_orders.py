@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from main.models import *
+from main.orders import place_order
+
+
+@pytest.mark.django_db
+class TestOrderPlacement:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.books = [Book.objects.create(title=f'Wizard of the Crow {number}', price=10 + number) for number in range(30)]
+        BookInventory.objects.update(stock_quantity=4)
+        self.customer = {
+            'customer_name': 'Wanjiru Kamau',
+            'phone_number': '+254712345678',
+            'email': 'wanjiru@example.com',
+        }
+
+    def order(self, items):
+        return self.client.post(reverse('main:orders-list'), {**self.customer, 'items': items}, format='json')
+
+    def test_place_order(self):
+        """
+        Test that an order is created with its lines priced, its total computed and its stock reserved.
+        """
+        response = self.order([
+            {'book': self.books[0].id, 'quantity': 2},
+            {'book': self.books[5].id},
+            {'book': self.books[0].id, 'quantity': 1},
+        ])
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Decimal(response.data['total_amount']) == Decimal('45.00')
+        assert sorted((item['book'], item['quantity']) for item in response.data['items']) == [
+            (self.books[0].id, 3), (self.books[5].id, 1),
+        ]
+        assert BookInventory.objects.get(name=self.books[0]).stock_quantity == 1
+
+    def test_query_count_does_not_grow_with_lines(self):
+        """
+        Test that a 30 line order takes as many queries as a single line one.
+        """
+        with CaptureQueriesContext(connection) as single_line:
+            place_order([(self.books[0].id, 1)], **self.customer)
+        with CaptureQueriesContext(connection) as thirty_lines:
+            place_order([(book.id, 1) for book in self.books], **self.customer)
+
+        assert len(thirty_lines.captured_queries) == len(single_line.captured_queries)
+        statements = [query['sql'] for query in thirty_lines.captured_queries if 'SAVEPOINT' not in query['sql']]
+        # Prices, reservation and read back, order, items, total and read back,
+        # then an insert and an update each for the order count, revenue and book sales.
+        assert len(statements) == 13
+        assert Order.objects.latest('id').total_amount == sum(book.price for book in self.books)
+
+    def test_insufficient_stock_places_nothing(self):
+        """
+        Test that an order with one short line is rejected as a whole.
+        """
+        response = self.order([{'book': self.books[0].id, 'quantity': 1}, {'book': self.books[1].id, 'quantity': 5}])
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['items'] == [f'Insufficient stock for book(s): {self.books[1].id}.']
+        assert not Order.objects.exists()
+        assert BookInventory.objects.get(name=self.books[0]).stock_quantity == 4
+
+    def test_invalid_carts(self):
+        """
+        Test that unknown books, empty carts and bad quantities are rejected.
+        """
+        response = self.order([{'book': 999999}])
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['items'] == ['Unknown book(s): 999999.']
+
+        assert self.order([]).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.order([{'book': self.books[0].id, 'quantity': 0}]).status_code == status.HTTP_400_BAD_REQUEST
+        assert not Order.objects.exists()
+
+    def test_only_staff_can_read_orders(self, bookspace_owner_token):
+        """
+        Test that orders can be listed by staff only.
+        """
+        order = place_order([(self.books[0].id, 1)], **self.customer)
+
+        response = self.client.get(reverse('main:orders-list'))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {bookspace_owner_token}')
+        response = self.client.get(reverse('main:orders-list'))
+        assert response.status_code == status.HTTP_200_OK
+        assert [result['id'] for result in response.data['results']] == [order.id]
+
+        response = self.client.get(reverse('main:orders-detail', kwargs={'pk': order.id}))
+        assert response.data['items'] == [{'book': self.books[0].id, 'quantity': 1, 'price_at_time': '10.00'}]
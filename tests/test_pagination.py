@@ -0,0 +1,117 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from main.models import *
+from main.pagination import InvalidCursor, KeysetPaginator
+
+
+@pytest.fixture()
+def books():
+    books = [Book.objects.create(title=f'Book {number:02d}', price=10) for number in range(25)]
+    # Share timestamps between books so that the id tie-breaker is exercised.
+    now = timezone.now()
+    for index, book in enumerate(books):
+        Book.objects.filter(pk=book.pk).update(date_updated=now - timezone.timedelta(minutes=index // 3))
+    return Book.objects.order_by('-date_updated', '-id')
+
+
+@pytest.mark.django_db
+class TestKeysetPaginator:
+    def test_walk_forward_and_back(self, books):
+        """
+        Test that following next and previous cursors visits every book exactly once, in order.
+        """
+        paginator = KeysetPaginator(Book.objects.all(), ('-date_updated', '-id'), 10)
+        expected = list(books)
+
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+
+        assert list(first) + list(second) + list(third) == expected
+        assert not first.has_previous() and first.has_next()
+        assert len(third) == 5 and not third.has_next()
+
+        assert list(paginator.page(third.previous_cursor)) == list(second)
+        assert list(paginator.page(second.previous_cursor)) == list(first)
+        assert not paginator.page(second.previous_cursor).has_previous()
+
+    def test_page_size_does_not_change_query_count(self, books, django_assert_num_queries):
+        """
+        Test that a deep page is a single query, just like the first one.
+        """
+        paginator = KeysetPaginator(Book.objects.all(), ('-date_updated', '-id'), 5)
+        cursor = paginator.page().next_cursor
+        for _ in range(3):
+            cursor = paginator.page(cursor).next_cursor
+
+        with django_assert_num_queries(1):
+            paginator.page(cursor)
+
+    def test_invalid_cursor(self, books):
+        """
+        Test that a tampered cursor is rejected.
+        """
+        paginator = KeysetPaginator(Book.objects.all(), ('-date_updated', '-id'), 10)
+        with pytest.raises(InvalidCursor):
+            paginator.page('not-a-cursor')
+
+    def test_estimated_count(self, books):
+        """
+        Test that the estimated count is exact below the cap and capped above it.
+        """
+        assert KeysetPaginator(Book.objects.all(), ('-id',), 10).estimated_count() == (25, True)
+        assert KeysetPaginator(Book.objects.all(), ('-id',), 10, count_cap=20).estimated_count() == (20, False)
+
+
+@pytest.mark.django_db
+class TestBookListPagination:
+    def test_api_cursor_pagination(self, books):
+        """
+        Test that /api/books/ is paginated with cursors and can report an estimated count.
+        """
+        client = APIClient()
+        response = client.get(reverse('main:books-list'), {'page_size': 20, 'count': 'estimate'})
+        assert response.status_code == 200
+        assert response.data['previous'] is None
+        assert response.data['count'] == 25 and response.data['count_is_exact']
+        assert [book['id'] for book in response.data['results']] == [book.id for book in books[:20]]
+
+        response = client.get(response.data['next'])
+        assert response.data['next'] is None
+        assert [book['id'] for book in response.data['results']] == [book.id for book in books[20:]]
+
+        response = client.get(reverse('main:books-list'), {'cursor': 'garbage'})
+        assert response.status_code == 404
+
+    def test_home_page_cursor_pagination(self, books, client):
+        """
+        Test that the storefront pages through the catalog with cursors.
+        """
+        response = client.get(reverse('main:home'))
+        assert list(response.context['books']) == list(books[:12])
+        assert response.context['previous_page_url'] is None
+
+        response = client.get(reverse('main:home') + response.context['next_page_url'])
+        assert list(response.context['books']) == list(books[12:24])
+
+        response = client.get(reverse('main:home'), {'cursor': 'garbage'})
+        assert response.status_code == 404
+
+    def test_sparse_fieldsets_keep_cursor_columns(self, books):
+        """
+        Test that ?fields= does not defer the columns the cursor is built from.
+        """
+        client = APIClient()
+        response = client.get(reverse('main:books-list'), {'fields': 'title'})
+        assert response.data['results'][0] == {'title': books[0].title}
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(response.data['next'])
+        # The ETag aggregate and the page itself.
+        assert len(context.captured_queries) == 2
+        assert response.data['results'][0] == {'title': books[12].title}
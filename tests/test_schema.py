@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from bookspace.schema import get_schema_document
+
+
+@pytest.fixture()
+def schema_path(settings, tmp_path):
+    settings.OPENAPI_SCHEMA_PATH = tmp_path / 'openapi.json'
+    get_schema_document.cache_clear()
+    yield settings.OPENAPI_SCHEMA_PATH
+    get_schema_document.cache_clear()
+
+
+@pytest.mark.django_db
+class TestOpenAPISchema:
+    def test_generate_command(self, schema_path):
+        """
+        Test that the command writes the schema and that --check detects a stale one.
+        """
+        call_command('generate_openapi_schema', stdout=io.StringIO())
+        schema = json.loads(schema_path.read_text())
+        assert schema['info']['title'] == "Victor's Bookspace API"
+        assert '/api/books/' in schema['paths']
+
+        call_command('generate_openapi_schema', check=True, stdout=io.StringIO())
+        schema_path.write_text('{}')
+        with pytest.raises(CommandError):
+            call_command('generate_openapi_schema', check=True, stdout=io.StringIO())
+
+    def test_schema_served_from_artifact(self, schema_path):
+        """
+        Test that the precomputed schema is served with caching headers and revalidated with its ETag.
+        """
+        schema_path.write_text('{"swagger": "2.0", "paths": {}}')
+        client = APIClient()
+
+        response = client.get(reverse('openapi-schema'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {'swagger': '2.0', 'paths': {}}
+        assert 'max-age=3600' in response['Cache-Control'] and 'public' in response['Cache-Control']
+
+        response = client.get(reverse('openapi-schema'), HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_schema_generated_once_without_artifact(self, schema_path):
+        """
+        Test that without an artifact the schema is generated on the first request only.
+        """
+        client = APIClient()
+        first = client.get(reverse('openapi-schema'))
+        assert '/api/books/' in first.json()['paths']
+        assert get_schema_document.cache_info().misses == 1
+
+        second = client.get(reverse('openapi-schema'))
+        assert second['ETag'] == first['ETag']
+        assert get_schema_document.cache_info().misses == 1
+
+    def test_ui_pages_load_the_precomputed_schema(self, schema_path):
+        """
+        Test that the swagger and redoc pages point at the precomputed schema and no longer generate it.
+        """
+        client = APIClient()
+        for name in ('schema-swagger-ui', 'schema-redoc'):
+            response = client.get(reverse(name))
+            assert response.status_code == status.HTTP_200_OK
+            assert b'/openapi.json' in response.content
+
+        response = client.get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert get_schema_document.cache_info().misses == 0
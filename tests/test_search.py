@@ -0,0 +1,124 @@
+import pytest
+from django.urls import reverse
+
+from main.models import *
+from main.search import rebuild_index, search_books
+
+
+@pytest.mark.django_db
+class TestBookSearch:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.machiavelli = Author.objects.create(first_name='Niccolò', last_name='Machiavelli')
+        self.greene = Author.objects.create(first_name='Robert', last_name='Greene')
+
+        self.prince = Book.objects.create(title='The Prince', price=9.99, isbn='9780140449150')
+        self.prince.authors.add(self.machiavelli)
+        self.laws = Book.objects.create(title='The Laws of Human Nature', price=19.99, isbn='9780525428145')
+        self.laws.authors.add(self.greene)
+        self.power = Book.objects.create(title='The 48 Laws of Power', price=15.50)
+        self.power.authors.add(self.greene)
+
+    def search(self, query):
+        return list(search_books(Book.objects.all(), query))
+
+    def test_search_by_title_prefix(self):
+        """
+        Test that partially typed title words match.
+        """
+        assert self.search('prin') == [self.prince]
+
+    def test_search_by_author_name(self):
+        """
+        Test that books are found through their authors' names, accents included.
+        """
+        assert set(self.search('greene')) == {self.laws, self.power}
+        assert self.search('niccolo') == [self.prince]
+
+    def test_search_by_isbn(self):
+        """
+        Test that books are found by their ISBN.
+        """
+        assert self.search('9780525428145') == [self.laws]
+
+    def test_search_requires_every_term(self):
+        """
+        Test that every search term has to match.
+        """
+        assert self.search('laws power') == [self.power]
+
+    def test_search_ranks_title_matches_first(self):
+        """
+        Test that a title match outranks a match on the author name only.
+        """
+        author = Author.objects.create(first_name='Prince', last_name='Rogers')
+        ghost_written = Book.objects.create(title='Purple Rain', price=5)
+        ghost_written.authors.add(author)
+
+        assert self.search('prince') == [self.prince, ghost_written]
+
+    def test_index_follows_book_changes(self):
+        """
+        Test that renaming or deleting a book updates the index.
+        """
+        self.prince.title = 'Il Principe'
+        self.prince.save()
+        assert self.search('principe') == [self.prince]
+        assert self.search('prince') == []
+
+        self.prince.delete()
+        assert self.search('principe') == []
+
+    def test_index_follows_author_changes(self):
+        """
+        Test that author renames, M2M changes and deletions update the index.
+        """
+        self.greene.last_name = 'Green'
+        self.greene.save()
+        assert set(self.search('green')) == {self.laws, self.power}
+        assert self.search('greene') == []
+
+        self.power.authors.remove(self.greene)
+        assert self.search('green') == [self.laws]
+
+        self.machiavelli.books.add(self.power)
+        assert set(self.search('machiavelli')) == {self.prince, self.power}
+
+        self.machiavelli.books.clear()
+        assert self.search('machiavelli') == []
+
+        self.greene.delete()
+        assert self.search('green') == []
+
+    def test_rebuild_index(self):
+        """
+        Test that rebuilding the index re-indexes the whole catalog.
+        """
+        assert rebuild_index() == 3
+        assert self.search('prince') == [self.prince]
+
+    def test_home_page_search(self, client):
+        """
+        Test that the storefront search uses the index.
+        """
+        response = client.get(reverse('main:home'), {'search': 'laws'})
+        assert response.status_code == 200
+        assert set(response.context['books']) == {self.power, self.laws}
+
+    def test_home_page_search_pagination(self, client):
+        """
+        Test that relevance-ordered search results can be paged through with cursors.
+        """
+        for number in range(20):
+            Book.objects.create(title=f'Power Moves {number}', price=5)
+
+        seen = []
+        url = reverse('main:home') + '?search=power'
+        while url:
+            response = client.get(url)
+            seen.extend(response.context['books'])
+            next_page_url = response.context['next_page_url']
+            url = reverse('main:home') + next_page_url if next_page_url else None
+
+        assert len(seen) == 21
+        assert set(seen) == set(Book.objects.filter(title__icontains='power'))
@@ -0,0 +1,208 @@
+from io import BytesIO
+
+import pytest
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from main.cache import bump_catalog_generation, get_catalog_generation
+from main.models import *
+
+
+def cover_upload(name='cover.png', size=(800, 1200)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'navy').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@pytest.mark.django_db
+class TestThumbnailGeneration:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path, bookspace_owner_token):
+        settings.MEDIA_ROOT = tmp_path
+        settings.BACKGROUND_TASKS_EAGER = True
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {bookspace_owner_token}')
+        self.book = Book.objects.create(title='Half of a Yellow Sun', price=18)
+
+    def test_upload_returns_before_the_thumbnail_exists(self, django_capture_on_commit_callbacks):
+        """
+        Test that uploading a cover only queues the thumbnail and rendition jobs.
+        """
+        with django_capture_on_commit_callbacks() as callbacks:
+            response = self.client.post(
+                reverse('main:book-images-list'), {'book': self.book.id, 'cover_image': cover_upload()}
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        # The thumbnail and rendition jobs, and the catalog generation bump.
+        assert len(callbacks) == 3
+        image = BookImage.objects.get(pk=response.data['id'])
+        assert not image.thumbnail and not image.renditions
+
+    def test_thumbnail_is_filled_in_by_the_job(self, django_capture_on_commit_callbacks):
+        """
+        Test that the job stores a bounded PNG thumbnail and invalidates cached catalog pages.
+        """
+        with django_capture_on_commit_callbacks() as callbacks:
+            image = BookImage.objects.create(book=self.book, cover_image=cover_upload())
+        generation = get_catalog_generation()
+        for callback in callbacks:
+            callback()
+
+        image.refresh_from_db()
+        assert get_catalog_generation() > generation
+        assert image.thumbnail.name == f'book-thumbnails/half-of-a-yellow-sun-{image.pk}-thumbnail.png'
+        with Image.open(image.thumbnail.path) as thumbnail:
+            assert thumbnail.format == 'PNG'
+            assert max(thumbnail.size) == 100
+
+        # Saving the image again must not queue another job.
+        with django_capture_on_commit_callbacks() as callbacks:
+            image.save()
+        assert callbacks == [bump_catalog_generation]
+
+    def test_failed_job_is_logged(self, django_capture_on_commit_callbacks, caplog):
+        """
+        Test that a cover that cannot be read leaves the image without a thumbnail.
+        """
+        with django_capture_on_commit_callbacks(execute=True):
+            image = BookImage.objects.create(book=self.book, cover_image='book-covers/missing.png')
+
+        image.refresh_from_db()
+        assert not image.thumbnail
+        assert 'generate_thumbnail' in caplog.text
+
+
+@pytest.mark.django_db
+class TestImageRenditions:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.BACKGROUND_TASKS_EAGER = True
+        settings.BOOK_IMAGE_RENDITION_WIDTHS = (160, 320, 640)
+        settings.BOOK_IMAGE_RENDITION_FORMATS = ('webp', 'jpeg')
+        settings.BOOK_IMAGE_DEFAULT_WIDTH = 320
+        self.book = Book.objects.create(title='Purple Hibiscus', price=16)
+
+    def create_image(self, django_capture_on_commit_callbacks, **kwargs):
+        with django_capture_on_commit_callbacks(execute=True):
+            image = BookImage.objects.create(book=self.book, cover_image=cover_upload(**kwargs))
+        image.refresh_from_db()
+        return image
+
+    def test_renditions_are_generated(self, django_capture_on_commit_callbacks):
+        """
+        Test that every configured width is rendered in every format without upscaling.
+        """
+        image = self.create_image(django_capture_on_commit_callbacks, size=(500, 750))
+
+        assert image.renditions == {
+            'webp': {
+                '160': f'book-renditions/{image.pk}/160.webp',
+                '320': f'book-renditions/{image.pk}/320.webp',
+                '500': f'book-renditions/{image.pk}/500.webp',
+            },
+            'jpeg': {
+                '160': f'book-renditions/{image.pk}/160.jpeg',
+                '320': f'book-renditions/{image.pk}/320.jpeg',
+                '500': f'book-renditions/{image.pk}/500.jpeg',
+            },
+        }
+        with Image.open(image.cover_image.storage.path(image.renditions['webp']['320'])) as rendition:
+            assert rendition.format == 'WEBP' and rendition.size == (320, 480)
+
+    def test_transparent_cover_gets_a_jpeg_fallback(self, django_capture_on_commit_callbacks):
+        """
+        Test that covers with an alpha channel are flattened for the JPEG renditions.
+        """
+        buffer = BytesIO()
+        Image.new('RGBA', (200, 300), (0, 0, 0, 0)).save(buffer, 'PNG')
+        with django_capture_on_commit_callbacks(execute=True):
+            image = BookImage.objects.create(
+                book=self.book, cover_image=SimpleUploadedFile('clear.png', buffer.getvalue())
+            )
+        image.refresh_from_db()
+        assert set(image.renditions['jpeg']) == {'160', '200'}
+
+    def test_srcset_and_urls(self, django_capture_on_commit_callbacks):
+        """
+        Test that images expose <picture> sources, the fallback srcset and the default URL.
+        """
+        image = self.create_image(django_capture_on_commit_callbacks, size=(800, 1200))
+
+        assert image.sources == [{'type': 'image/webp', 'srcset': (
+            f'/media/book-renditions/{image.pk}/160.webp 160w, '
+            f'/media/book-renditions/{image.pk}/320.webp 320w, '
+            f'/media/book-renditions/{image.pk}/640.webp 640w'
+        )}]
+        assert image.fallback_srcset.startswith(f'/media/book-renditions/{image.pk}/160.jpeg 160w')
+        assert image.default_url == f'/media/book-renditions/{image.pk}/320.jpeg'
+        assert self.book.get_image_url() == image.default_url
+
+    def test_home_page_uses_picture_elements(self, django_capture_on_commit_callbacks, client):
+        """
+        Test that the storefront serves renditions through srcset instead of the original cover.
+        """
+        image = self.create_image(django_capture_on_commit_callbacks, size=(800, 1200))
+
+        content = client.get(reverse('main:home')).content.decode()
+        assert '<source type="image/webp"' in content
+        assert f'srcset="/media/book-renditions/{image.pk}/160.jpeg 160w' in content
+        assert image.cover_image.url not in content
+
+    def test_replacing_the_cover_regenerates_renditions(self, django_capture_on_commit_callbacks, tmp_path):
+        """
+        Test that a new cover gets a new thumbnail and renditions and that the old files are deleted.
+        """
+        image = self.create_image(django_capture_on_commit_callbacks, size=(500, 750))
+        image.cover_image = cover_upload(size=(450, 300))
+        with django_capture_on_commit_callbacks(execute=True):
+            image.save()
+        image.refresh_from_db()
+
+        assert set(image.renditions['webp']) == {'160', '320', '450'}
+        assert not (tmp_path / f'book-renditions/{image.pk}/500.webp').exists()
+        assert all((tmp_path / name).exists() for names in image.renditions.values() for name in names.values())
+        with Image.open(image.thumbnail.path) as thumbnail:
+            assert thumbnail.size == (100, 67)
+
+    def test_deleting_an_image_deletes_its_renditions(self, django_capture_on_commit_callbacks, tmp_path):
+        """
+        Test that the thumbnail and rendition files of a deleted image are not left behind.
+        """
+        image = self.create_image(django_capture_on_commit_callbacks, size=(300, 450))
+        thumbnail = image.thumbnail.name
+
+        with django_capture_on_commit_callbacks(execute=True):
+            image.delete()
+        assert not (tmp_path / thumbnail).exists()
+        assert list((tmp_path / 'book-renditions').rglob('*.*')) == []
+
+    def test_images_without_renditions_use_the_cover(self):
+        """
+        Test that the original cover is used until the renditions exist.
+        """
+        image = BookImage.objects.create(book=self.book, cover_image='book-covers/cover.png')
+        assert image.sources == [] and image.fallback_srcset == ''
+        assert image.default_url == '/media/book-covers/cover.png'
+
+    def test_generate_renditions_command(self, tmp_path):
+        """
+        Test that the management command backfills images uploaded before renditions existed.
+        """
+        image = BookImage.objects.create(book=self.book, cover_image=cover_upload(size=(300, 450)))
+        assert image.renditions == {}
+
+        call_command('generate_renditions')
+        image.refresh_from_db()
+        assert set(image.renditions['webp']) == {'160', '300'}
+
+        call_command('generate_renditions', '--force')
+        image.refresh_from_db()
+        assert set(image.renditions['jpeg']) == {'160', '300'}
+        assert sorted(path.name for path in (tmp_path / 'book-renditions' / str(image.pk)).iterdir()) == [
+            '160.jpeg', '160.webp', '300.jpeg', '300.webp',
+        ]
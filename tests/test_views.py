@@ -1,9 +1,20 @@
+import time
+
 import pytest
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
 from users.models import *
+from users.authentication import CachedTokenAuthentication, check_token_cache
+from main.cache import get_catalog_generation
 from main.models import *
+from main.views import MainView
 
 
 @pytest.mark.django_db
@@ -245,6 +256,257 @@ class TestRoleAssignments:
         assert response.status_code == status.HTTP_200_OK
         assert response.data["error"] == "User with ID '99' was not found."
 
+    def create_users(self, count):
+        return [
+            CustomUser.objects.create(
+                username=f"bulk-user-{number}",
+                first_name="Bulk",
+                last_name="User",
+                phone_number=f"+2547000{number:05d}",
+                sex=SexChoices.FEMALE,
+            )
+            for number in range(count)
+        ]
+
+    def test_bulk_assign_query_count(self):
+        """
+        Test that assigning a role to many users takes as many queries as for one user.
+        """
+        users = self.create_users(30)
+        query_counts = []
+        # The first request caches the manager's token, see test_cached_token_authentication.
+        for user_ids in ([users[0].id], [users[0].id], [user.id for user in users]):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    reverse("users:assign-bookspace-worker"),
+                    {"user_ids": user_ids},
+                    HTTP_AUTHORIZATION=f"Token {self.bookspace_manager_token}",
+                )
+            assert response.status_code == status.HTTP_200_OK
+            query_counts.append(len(context.captured_queries))
+
+        assert query_counts[1] == query_counts[2]
+        assert CustomUser.objects.filter(is_bookspace_worker=True, username__startswith="bulk-user-").count() == 30
+        assert response.data["message"] == (
+            f"Users {', '.join(user.username for user in users)} have been assigned as bookspace workers."
+        )
+
+    def test_bulk_assign_replaces_previous_role(self):
+        """
+        Test that a bulk assignment clears the users' other roles and reports unknown and invalid IDs.
+        """
+        users = self.create_users(2)
+        CustomUser.objects.filter(pk=users[0].pk).update(is_bookspace_worker=True)
+        response = self.client.post(
+            reverse("users:assign-bookspace-manager"),
+            {"user_ids": [users[1].id, "99", "abc", users[0].id, "100"]},
+            HTTP_AUTHORIZATION=f"Token {self.bookspace_owner_token}",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "message": f"Users {users[1].username}, {users[0].username} have been assigned as bookspace managers.",
+            "error": "Users with the following IDs were not found: 99, 100.",
+            "invalid": "The ID 'abc' is invalid.",
+        }
+        for user in CustomUser.objects.filter(pk__in=[users[0].pk, users[1].pk]):
+            assert user.get_role() == "Bookspace Manager"
+
+    def test_bulk_dismiss_including_self_changes_nothing(self):
+        """
+        Test that listing oneself among other users rejects the whole request.
+        """
+        response = self.client.post(
+            reverse("users:dismiss-bookspace-manager"),
+            {"user_ids": [self.bookspace_manager_user_id, self.bookspace_owner_user_id]},
+            HTTP_AUTHORIZATION=f"Token {self.bookspace_owner_token}",
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == "Cannot dismiss yourself."
+        assert CustomUser.objects.get(pk=self.bookspace_manager_user_id).is_bookspace_manager
+
+
+@pytest.mark.django_db
+class TestCachedTokenAuthentication:
+    @pytest.fixture(autouse=True)
+    def setup(self, setup_users):
+        self.client = setup_users["client"]
+        self.bookspace_owner_token = setup_users["bookspace_owner_token"]
+        self.bookspace_manager_token = setup_users["bookspace_manager_token"]
+        self.bookspace_manager_user_id = setup_users["bookspace_manager_user_id"]
+
+    def get_orders(self, token):
+        return self.client.get(reverse("main:orders-list"), HTTP_AUTHORIZATION=f"Token {token}")
+
+    def test_cached_token_authentication(self):
+        """
+        Test that only the first request with a token loads the token and its user.
+        """
+        with CaptureQueriesContext(connection) as first:
+            assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+        with CaptureQueriesContext(connection) as second:
+            assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+
+        token_queries = [query for query in first.captured_queries if "authtoken_token" in query["sql"]]
+        assert len(token_queries) == 1
+        assert len(second.captured_queries) == len(first.captured_queries) - 1
+
+    def test_cached_credentials_leave_out_the_user(self):
+        """
+        Test that the cache holds the user's id, roles and status and the token's age only, not the password hash.
+        """
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+        credentials = caches["tokens"].get(f"users:token:{self.bookspace_manager_token}")
+        assert set(credentials) == {"user_id", "role_flags", "is_active", "token_created"}
+        assert credentials["role_flags"] == RoleFlags.BOOKSPACE_MANAGER
+
+        user, token = CachedTokenAuthentication().authenticate_credentials(self.bookspace_manager_token)
+        assert user.get_deferred_fields() >= {"password", "username"}
+        assert token.user_id == user.pk == self.bookspace_manager_user_id
+        assert user.username == CustomUser.objects.get(pk=user.pk).username
+
+    def test_local_token_cache_is_reported(self, settings):
+        """
+        Test that a per-process token cache is reported outside of development only.
+        """
+        settings.DEBUG = False
+        assert [warning.id for warning in check_token_cache(None)] == ["users.W001"]
+        settings.DEBUG = True
+        assert check_token_cache(None) == []
+        settings.DEBUG = False
+        settings.CACHES = {**settings.CACHES, "tokens": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        assert check_token_cache(None) == []
+
+    def test_role_changes_apply_immediately(self):
+        """
+        Test that a cached user loses access as soon as their role is dismissed, in bulk or on the instance.
+        """
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+        response = self.client.post(
+            reverse("users:dismiss-bookspace-manager"),
+            {"user_ids": [self.bookspace_manager_user_id]},
+            HTTP_AUTHORIZATION=f"Token {self.bookspace_owner_token}",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_403_FORBIDDEN
+
+        user = CustomUser.objects.get(pk=self.bookspace_manager_user_id)
+        assert user.role_flags == 0
+        user.assign_bookspace_worker()
+        assert user.role_flags == RoleFlags.BOOKSPACE_WORKER
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+
+    def test_role_flags_follow_role_fields(self):
+        """
+        Test that the role bitmask follows the boolean role fields, including partial saves.
+        """
+        user = CustomUser.objects.get(pk=self.bookspace_manager_user_id)
+        assert user.role_flags == RoleFlags.BOOKSPACE_MANAGER
+
+        user.is_bookspace_worker = True
+        user.save(update_fields=["is_bookspace_worker"])
+        user.refresh_from_db()
+        assert user.role_flags == RoleFlags.BOOKSPACE_MANAGER | RoleFlags.BOOKSPACE_WORKER
+
+        CustomUser.objects.filter(pk=user.pk).dismiss_bookspace_manager()
+        user.refresh_from_db()
+        assert user.role_flags == RoleFlags.BOOKSPACE_WORKER and user.get_role() == "Bookspace Worker"
+
+    def test_expired_token(self, settings):
+        """
+        Test that an expired token is rejected, cached or not, and that logging in again replaces it.
+        """
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+        settings.AUTH_TOKEN_TTL = 60
+        Token.objects.filter(key=self.bookspace_manager_token).update(
+            created=timezone.now() - timezone.timedelta(minutes=5)
+        )
+        # The cached copy still has the original creation time; drop it as its timeout would.
+        caches["tokens"].clear()
+
+        response = self.get_orders(self.bookspace_manager_token)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.data["detail"] == "Token has expired."
+
+        response = self.client.post(
+            reverse("users:login"), {"username": "manager@example.com", "password": "testpassword"}
+        )
+        assert response.data["auth_token"] != self.bookspace_manager_token
+        assert self.get_orders(response.data["auth_token"]).status_code == status.HTTP_200_OK
+
+    def test_rotate_token(self):
+        """
+        Test that rotating a token issues a new one and revokes the cached old one at once.
+        """
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+        response = self.client.post(
+            reverse("users:rotate-token"), HTTP_AUTHORIZATION=f"Token {self.bookspace_manager_token}"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        new_token = response.data["auth_token"]
+
+        assert new_token != self.bookspace_manager_token
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_401_UNAUTHORIZED
+        assert self.get_orders(new_token).status_code == status.HTTP_200_OK
+
+    def test_logout_revokes_cached_token(self):
+        """
+        Test that logging out revokes a token that is already cached.
+        """
+        assert self.get_orders(self.bookspace_manager_token).status_code == status.HTTP_200_OK
+        response = self.client.post(
+            reverse("users:logout"), HTTP_AUTHORIZATION=f"Token {self.bookspace_manager_token}"
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        response = self.get_orders(self.bookspace_manager_token)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.data["detail"] == "Invalid token."
+
+
+@pytest.mark.django_db
+class TestGenerateUsername:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_user(self, username, number):
+        return CustomUser.objects.create(
+            username=username,
+            first_name="John",
+            last_name="Smith",
+            phone_number=f"+2547100{number:05d}",
+            sex=SexChoices.MALE,
+        )
+
+    def generate(self):
+        response = self.client.post(
+            reverse("users:generate-username"), {"first_name": "John", "last_name": "Smith"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        return response.data["username"]
+
+    def test_generate_free_username(self):
+        """
+        Test that the plain slug is returned while nobody uses it.
+        """
+        assert self.generate() == "john-smith"
+
+    def test_generate_username_after_highest_number(self, django_assert_num_queries):
+        """
+        Test that namesakes get the number after the highest one in use, in a single query.
+        """
+        for number, username in enumerate(["john-smith", "john-smith-1", "john-smith-12", "john-smithers-40"]):
+            self.create_user(username, number)
+
+        with django_assert_num_queries(1):
+            assert self.generate() == "john-smith-13"
+
+    def test_generated_usernames_are_reserved(self):
+        """
+        Test that usernames handed out but not yet registered are not handed out again.
+        """
+        assert [self.generate() for _ in range(3)] == ["john-smith", "john-smith-1", "john-smith-2"]
+
 
 @pytest.mark.django_db
 class TestAuthorViewSet:
@@ -837,3 +1099,381 @@ class TestBookTagViewSet:
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.data == {'detail': 'No book tag(s) found matching the provided filters.'}
 
+
+@pytest.mark.django_db
+class TestMainView:
+    @pytest.fixture(autouse=True)
+    def setup(self, django_capture_on_commit_callbacks):
+        # Catalog pages are invalidated when the changes commit.
+        self.commit = django_capture_on_commit_callbacks
+        self.author = Author.objects.create(first_name='Robert', last_name='Greene')
+        self.co_author = Author.objects.create(first_name='Joost', last_name='Elffers')
+        self.tag = BookTag.objects.create(name=BookTagChoices.SELF_IMPROVEMENT)
+
+    def create_books(self, count):
+        with self.commit(execute=True):
+            for number in range(count):
+                book = Book.objects.create(title=f'The {number} Laws of Power', price=15)
+                book.authors.add(self.author, self.co_author)
+                book.tags.add(self.tag)
+                for side in ('front', 'back'):
+                    BookImage.objects.create(book=book, cover_image=f'book-covers/{number}-{side}.jpg')
+
+    def count_home_page_queries(self, client):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(reverse('main:home'))
+        assert response.status_code == status.HTTP_200_OK
+        return len(context.captured_queries)
+
+    def test_home_page_renders_images(self, client):
+        """
+        Test that both the book card and the modal render every image of a book.
+        """
+        self.create_books(1)
+        response = client.get(reverse('main:home'))
+        assert response.content.decode().count('/media/book-covers/0-back.jpg') == 2
+
+    def test_home_page_query_count_is_constant(self, client):
+        """
+        Test that the number of queries does not grow with the number of books on the page.
+        """
+        self.create_books(1)
+        single_book_queries = self.count_home_page_queries(client)
+
+        self.create_books(11)
+        full_page_queries = self.count_home_page_queries(client)
+
+        MainView.paginate_by = 24
+        try:
+            self.create_books(12)
+            larger_page_queries = self.count_home_page_queries(client)
+        finally:
+            MainView.paginate_by = 12
+
+        # Books, authors, tags, images, the facet counts and the names of the authors facet.
+        assert single_book_queries == full_page_queries == larger_page_queries == 6
+
+
+@pytest.mark.django_db
+class TestMainViewCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, django_capture_on_commit_callbacks):
+        # Catalog pages are invalidated when the changes commit.
+        self.commit = django_capture_on_commit_callbacks
+        self.tag = BookTag.objects.create(name=BookTagChoices.HISTORY)
+        self.book = Book.objects.create(title='The Peloponnesian War', price=20)
+        self.book.tags.add(self.tag)
+
+    def get_home_page(self, client, queries, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(reverse('main:home'), params)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(context.captured_queries) == queries
+        return response.content.decode()
+
+    def test_cached_page_is_served_without_queries(self, client):
+        """
+        Test that a repeated anonymous request is served from the cache.
+        """
+        first = self.get_home_page(client, 5, tag=BookTagChoices.HISTORY)
+        second = self.get_home_page(client, 0, tag=BookTagChoices.HISTORY)
+        assert first == second
+
+        # A different search, tag or page is a different cache entry.
+        self.get_home_page(client, 5, tag=BookTagChoices.HISTORY, search='war')
+
+    def test_junk_parameters_share_the_cached_page(self, client):
+        """
+        Test that unknown and invalid parameters reuse the page they render instead of adding cache entries.
+        """
+        first = self.get_home_page(client, 5, tag=BookTagChoices.HISTORY)
+        junk = self.get_home_page(client, 0, tag=BookTagChoices.HISTORY, x='random', price='cheap', year='later')
+        assert junk == first and 'random' not in junk and 'cheap' not in junk
+
+    def test_catalog_changes_invalidate_cached_pages(self, client):
+        """
+        Test that editing books, tags, images or authors is visible on the next request.
+        """
+        self.get_home_page(client, 5)
+
+        with self.commit(execute=True):
+            self.book.title = 'History of the Peloponnesian War'
+            self.book.save()
+        assert 'History of the Peloponnesian War' in self.get_home_page(client, 5)
+
+        with self.commit(execute=True):
+            BookTag.objects.create(name=BookTagChoices.FICTION)
+        assert '?tag=Fiction' in self.get_home_page(client, 5)
+
+        with self.commit(execute=True):
+            author = Author.objects.create(first_name='Thucydides', last_name='of Athens')
+        self.get_home_page(client, 5)
+        with self.commit(execute=True):
+            self.book.authors.add(author)
+        # The authors facet now lists Thucydides, whose name is looked up.
+        assert 'Thucydides of Athens' in self.get_home_page(client, 6)
+
+        with self.commit(execute=True):
+            BookImage.objects.create(book=self.book, cover_image='book-covers/The_Peloponesian_War.jpeg')
+        assert 'The_Peloponesian_War.jpeg' in self.get_home_page(client, 6)
+
+    def test_generation_is_bumped_after_commit(self, client):
+        """
+        Test that a page rendered before a change commits can't be cached under the new generation.
+        """
+        generation = get_catalog_generation()
+        with self.commit() as callbacks:
+            self.book.title = 'History of the Peloponnesian War'
+            self.book.save()
+            # A concurrent request still sees the old catalog, under the old generation.
+            assert get_catalog_generation() == generation
+        for callback in callbacks:
+            callback()
+        assert get_catalog_generation() > generation
+
+    def test_visitors_with_a_session_bypass_the_cache(self, client):
+        """
+        Test that requests carrying a session cookie are always rendered.
+        """
+        self.get_home_page(client, 5)
+        client.cookies['sessionid'] = 'not-a-real-session'
+        # The page is rendered again; only the facet counts come from the cache.
+        self.get_home_page(client, 4)
+
+
+@pytest.mark.django_db
+class TestBookViewSet:
+    @pytest.fixture(autouse=True)
+    def setup(self, bookspace_owner_token):
+        self.client = APIClient()
+        self.token = bookspace_owner_token
+        self.author = Author.objects.create(first_name='Colleen', last_name='Hoover', bio='A long biography.')
+        self.tag = BookTag.objects.create(name=BookTagChoices.ROMANCE)
+
+    def create_books(self, count):
+        books = []
+        for number in range(count):
+            book = Book.objects.create(title=f'It Starts With Us {number}', price=12)
+            book.authors.add(self.author)
+            book.tags.add(self.tag)
+            BookImage.objects.create(book=book, cover_image=f'book-covers/{number}.webp')
+            books.append(book)
+        return books
+
+    def test_list_embeds_related_data(self):
+        """
+        Test that a book carries its authors, tag names, stock and image URL.
+        """
+        book, = self.create_books(1)
+        BookInventory.objects.filter(name=book).update(stock_quantity=7)
+
+        response = self.client.get(reverse('main:books-detail', kwargs={'pk': book.id}))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['authors'] == [{'id': self.author.id, 'first_name': 'Colleen', 'last_name': 'Hoover'}]
+        assert response.data['tags'] == ['Romance']
+        assert response.data['stock_quantity'] == 7
+        assert response.data['image_url'] == 'http://testserver/media/book-covers/0.webp'
+
+    def test_list_query_count_is_constant(self):
+        """
+        Test that listing books takes the same number of queries for one book and for a full page.
+        """
+        self.create_books(1)
+        with CaptureQueriesContext(connection) as single_book:
+            self.client.get(reverse('main:books-list'))
+
+        self.create_books(11)
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(reverse('main:books-list'))
+
+        assert len(response.data['results']) == 12
+        # The ETag aggregate, then books with their inventory, authors, tags and images.
+        assert len(single_book.captured_queries) == len(full_page.captured_queries) == 5
+
+    def test_create_book_with_related_ids(self):
+        """
+        Test that books are still written with author and tag ids.
+        """
+        response = self.client.post(
+            reverse('main:books-list'),
+            {'title': 'It Ends With Us', 'price': '11.50', 'authors': [self.author.id], 'tags': [self.tag.id]},
+            HTTP_AUTHORIZATION=f'Token {self.token}',
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['authors'] == [self.author.id]
+        assert Book.objects.get(title='It Ends With Us').bookinventory.stock_quantity == 0
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    @pytest.fixture(autouse=True)
+    def setup(self, bookspace_owner_token):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {bookspace_owner_token}')
+        self.author = Author.objects.create(first_name='Thucydides', last_name='Olorou', bio='An Athenian historian.')
+        self.tag = BookTag.objects.create(name=BookTagChoices.HISTORY, description='Things that happened.')
+        self.book = Book.objects.create(title='History of the Peloponnesian War', price=20, description='Long.')
+        self.book.authors.add(self.author)
+        self.book.tags.add(self.tag)
+        BookImage.objects.create(book=self.book, cover_image='book-covers/The_Peloponesian_War.jpeg')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_fields_trim_output_and_columns(self):
+        """
+        Test that ?fields= trims the books and skips unrequested columns and relations.
+        """
+        response, queries = self.get(reverse('main:books-list'), fields='id,title')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == [{'id': self.book.id, 'title': 'History of the Peloponnesian War'}]
+        # The token lookup, the ETag aggregate and the books themselves.
+        assert len(queries) == 3
+        assert '"description"' not in queries[2]
+
+    def test_fields_on_related_columns(self):
+        """
+        Test that nested sources such as the inventory stock keep working with ?fields=.
+        """
+        response, queries = self.get(reverse('main:books-detail', kwargs={'pk': self.book.id}),
+                                     fields='title,stock_quantity,authors')
+        assert response.data == {
+            'title': 'History of the Peloponnesian War',
+            'stock_quantity': 0,
+            'authors': [{'id': self.author.id, 'first_name': 'Thucydides', 'last_name': 'Olorou'}],
+        }
+        assert len(queries) == 4
+
+    def test_expand(self):
+        """
+        Test that ?expand= adds the optional relations.
+        """
+        response, _ = self.get(reverse('main:books-detail', kwargs={'pk': self.book.id}),
+                               fields='id', expand='images')
+        assert list(response.data) == ['id', 'images']
+        assert response.data['images'][0]['book'] == self.book.id
+
+        response, _ = self.get(reverse('main:authors-list'), fields='last_name', expand='books')
+        assert response.data == [{'last_name': 'Olorou', 'books': [
+            {'id': self.book.id, 'title': 'History of the Peloponnesian War'},
+        ]}]
+
+        response, queries = self.get(reverse('main:book-tags-list'), fields='name')
+        assert response.data == [{'name': 'History'}]
+        assert '"description"' not in queries[-1]
+
+    def test_unknown_fields_are_rejected(self):
+        """
+        Test that unknown field and expansion names are reported.
+        """
+        response, _ = self.get(reverse('main:books-list'), fields='title,colour', expand='sequels')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data == {
+            'fields': 'Unknown field(s): colour.',
+            'expand': 'Unknown expansion(s): sequels.',
+        }
+
+
+@pytest.mark.django_db
+class TestBookConditionalGet:
+    @pytest.fixture(autouse=True)
+    def setup(self, django_capture_on_commit_callbacks):
+        self.commit = django_capture_on_commit_callbacks
+        self.client = APIClient()
+        self.book = Book.objects.create(title='Things Fall Apart', price=14)
+
+    def test_list_not_modified(self):
+        """
+        Test that a list request with a current ETag or Last-Modified is answered with 304 and no body.
+        """
+        url = reverse('main:books-list')
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag and not response.content
+        # Only the ETag aggregate.
+        assert len(context.captured_queries) == 1
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_etag_changes_with_the_catalog(self):
+        """
+        Test that editing, adding or re-stocking books changes the ETag.
+        """
+        url = reverse('main:books-detail', kwargs={'pk': self.book.id})
+        etag = self.client.get(url)['ETag']
+
+        inventory = self.book.bookinventory
+        inventory.stock_quantity = 3
+        with self.commit(execute=True):
+            inventory.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['stock_quantity'] == 3
+
+        etag = response['ETag']
+        self.book.title = 'No Longer at Ease'
+        with self.commit(execute=True):
+            self.book.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+        list_etag = self.client.get(reverse('main:books-list'))['ETag']
+        with self.commit(execute=True):
+            Book.objects.create(title='Arrow of God', price=12)
+        assert self.client.get(reverse('main:books-list'))['ETag'] != list_etag
+
+    def test_last_modified_covers_related_changes(self, monkeypatch):
+        """
+        Test that an If-Modified-Since revalidation sees stock and tag changes that leave the book row untouched.
+        """
+        url = reverse('main:books-detail', kwargs={'pk': self.book.id})
+        last_modified = self.client.get(url)['Last-Modified']
+        assert self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == status.HTTP_304_NOT_MODIFIED
+
+        # HTTP dates have a one second resolution.
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 2)
+        with self.commit(execute=True):
+            BookInventory.objects.add_stock(self.book.id, 3)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['stock_quantity'] == 3
+
+        last_modified = response['Last-Modified']
+        monkeypatch.setattr(time, 'time', lambda: now + 4)
+        with self.commit(execute=True):
+            self.book.tags.add(BookTag.objects.create(name=BookTagChoices.FICTION))
+        response = self.client.get(reverse('main:books-list'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_etag_depends_on_query_params(self):
+        """
+        Test that differently shaped responses of the same books have different ETags.
+        """
+        url = reverse('main:books-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+    def test_missing_book(self):
+        """
+        Test that a missing book is still a 404.
+        """
+        response = self.client.get(reverse('main:books-detail', kwargs={'pk': self.book.id + 1}))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_malformed_book_id(self):
+        """
+        Test that a non-numeric book id is a 404, not a server error.
+        """
+        response = self.client.get(reverse('main:books-detail', kwargs={'pk': 'abc'}))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
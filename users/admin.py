@@ -111,43 +111,35 @@ class CustomUserAdmin(ModelAdmin):
 
     def assign_bookspace_owner(self, request, queryset):
         """Assign selected users as bookspace owners"""
-        for user in queryset:
-            user.assign_bookspace_owner()
-        self.message_user(request, f"Successfully assigned {queryset.count()} users as Bookspace Owners")
+        count = queryset.assign_bookspace_owner()
+        self.message_user(request, f"Successfully assigned {count} users as Bookspace Owners")
 
     assign_bookspace_owner.short_description = "Assign as Bookspace Owner"
 
     def assign_bookspace_manager(self, request, queryset):
         """Assign selected users as bookspace managers"""
-        for user in queryset:
-            user.assign_bookspace_manager()
-        self.message_user(request, f"Successfully assigned {queryset.count()} users as Bookspace Managers")
+        count = queryset.assign_bookspace_manager()
+        self.message_user(request, f"Successfully assigned {count} users as Bookspace Managers")
 
     assign_bookspace_manager.short_description = "Assign as Bookspace Manager"
 
     def assign_assistant_bookspace_manager(self, request, queryset):
         """Assign selected users as assistant bookspace managers"""
-        for user in queryset:
-            user.assign_assistant_bookspace_manager()
-        self.message_user(request, f"Successfully assigned {queryset.count()} users as Assistant Bookspace Managers")
+        count = queryset.assign_assistant_bookspace_manager()
+        self.message_user(request, f"Successfully assigned {count} users as Assistant Bookspace Managers")
 
     assign_assistant_bookspace_manager.short_description = "Assign as Assistant Bookspace Manager"
 
     def assign_bookspace_worker(self, request, queryset):
         """Assign selected users as bookspace workers"""
-        for user in queryset:
-            user.assign_bookspace_worker()
-        self.message_user(request, f"Successfully assigned {queryset.count()} users as Bookspace Workers")
+        count = queryset.assign_bookspace_worker()
+        self.message_user(request, f"Successfully assigned {count} users as Bookspace Workers")
 
     assign_bookspace_worker.short_description = "Assign as Bookspace Worker"
 
     def dismiss_all_roles(self, request, queryset):
         """Remove all bookspace roles from selected users"""
-        for user in queryset:
-            user.dismiss_bookspace_owner()
-            user.dismiss_bookspace_manager()
-            user.dismiss_assistant_bookspace_manager()
-            user.dismiss_bookspace_worker()
-        self.message_user(request, f"Successfully removed all roles from {queryset.count()} users")
+        count = queryset.dismiss_all_roles()
+        self.message_user(request, f"Successfully removed all roles from {count} users")
 
     dismiss_all_roles.short_description = "Remove all bookspace roles"
@@ -0,0 +1,111 @@
+"""
+Token authentication with cached lookups and token expiry.
+
+DRF's `TokenAuthentication` loads the token and its user from the database on
+every request. `CachedTokenAuthentication` keeps what the permission checks
+need, the user's id, `role_flags` and `is_active` and the token's creation
+time, in the `tokens` cache for `AUTH_TOKEN_CACHE_TIMEOUT` seconds instead,
+and rebuilds the user from them with every other field deferred: nothing
+sensitive such as the password hash is cached, and the rest of the user is
+only loaded by the requests that use it.
+
+Cached entries are dropped when the token is deleted (logout, rotation) and
+whenever the user is saved or has their roles changed. The drop only reaches
+the process it happens in unless the `tokens` cache is shared, so in
+production `TOKEN_CACHE_BACKEND` must point at a shared backend such as Redis
+or Memcached; the `users.W001` system check warns about a local memory cache
+when `DEBUG` is off.
+
+Tokens older than `AUTH_TOKEN_TTL` seconds are rejected; logging in again or
+rotating the token issues a fresh one.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import caches
+from django.db import router
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+TOKEN_CACHE_ALIAS = 'tokens'
+TOKEN_CACHE_KEY = 'users:token:{}'
+CACHED_USER_FIELDS = ('id', 'role_flags', 'is_active')
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_token_cache(app_configs, **kwargs):
+    """Warns when the `tokens` cache is local to each process outside of development."""
+    backend = settings.CACHES.get(TOKEN_CACHE_ALIAS, {}).get('BACKEND')
+    if settings.DEBUG or backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [checks.Warning(
+        f"The '{TOKEN_CACHE_ALIAS}' cache uses {backend}, which is local to each process: revoked tokens "
+        "and dismissed roles keep working in the other processes until their cache entry times out.",
+        hint="Set TOKEN_CACHE_BACKEND and TOKEN_CACHE_LOCATION to a shared cache such as Redis or Memcached.",
+        id='users.W001',
+    )]
+
+
+def invalidate_cached_tokens(keys):
+    """Drops the cached authentication of the tokens with the given keys."""
+    if keys:
+        caches[TOKEN_CACHE_ALIAS].delete_many([TOKEN_CACHE_KEY.format(key) for key in keys])
+
+
+def get_token_expiry_cutoff():
+    """Returns the creation time before which tokens are expired, or None if tokens never expire."""
+    if settings.AUTH_TOKEN_TTL is None:
+        return None
+    return timezone.now() - datetime.timedelta(seconds=settings.AUTH_TOKEN_TTL)
+
+
+def is_token_expired(token):
+    cutoff = get_token_expiry_cutoff()
+    return cutoff is not None and token.created < cutoff
+
+
+def get_cached_user(credentials):
+    """Rebuilds a user from cached credentials, every field but `CACHED_USER_FIELDS` deferred."""
+    user_model = get_user_model()
+    values = {'id': credentials['user_id'], 'role_flags': credentials['role_flags'],
+              'is_active': credentials['is_active']}
+    field_names = [field.attname for field in user_model._meta.concrete_fields if field.attname in values]
+    return user_model.from_db(
+        router.db_for_read(user_model), field_names, [values[field_name] for field_name in field_names]
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token_cache = caches[TOKEN_CACHE_ALIAS]
+        cache_key = TOKEN_CACHE_KEY.format(key)
+        credentials = token_cache.get(cache_key)
+        if credentials is None:
+            user, token = super().authenticate_credentials(key)
+            credentials = {
+                'user_id': user.pk, 'role_flags': user.role_flags, 'is_active': user.is_active,
+                'token_created': token.created,
+            }
+            token_cache.set(cache_key, credentials, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        else:
+            if not credentials['is_active']:
+                raise AuthenticationFailed(_('User inactive or deleted.'))
+            user = get_cached_user(credentials)
+            token = Token.from_db(
+                router.db_for_read(Token), ['key', 'user_id', 'created'],
+                [key, credentials['user_id'], credentials['token_created']],
+            )
+            token.user = user
+
+        if is_token_expired(token):
+            raise AuthenticationFailed(_('Token has expired.'))
+        return user, token
@@ -1,6 +1,23 @@
+import enum
+
 from django.db import models
 
 
 class SexChoices(models.TextChoices):
     MALE = 'Male'
     FEMALE = 'Female'
+
+
+class RoleFlags(enum.IntFlag):
+    """Bits of `CustomUser.role_flags`, one per bookspace role."""
+    BOOKSPACE_OWNER = 1
+    BOOKSPACE_MANAGER = 2
+    ASSISTANT_BOOKSPACE_MANAGER = 4
+    BOOKSPACE_WORKER = 8
+
+
+# The roles let through by each permission level, see users.permissions.
+OWNER_ROLES = RoleFlags.BOOKSPACE_OWNER
+MANAGER_ROLES = OWNER_ROLES | RoleFlags.BOOKSPACE_MANAGER
+ASSISTANT_MANAGER_ROLES = MANAGER_ROLES | RoleFlags.ASSISTANT_BOOKSPACE_MANAGER
+STAFF_ROLES = ASSISTANT_MANAGER_ROLES | RoleFlags.BOOKSPACE_WORKER
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models import F
+
+# Mirrors users.choices.RoleFlags at the time of this migration.
+ROLE_FLAGS = {
+    'is_bookspace_owner': 1,
+    'is_bookspace_manager': 2,
+    'is_assistant_bookspace_manager': 4,
+    'is_bookspace_worker': 8,
+}
+
+
+def populate_role_flags(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    for field, flag in ROLE_FLAGS.items():
+        CustomUser.objects.filter(**{field: True}).update(role_flags=F('role_flags').bitor(flag))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_customuser_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='role_flags',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_role_flags, migrations.RunPython.noop),
+    ]
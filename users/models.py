@@ -1,11 +1,87 @@
-from django.contrib.auth.models import AbstractUser
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import Cast, Substr
 from django.utils.text import slugify
 from phonenumber_field.modelfields import PhoneNumberField
+from rest_framework.authtoken.models import Token
 
+from users.authentication import invalidate_cached_tokens
 from users.choices import *
 from users.validators import *
 
 
+ROLE_FLAGS = {
+    'is_bookspace_owner': RoleFlags.BOOKSPACE_OWNER,
+    'is_bookspace_manager': RoleFlags.BOOKSPACE_MANAGER,
+    'is_assistant_bookspace_manager': RoleFlags.ASSISTANT_BOOKSPACE_MANAGER,
+    'is_bookspace_worker': RoleFlags.BOOKSPACE_WORKER,
+}
+ROLE_FIELDS = tuple(ROLE_FLAGS)
+
+
+class CustomUserQuerySet(models.QuerySet):
+    """
+    Role changes for many users at once, each applied with a single UPDATE.
+
+    Unlike the `assign_*` and `dismiss_*` methods of `CustomUser` these do not
+    load the users, call `save()` or re-run `clean()`: only the role flags
+    change, and those are not validated. The `role_flags` bitmask is updated
+    along with the boolean fields and the cached authentication of the users'
+    tokens is dropped. Every method returns the number of updated users.
+    """
+
+    def update_roles(self, **kwargs):
+        token_keys = list(Token.objects.filter(user__in=self.values('pk')).values_list('key', flat=True))
+        count = self.update(**kwargs)
+        invalidate_cached_tokens(token_keys)
+        return count
+
+    def _assign_role(self, role_field):
+        return self.update_roles(
+            role_flags=int(ROLE_FLAGS[role_field]), **{field: field == role_field for field in ROLE_FIELDS}
+        )
+
+    def _dismiss_role(self, role_field):
+        return self.update_roles(
+            role_flags=F('role_flags').bitand(int(STAFF_ROLES & ~ROLE_FLAGS[role_field])), **{role_field: False}
+        )
+
+    def assign_bookspace_owner(self):
+        return self._assign_role('is_bookspace_owner')
+
+    def assign_bookspace_manager(self):
+        return self._assign_role('is_bookspace_manager')
+
+    def assign_assistant_bookspace_manager(self):
+        return self._assign_role('is_assistant_bookspace_manager')
+
+    def assign_bookspace_worker(self):
+        return self._assign_role('is_bookspace_worker')
+
+    def dismiss_bookspace_owner(self):
+        return self._dismiss_role('is_bookspace_owner')
+
+    def dismiss_bookspace_manager(self):
+        return self._dismiss_role('is_bookspace_manager')
+
+    def dismiss_assistant_bookspace_manager(self):
+        return self._dismiss_role('is_assistant_bookspace_manager')
+
+    def dismiss_bookspace_worker(self):
+        return self._dismiss_role('is_bookspace_worker')
+
+    def dismiss_all_roles(self):
+        return self.update_roles(role_flags=0, **dict.fromkeys(ROLE_FIELDS, False))
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
+
 class CustomUser(AbstractUser):
     """
     Custom user model representing a user in the bookspace management system.
@@ -26,6 +102,8 @@ class CustomUser(AbstractUser):
     - `is_bookspace_manager`: A boolean field representing whether the user is a bookspace manager.
     - `is_assistant_bookspace_manager`: A boolean field representing whether the user is an assistant bookspace manager.
     - `is_bookspace_worker`: A boolean field representing whether the user is a bookspace worker.
+    - `role_flags`: The `RoleFlags` bitmask of the boolean role fields above, kept in sync by `save()`
+                    and by `CustomUserQuerySet`. Permission checks read this single integer.
 
     Methods:
     - `assign_bookspace_owner()`: Assigns the user as a bookspace owner and updates related fields accordingly.
@@ -38,6 +116,7 @@ class CustomUser(AbstractUser):
     - `dismiss_bookspace_worker()`: Dismisses the user from the bookspace worker role.
     - `get_full_name()`: Returns the full name of the user.
     - `get_role()`: Returns the role of the user based on their assigned roles.
+    - `has_role(roles)`: Returns whether the user holds any of the given `RoleFlags`.
     - `get_bookspace_workers()`: Retrieves all bookspace workers associated with the user.
     - `get_bookspace_managers()`: Retrieves all bookspace managers associated with the user.
     - `get_bookspace_owners()`: Retrieves all bookspace owners associated with the user.
@@ -53,6 +132,9 @@ class CustomUser(AbstractUser):
     is_bookspace_manager = models.BooleanField(default=False)
     is_assistant_bookspace_manager = models.BooleanField(default=False)
     is_bookspace_worker = models.BooleanField(default=False)
+    role_flags = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = CustomUserManager()
 
     REQUIRED_FIELDS = ['first_name', 'last_name', 'phone_number', 'sex']
 
@@ -135,16 +217,53 @@ class CustomUser(AbstractUser):
 
     def save(self, *args, **kwargs):
         self.clean()
+        self.role_flags = self.get_role_flags()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(ROLE_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'role_flags'}
         super().save(*args, **kwargs)
 
+    def get_role_flags(self):
+        """Return the `RoleFlags` of the roles set on the user's boolean fields."""
+        flags = RoleFlags(0)
+        for field, flag in ROLE_FLAGS.items():
+            if getattr(self, field):
+                flags |= flag
+        return flags
+
+    def has_role(self, roles):
+        """Return whether the user holds any of `roles`, a combination of `RoleFlags`."""
+        return bool(self.role_flags & roles)
+
     @staticmethod
     def generate_username(first_name, last_name):
+        """
+        Returns a free username made of the slugified names, numbered as
+        `base`, `base-1`, `base-2`, ... for namesakes.
+
+        The highest number in use is found with a single aggregate query, and
+        the returned username is reserved in the cache for
+        `USERNAME_RESERVATION_TIMEOUT` seconds so that concurrent signups with
+        the same names get different usernames.
+        """
         base_username = slugify(f"{first_name}-{last_name}")
-        username = base_username
-        counter = 1
+        numbered = Q(username__regex=rf'^{re.escape(base_username)}-[0-9]{{1,9}}$')
+        taken = CustomUser.objects.filter(Q(username=base_username) | numbered).aggregate(
+            base_taken=Count('pk', filter=Q(username=base_username)),
+            last_number=Max(
+                Cast(Substr('username', len(base_username) + 2), models.IntegerField()), filter=numbered
+            ),
+        )
 
-        while CustomUser.objects.filter(username=username).exists():
+        counter = taken['last_number'] or 0
+        username = base_username
+        if taken['base_taken']:
+            counter += 1
             username = f"{base_username}-{counter}"
+        while not cache.add(
+            f'users:username:{username}', True, timeout=settings.USERNAME_RESERVATION_TIMEOUT
+        ):
             counter += 1
+            username = f"{base_username}-{counter}"
 
         return username
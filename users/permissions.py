@@ -1,6 +1,8 @@
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import BasePermission
 
+from users.choices import ASSISTANT_MANAGER_ROLES, MANAGER_ROLES, OWNER_ROLES, STAFF_ROLES
+
 
 class IsBookspaceOwner(BasePermission):
     """
@@ -18,7 +20,7 @@ class IsBookspaceOwner(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is a bookspace owner
-        if request.user.is_authenticated and request.user.is_bookspace_owner:
+        if request.user.is_authenticated and request.user.has_role(OWNER_ROLES):
             return True
         raise PermissionDenied(self.message)
 
@@ -38,7 +40,7 @@ class IsBookspaceManager(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is a bookspace manager
-        if request.user.is_authenticated and (request.user.is_bookspace_manager or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(MANAGER_ROLES):
             return True
         raise PermissionDenied(self.message)
 
@@ -58,9 +60,7 @@ class IsAssistantBookspaceManager(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is an assistant bookspace manager
-        if request.user.is_authenticated and (
-                request.user.is_assistant_bookspace_manager or request.user.is_bookspace_manager
-                or request.user.is_bookspace_owner):
+        if request.user.is_authenticated and request.user.has_role(ASSISTANT_MANAGER_ROLES):
             return True
         raise PermissionDenied(self.message)
 
@@ -80,7 +80,6 @@ class IsBookspaceWorker(BasePermission):
 
     def has_permission(self, request, view):
         # Check if the current user is a bookspace worker
-        if request.user.is_authenticated and (request.user.is_bookspace_owner or request.user.is_bookspace_worker or
-                                              request.user.is_bookspace_manager or request.user.is_assistant_bookspace_manager):
+        if request.user.is_authenticated and request.user.has_role(STAFF_ROLES):
             return True
         raise PermissionDenied(self.message)
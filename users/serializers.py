@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from phonenumber_field.serializerfields import PhoneNumberField
 
+from main.metrics import TimedSerializerMixin
+
 User = get_user_model()
 
 
@@ -48,7 +50,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
                   'is_bookspace_owner', 'is_bookspace_manager', 'is_assistant_bookspace_manager', 'is_bookspace_worker')
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     """
     Custom serializer for retrieving and updating user instances with additional fields.
 
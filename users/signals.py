@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.authentication import invalidate_cached_tokens
+from users.models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """
+    Signal to drop the cached authentication of a user's tokens when the user
+    changes, so that new roles or a deactivation apply immediately.
+    """
+    if not created:
+        invalidate_cached_tokens(list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True)))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    Signal to drop the cached authentication of a deleted token, e.g. on logout.
+    """
+    invalidate_cached_tokens([instance.key])
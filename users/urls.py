@@ -1,5 +1,5 @@
 from django.urls import path, include
-from djoser.views import TokenCreateView, TokenDestroyView
+from djoser.views import TokenDestroyView
 from rest_framework import routers
 
 from users.views import *
@@ -10,8 +10,9 @@ router = routers.DefaultRouter()
 router.register(r'users', CustomUserViewSet, basename='users')
 
 urlpatterns = [
-    path('login/', TokenCreateView.as_view(), name='login'),
+    path('login/', LoginView.as_view(), name='login'),
     path('logout/', TokenDestroyView.as_view(), name='logout'),
+    path('token/rotate/', RotateTokenView.as_view(), name='rotate-token'),
     path('generate-username/', GenerateUsernameSlugAPIView.as_view(), name='generate-username'),
 
     path('assign-bookspace-owner/', AssignBookspaceOwnerView.as_view(), name='assign-bookspace-owner'),
@@ -1,7 +1,12 @@
+from django.db import transaction
+from djoser.views import TokenCreateView
 from rest_framework import viewsets, status
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from users.authentication import get_token_expiry_cutoff
 from users.models import *
 from users.permissions import *
 from users.serializers import *
@@ -32,135 +37,131 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         return CustomUserSerializer
     
 
-class AssignBookspaceOwnerView(APIView):
+class BulkRoleChangeView(APIView):
     """
-    API View to assign the bookspace owner role to selected users.
-
-    Only authenticated users with bookspace owner permission can access this view.
+    Base API View applying one role change to the users listed in `user_ids`.
 
-    The view accepts a POST request with a list of user IDs in the request body
-    and assigns the bookspace owner role to the corresponding users.
+    All listed users are resolved with a single `in_bulk` query and the role
+    flags are then changed with a single `QuerySet.update` inside a transaction
+    (see `CustomUserQuerySet`), so a request takes the same couple of queries
+    for one user or for hundreds. Listing oneself rejects the whole request.
 
-    If successful, it returns a response with a message indicating the users
-    who have been assigned the bookspace owner role. If any user ID is not found or
-    is invalid, appropriate error messages are returned in the response.
+    Subclasses set:
+    - `role_change`: The name of the `CustomUserQuerySet` method to apply.
+    - `self_change_error`: The error returned when the current user is listed.
+    - `message` and `plural_message`: The success messages for one and for several users.
+    - `quote_ids`: Whether a single unknown or invalid ID is quoted in the error messages.
 
     """
-    permission_classes = [IsBookspaceOwner]
+    role_change = None
+    self_change_error = "Cannot assign roles to yourself."
+    message = None
+    plural_message = None
+    quote_ids = True
 
     def post(self, request):
         user_ids = request.data.getlist('user_ids', [])
-        current_user_id = request.user.id
-
-        assigned_users = []
-        not_found_ids = []
-        invalid_ids = []
 
+        parsed_ids = {}
         for user_id in user_ids:
             try:
-                user_id_int = int(user_id)
-                user = CustomUser.objects.get(id=user_id_int)
+                parsed_ids[user_id] = int(user_id)
+            except ValueError:
+                pass
+        users = CustomUser.objects.only('id', 'username').in_bulk(set(parsed_ids.values()))
 
-                if user.id == current_user_id:
-                    raise ValidationError("Cannot assign roles to yourself.")
-
-                user.assign_bookspace_owner()
-                assigned_users.append(user.username)
+        changed_users = []
+        not_found_ids = []
+        invalid_ids = []
 
-            except (ValueError, CustomUser.DoesNotExist):
+        for user_id in user_ids:
+            user = users.get(parsed_ids.get(user_id))
+            if user is None:
                 if user_id.isdigit():
                     not_found_ids.append(user_id)
                 else:
                     invalid_ids.append(user_id)
+            elif user.id == request.user.id:
+                raise ValidationError(self.self_change_error)
+            else:
+                changed_users.append(user)
+
+        if changed_users:
+            with transaction.atomic():
+                queryset = CustomUser.objects.filter(pk__in={user.pk for user in changed_users})
+                getattr(queryset, self.role_change)()
+
+        return Response(self.get_response_data(changed_users, not_found_ids, invalid_ids), status=status.HTTP_200_OK)
 
+    def format_id(self, user_id):
+        return f"'{user_id}'" if self.quote_ids else user_id
+
+    def get_response_data(self, changed_users, not_found_ids, invalid_ids):
         response_data = {}
 
-        if assigned_users:
-            if len(assigned_users) > 1:
-                response_data['message'] = f"Users {', '.join(assigned_users)} have been assigned as bookspace owners."
+        if changed_users:
+            usernames = [user.username for user in changed_users]
+            if len(usernames) > 1:
+                response_data['message'] = self.plural_message.format(usernames=', '.join(usernames))
             else:
-                response_data['message'] = f"User {assigned_users[0]} has been assigned as a bookspace owner."
+                response_data['message'] = self.message.format(username=usernames[0])
 
         if not_found_ids:
             if len(not_found_ids) > 1:
                 response_data['error'] = f"Users with the following IDs were not found: {', '.join(not_found_ids)}."
             else:
-                response_data['error'] = f"User with ID '{not_found_ids[0]}' was not found."
+                response_data['error'] = f"User with ID {self.format_id(not_found_ids[0])} was not found."
 
         if invalid_ids:
             if len(invalid_ids) > 1:
                 response_data['invalid'] = f"The following IDs are invalid: {', '.join(invalid_ids)}."
             else:
-                response_data['invalid'] = f"The ID '{invalid_ids[0]}' is invalid."
+                response_data['invalid'] = f"The ID {self.format_id(invalid_ids[0])} is invalid."
 
-        return Response(response_data, status=status.HTTP_200_OK)
+        return response_data
 
 
-class AssignBookspaceManagerView(APIView):
+class AssignBookspaceOwnerView(BulkRoleChangeView):
     """
-    API View to assign the bookspace manager role to selected users.
+    API View to assign the bookspace owner role to selected users.
 
     Only authenticated users with bookspace owner permission can access this view.
 
     The view accepts a POST request with a list of user IDs in the request body
-    and assigns the bookspace manager role to the corresponding users.
+    and assigns the bookspace owner role to the corresponding users.
 
     If successful, it returns a response with a message indicating the users
-    who have been assigned the bookspace manager role. If any user ID is not found
-    or is invalid, appropriate error messages are returned in the response.
+    who have been assigned the bookspace owner role. If any user ID is not found or
+    is invalid, appropriate error messages are returned in the response.
 
     """
     permission_classes = [IsBookspaceOwner]
+    role_change = 'assign_bookspace_owner'
+    message = "User {username} has been assigned as a bookspace owner."
+    plural_message = "Users {usernames} have been assigned as bookspace owners."
 
-    def post(self, request):
-        user_ids = request.data.getlist('user_ids', [])
-        current_user_id = request.user.id
-
-        assigned_users = []
-        not_found_ids = []
-        invalid_ids = []
-
-        for user_id in user_ids:
-            try:
-                user_id_int = int(user_id)
-                user = CustomUser.objects.get(id=user_id_int)
-
-                if user.id == current_user_id:
-                    raise ValidationError("Cannot assign roles to yourself.")
 
-                user.assign_bookspace_manager()
-                assigned_users.append(user.username)
-
-            except (ValueError, CustomUser.DoesNotExist):
-                if user_id.isdigit():
-                    not_found_ids.append(user_id)
-                else:
-                    invalid_ids.append(user_id)
-
-        response_data = {}
+class AssignBookspaceManagerView(BulkRoleChangeView):
+    """
+    API View to assign the bookspace manager role to selected users.
 
-        if assigned_users:
-            if len(assigned_users) > 1:
-                response_data['message'] = f"Users {', '.join(assigned_users)} have been assigned as bookspace managers."
-            else:
-                response_data['message'] = f"User {assigned_users[0]} has been assigned as a bookspace manager."
+    Only authenticated users with bookspace owner permission can access this view.
 
-        if not_found_ids:
-            if len(not_found_ids) > 1:
-                response_data['error'] = f"Users with the following IDs were not found: {', '.join(not_found_ids)}."
-            else:
-                response_data['error'] = f"User with ID '{not_found_ids[0]}' was not found."
+    The view accepts a POST request with a list of user IDs in the request body
+    and assigns the bookspace manager role to the corresponding users.
 
-        if invalid_ids:
-            if len(invalid_ids) > 1:
-                response_data['invalid'] = f"The following IDs are invalid: {', '.join(invalid_ids)}."
-            else:
-                response_data['invalid'] = f"The ID '{invalid_ids[0]}' is invalid."
+    If successful, it returns a response with a message indicating the users
+    who have been assigned the bookspace manager role. If any user ID is not found
+    or is invalid, appropriate error messages are returned in the response.
 
-        return Response(response_data, status=status.HTTP_200_OK)
+    """
+    permission_classes = [IsBookspaceOwner]
+    role_change = 'assign_bookspace_manager'
+    message = "User {username} has been assigned as a bookspace manager."
+    plural_message = "Users {usernames} have been assigned as bookspace managers."
 
 
-class AssignAssistantBookspaceManagerView(APIView):
+class AssignAssistantBookspaceManagerView(BulkRoleChangeView):
     """
     API View to assign the assistant bookspace manager role to selected users.
 
@@ -175,56 +176,13 @@ class AssignAssistantBookspaceManagerView(APIView):
 
     """
     permission_classes = [IsBookspaceOwner]
+    role_change = 'assign_assistant_bookspace_manager'
+    message = "User {username} has been assigned as an assistant bookspace manager."
+    plural_message = "Users {usernames} have been assigned as assistant bookspace managers."
+    quote_ids = False
 
-    def post(self, request):
-        user_ids = request.data.getlist('user_ids', [])
-        current_user_id = request.user.id
-
-        assigned_users = []
-        not_found_ids = []
-        invalid_ids = []
-
-        for user_id in user_ids:
-            try:
-                user_id_int = int(user_id)
-                user = CustomUser.objects.get(id=user_id_int)
-
-                if user.id == current_user_id:
-                    raise ValidationError("Cannot assign roles to yourself.")
-
-                user.assign_assistant_bookspace_manager()
-                assigned_users.append(user.username)
-
-            except (ValueError, CustomUser.DoesNotExist):
-                if user_id.isdigit():
-                    not_found_ids.append(user_id)
-                else:
-                    invalid_ids.append(user_id)
-
-        response_data = {}
-
-        if assigned_users:
-            if len(assigned_users) > 1:
-                response_data['message'] = f"Users {', '.join(assigned_users)} have been assigned as assistant bookspace managers."
-            else:
-                response_data['message'] = f"User {assigned_users[0]} has been assigned as an assistant bookspace manager."
-
-        if not_found_ids:
-            if len(not_found_ids) > 1:
-                response_data['error'] = f"Users with the following IDs were not found: {', '.join(not_found_ids)}."
-            else:
-                response_data['error'] = f"User with ID {not_found_ids[0]} was not found."
 
-        if invalid_ids:
-            if len(invalid_ids) > 1:
-                response_data['invalid'] = f"The following IDs are invalid: {', '.join(invalid_ids)}."
-            else:
-                response_data['invalid'] = f"The ID {invalid_ids[0]} is invalid."
-
-        return Response(response_data, status=status.HTTP_200_OK)
-
-
-class AssignBookspaceWorkerView(APIView):
+class AssignBookspaceWorkerView(BulkRoleChangeView):
     """
     API View to assign the bookspace worker role to selected users.
 
@@ -239,56 +197,13 @@ class AssignBookspaceWorkerView(APIView):
 
     """
     permission_classes = [IsBookspaceManager]
+    role_change = 'assign_bookspace_worker'
+    message = "User {username} has been assigned as a bookspace worker."
+    plural_message = "Users {usernames} have been assigned as bookspace workers."
+    quote_ids = False
 
-    def post(self, request):
-        user_ids = request.data.getlist('user_ids', [])
-        current_user_id = request.user.id
-
-        assigned_users = []
-        not_found_ids = []
-        invalid_ids = []
-
-        for user_id in user_ids:
-            try:
-                user_id_int = int(user_id)
-                user = CustomUser.objects.get(id=user_id_int)
-
-                if user.id == current_user_id:
-                    raise ValidationError("Cannot assign roles to yourself.")
-
-                user.assign_bookspace_worker()
-                assigned_users.append(user.username)
-
-            except (ValueError, CustomUser.DoesNotExist):
-                if user_id.isdigit():
-                    not_found_ids.append(user_id)
-                else:
-                    invalid_ids.append(user_id)
-
-        response_data = {}
-
-        if assigned_users:
-            if len(assigned_users) > 1:
-                response_data['message'] = f"Users {', '.join(assigned_users)} have been assigned as bookspace workers."
-            else:
-                response_data['message'] = f"User {assigned_users[0]} has been assigned as a bookspace worker."
-
-        if not_found_ids:
-            if len(not_found_ids) > 1:
-                response_data['error'] = f"Users with the following IDs were not found: {', '.join(not_found_ids)}."
-            else:
-                response_data['error'] = f"User with ID {not_found_ids[0]} was not found."
-
-        if invalid_ids:
-            if len(invalid_ids) > 1:
-                response_data['invalid'] = f"The following IDs are invalid: {', '.join(invalid_ids)}."
-            else:
-                response_data['invalid'] = f"The ID {invalid_ids[0]} is invalid."
 
-        return Response(response_data, status=status.HTTP_200_OK)
-
-
-class DismissBookspaceManagerView(APIView):
+class DismissBookspaceManagerView(BulkRoleChangeView):
     """
     API View to dismiss the bookspace manager role from selected users.
 
@@ -303,66 +218,13 @@ class DismissBookspaceManagerView(APIView):
 
     """
     permission_classes = [IsBookspaceOwner]
+    role_change = 'dismiss_bookspace_manager'
+    self_change_error = "Cannot dismiss yourself."
+    message = "User {username} has been dismissed as a bookspace manager."
+    plural_message = "Users {usernames} have been dismissed as bookspace managers."
 
-    def post(self, request):
-        user_ids = request.data.getlist("user_ids", [])
-        current_user_id = request.user.id
-
-        dismissed_users = []
-        not_found_ids = []
-        invalid_ids = []
-
-        for user_id in user_ids:
-            try:
-                user_id_int = int(user_id)
-                user = CustomUser.objects.get(id=user_id_int)
-
-                if user.id == current_user_id:
-                    raise ValidationError("Cannot dismiss yourself.")
-
-                user.dismiss_bookspace_manager()
-                dismissed_users.append(user.username)
-
-            except (ValueError, CustomUser.DoesNotExist):
-                if user_id.isdigit():
-                    not_found_ids.append(user_id)
-                else:
-                    invalid_ids.append(user_id)
-
-        response_data = {}
-
-        if dismissed_users:
-            if len(dismissed_users) > 1:
-                response_data[
-                    "message"
-                ] = f"Users {', '.join(dismissed_users)} have been dismissed as bookspace managers."
-            else:
-                response_data[
-                    "message"
-                ] = f"User {dismissed_users[0]} has been dismissed as a bookspace manager."
-
-        if not_found_ids:
-            if len(not_found_ids) > 1:
-                response_data[
-                    "error"
-                ] = f"Users with the following IDs were not found: {', '.join(not_found_ids)}."
-            else:
-                response_data[
-                    "error"
-                ] = f"User with ID '{not_found_ids[0]}' was not found."
-
-        if invalid_ids:
-            if len(invalid_ids) > 1:
-                response_data[
-                    "invalid"
-                ] = f"The following IDs are invalid: {', '.join(invalid_ids)}."
-            else:
-                response_data["invalid"] = f"The ID '{invalid_ids[0]}' is invalid."
-
-        return Response(response_data, status=status.HTTP_200_OK)
 
-
-class DismissAssistantBookspaceManagerView(APIView):
+class DismissAssistantBookspaceManagerView(BulkRoleChangeView):
     """
     API View to dismiss the assistant bookspace manager role from selected users.
 
@@ -377,66 +239,14 @@ class DismissAssistantBookspaceManagerView(APIView):
 
     """
     permission_classes = [IsBookspaceOwner]
+    role_change = 'dismiss_assistant_bookspace_manager'
+    self_change_error = "Cannot dismiss yourself."
+    message = "User {username} has been dismissed as an assistant bookspace manager."
+    plural_message = "Users {usernames} have been dismissed as assistant bookspace managers."
+    quote_ids = False
 
-    def post(self, request):
-        user_ids = request.data.getlist("user_ids", [])
-        current_user_id = request.user.id
 
-        dismissed_users = []
-        not_found_ids = []
-        invalid_ids = []
-
-        for user_id in user_ids:
-            try:
-                user_id_int = int(user_id)
-                user = CustomUser.objects.get(id=user_id_int)
-
-                if user.id == current_user_id:
-                    raise ValidationError("Cannot dismiss yourself.")
-
-                user.dismiss_assistant_bookspace_manager()
-                dismissed_users.append(user.username)
-
-            except (ValueError, CustomUser.DoesNotExist):
-                if user_id.isdigit():
-                    not_found_ids.append(user_id)
-                else:
-                    invalid_ids.append(user_id)
-
-        response_data = {}
-
-        if dismissed_users:
-            if len(dismissed_users) > 1:
-                response_data[
-                    "message"
-                ] = f"Users {', '.join(dismissed_users)} have been dismissed as assistant bookspace managers."
-            else:
-                response_data[
-                    "message"
-                ] = f"User {dismissed_users[0]} has been dismissed as an assistant bookspace manager."
-
-        if not_found_ids:
-            if len(not_found_ids) > 1:
-                response_data[
-                    "error"
-                ] = f"Users with the following IDs were not found: {', '.join(not_found_ids)}."
-            else:
-                response_data[
-                    "error"
-                ] = f"User with ID {not_found_ids[0]} was not found."
-
-        if invalid_ids:
-            if len(invalid_ids) > 1:
-                response_data[
-                    "invalid"
-                ] = f"The following IDs are invalid: {', '.join(invalid_ids)}."
-            else:
-                response_data["invalid"] = f"The ID {invalid_ids[0]} is invalid."
-
-        return Response(response_data, status=status.HTTP_200_OK)
-
-
-class DismissBookspaceWorkerView(APIView):
+class DismissBookspaceWorkerView(BulkRoleChangeView):
     """
     API View to dismiss the bookspace worker role from selected users.
 
@@ -450,65 +260,12 @@ class DismissBookspaceWorkerView(APIView):
     or is invalid, appropriate error messages are returned in the response.
 
     """
-
     permission_classes = [IsBookspaceManager]
-
-    def post(self, request):
-        user_ids = request.data.getlist("user_ids", [])
-        current_user_id = request.user.id
-
-        dismissed_users = []
-        not_found_ids = []
-        invalid_ids = []
-
-        for user_id in user_ids:
-            try:
-                user_id_int = int(user_id)
-                user = CustomUser.objects.get(id=user_id_int)
-
-                if user.id == current_user_id:
-                    raise ValidationError("Cannot dismiss yourself.")
-
-                user.dismiss_bookspace_worker()
-                dismissed_users.append(user.username)
-
-            except (ValueError, CustomUser.DoesNotExist):
-                if user_id.isdigit():
-                    not_found_ids.append(user_id)
-                else:
-                    invalid_ids.append(user_id)
-
-        response_data = {}
-
-        if dismissed_users:
-            if len(dismissed_users) > 1:
-                response_data[
-                    "message"
-                ] = f"Users {', '.join(dismissed_users)} have been dismissed as bookspace workers."
-            else:
-                response_data[
-                    "message"
-                ] = f"User {dismissed_users[0]} has been dismissed as a bookspace worker."
-
-        if not_found_ids:
-            if len(not_found_ids) > 1:
-                response_data[
-                    "error"
-                ] = f"Users with the following IDs were not found: {', '.join(not_found_ids)}."
-            else:
-                response_data[
-                    "error"
-                ] = f"User with ID {not_found_ids[0]} was not found."
-
-        if invalid_ids:
-            if len(invalid_ids) > 1:
-                response_data[
-                    "invalid"
-                ] = f"The following IDs are invalid: {', '.join(invalid_ids)}."
-            else:
-                response_data["invalid"] = f"The ID {invalid_ids[0]} is invalid."
-
-        return Response(response_data, status=status.HTTP_200_OK)
+    role_change = 'dismiss_bookspace_worker'
+    self_change_error = "Cannot dismiss yourself."
+    message = "User {username} has been dismissed as a bookspace worker."
+    plural_message = "Users {usernames} have been dismissed as bookspace workers."
+    quote_ids = False
 
 
 class GenerateUsernameSlugAPIView(APIView):
@@ -520,7 +277,8 @@ class GenerateUsernameSlugAPIView(APIView):
     and returns it as a response.
 
     The generated username slug is unique and can be used to create a new user with a username based
-    on their first name and last name. If the `first_name` or `last_name` is not provided in the request
+    on their first name and last name. It is found with a single query and stays reserved for a while,
+    so that concurrent requests for the same names get different slugs. If the `first_name` or `last_name` is not provided in the request
     body, it returns an error response with a message indicating that both fields are required.
 
     Example usage:
@@ -550,3 +308,42 @@ class GenerateUsernameSlugAPIView(APIView):
         username = CustomUser.generate_username(first_name, last_name)
 
         return Response({'username': username})
+
+
+class LoginView(TokenCreateView):
+    """
+    API View to log a user in and return their auth token.
+
+    Works like djoser's `TokenCreateView`, which hands out the user's existing token,
+    but replaces that token first when it has expired (see `AUTH_TOKEN_TTL`).
+    """
+
+    def _action(self, serializer):
+        cutoff = get_token_expiry_cutoff()
+        if cutoff is not None:
+            Token.objects.filter(user=serializer.user, created__lt=cutoff).delete()
+        return super()._action(serializer)
+
+
+class RotateTokenView(APIView):
+    """
+    API View to replace the current user's auth token with a new one.
+
+    The old token stops working immediately. The response has the same shape as the login response.
+
+    Example usage:
+    POST /auth/token/rotate/
+
+    Response:
+    {
+        "auth_token": "<new token>"
+    }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        with transaction.atomic():
+            Token.objects.filter(user=request.user).delete()
+            token = Token.objects.create(user=request.user)
+
+        return Response({'auth_token': token.key})